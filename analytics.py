@@ -0,0 +1,335 @@
+"""
+Cohort Analytics
+Mastery distributions across learners, per-question error rates and the
+distractors chosen most, computed in batch on NumPy arrays, with the
+dashboard tables and PNG charts cached per data version
+
+    python analytics.py      # build (or reuse) the dashboard of the default bank
+"""
+
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from file_utils import atomic_write_bytes, atomic_write_json
+from learner_model import get_learner_store
+
+# Bump when the tables or charts change: dashboards cached by older code are then rebuilt
+ANALYTICS_VERSION = 1
+# Questions with fewer answers are left out of the error and distractor tables
+MIN_ANSWERS = 5
+TOP_TOPICS = 12
+TOP_ITEMS = 20
+
+
+# ==========================================================
+# ✅ Cohort arrays
+# ==========================================================
+class Cohort(NamedTuple):
+    """Learner profiles and logged answers as arrays"""
+    topics: List[str]
+    correct: np.ndarray  # (learners, topics) right answers per topic
+    total: np.ndarray  # (learners, topics) answers per topic
+    digests: List[bytes]  # Questions of the bank that have answers
+    items: np.ndarray  # Per answer: position of its question in `digests`
+    answer_correct: np.ndarray  # Per answer: bool
+    choices: np.ndarray  # Per answer: index of the option chosen in the question, -1 if unknown
+    learners_answering: int  # Distinct learner keys in the answer log
+
+
+def load_cohort(cache, learner_store=None) -> Cohort:
+    """Read every named learner profile and every logged answer into arrays"""
+    learner_store = learner_store or get_learner_store()
+    topic_index: Dict[str, int] = {}
+    rows, columns, correct, total = [], [], [], []
+    learners = 0
+    for profile in learner_store.iter_profiles():
+        for topic, score in profile.get("scores", {}).items():
+            rows.append(learners)
+            columns.append(topic_index.setdefault(topic, len(topic_index)))
+            correct.append(score.get("correct", 0))
+            total.append(score.get("total", 0))
+        learners += 1
+    shape = (learners, len(topic_index))
+    correct_matrix = np.zeros(shape)
+    total_matrix = np.zeros(shape)
+    correct_matrix[rows, columns] = correct
+    total_matrix[rows, columns] = total
+
+    item_index: Dict[bytes, int] = {}
+    digests: List[bytes] = []
+    options: List[tuple] = []
+    items, answer_correct, choices = [], [], []
+    learner_keys = set()
+    for question_hash, learner, is_correct, choice in cache.store.load_answers():
+        digest = bytes.fromhex(question_hash)
+        position = item_index.get(digest)
+        if position is None:
+            record = cache.get_record(digest)
+            if record is None:
+                continue  # Question no longer in the bank
+            position = item_index[digest] = len(digests)
+            digests.append(digest)
+            options.append(record.options)
+        items.append(position)
+        answer_correct.append(bool(is_correct))
+        choices.append(options[position].index(choice) if choice in options[position] else -1)
+        learner_keys.add(learner)
+    return Cohort(list(topic_index), correct_matrix, total_matrix, digests, np.array(items, dtype=np.int64),
+                  np.array(answer_correct, dtype=bool), np.array(choices, dtype=np.int64), len(learner_keys))
+
+
+# ==========================================================
+# ✅ Batch statistics
+# ==========================================================
+def mastery_distribution(cohort: Cohort) -> Dict:
+    """
+    Per topic: learners, mean and 5/25/50/75/95th percentiles of mastery (%),
+    all topics at once (learners who never answered a topic are left out of it)
+    """
+    answered = cohort.total > 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mastery = np.where(answered, cohort.correct / cohort.total * 100.0, np.nan)
+    learners = answered.sum(axis=0)
+    percentiles = np.nanpercentile(mastery, [5, 25, 50, 75, 95], axis=0) if mastery.size else np.zeros((5, 0))
+    mean = np.where(learners > 0, np.nansum(mastery, axis=0) / np.maximum(learners, 1), 0.0)
+    return {"learners": learners, "mean": mean, "percentiles": percentiles}
+
+
+def item_statistics(cohort: Cohort) -> Dict:
+    """Per question: answers, error rate, most chosen wrong option and its share of the wrong answers"""
+    n_items = len(cohort.digests)
+    answers = np.bincount(cohort.items, minlength=n_items)
+    wrong = ~cohort.answer_correct
+    errors = np.bincount(cohort.items, weights=wrong, minlength=n_items)
+    error_rate = errors / np.maximum(answers, 1)
+
+    known = wrong & (cohort.choices >= 0)
+    width = int(cohort.choices.max(initial=-1)) + 1 or 1
+    distractor_counts = np.bincount(cohort.items[known] * width + cohort.choices[known],
+                                    minlength=n_items * width).reshape(n_items, width)
+    wrong_known = distractor_counts.sum(axis=1)
+    distractor = distractor_counts.argmax(axis=1)
+    distractor_share = distractor_counts.max(axis=1, initial=0) / np.maximum(wrong_known, 1)
+    return {"answers": answers, "error_rate": error_rate, "distractor": distractor,
+            "distractor_share": distractor_share, "wrong_known": wrong_known}
+
+
+# ==========================================================
+# ✅ Dashboard
+# ==========================================================
+class Dashboard(NamedTuple):
+    version: str
+    summary: Dict
+    mastery: List[Dict]  # Table rows per topic
+    items: List[Dict]  # Questions with the highest error rate
+    charts: Dict[str, str]  # Chart name -> PNG path
+
+
+def data_version(cache, learner_store=None) -> str:
+    """Short hash of what the dashboard is built from, computed from file stats and counters only"""
+    learner_store = learner_store or get_learner_store()
+    state = {
+        "analytics": ANALYTICS_VERSION,
+        "profiles": learner_store.version(),
+        "answers": cache.store.answers_version()
+    }
+    return hashlib.sha1(json.dumps(state, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def _mastery_rows(cohort: Cohort, distribution: Dict) -> List[Dict]:
+    order = np.argsort(-distribution["learners"], kind="stable")
+    p5, p25, p50, p75, p95 = distribution["percentiles"]
+    return [{
+        "Sujet": cohort.topics[t],
+        "Apprenants": int(distribution["learners"][t]),
+        "Maîtrise moyenne (%)": round(float(distribution["mean"][t]), 1),
+        "Médiane (%)": round(float(p50[t]), 1),
+        "Q1–Q3 (%)": f"{p25[t]:.0f}–{p75[t]:.0f}"
+    } for t in order]
+
+
+def _item_rows(cache, cohort: Cohort, stats: Dict) -> List[Dict]:
+    eligible = np.flatnonzero(stats["answers"] >= MIN_ANSWERS)
+    hardest = eligible[np.argsort(-stats["error_rate"][eligible], kind="stable")][:TOP_ITEMS]
+    rows = []
+    for position in hardest:
+        record = cache.get_record(cohort.digests[position])
+        row = {
+            "Question": record.question[:80],
+            "Sujet": record.topic,
+            "Niveau": record.level,
+            "Réponses": int(stats["answers"][position]),
+            "Taux d'erreur (%)": round(float(stats["error_rate"][position]) * 100, 1),
+            "Distracteur principal": "",
+            "Part des erreurs (%)": None
+        }
+        if stats["wrong_known"][position]:
+            row["Distracteur principal"] = record.options[stats["distractor"][position]][:60]
+            row["Part des erreurs (%)"] = round(float(stats["distractor_share"][position]) * 100, 1)
+        rows.append(row)
+    return rows
+
+
+def render_charts(cohort: Cohort, distribution: Dict, stats: Dict, item_rows: List[Dict]) -> Dict[str, bytes]:
+    """PNG images of the dashboard (matplotlib is only imported here)"""
+    import io
+
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    charts = {}
+
+    def png(figure):
+        buffer = io.BytesIO()
+        figure.tight_layout()
+        figure.savefig(buffer, format="png", dpi=100)
+        plt.close(figure)
+        return buffer.getvalue()
+
+    topics = [t for t in np.argsort(-distribution["learners"], kind="stable")[:TOP_TOPICS]
+              if distribution["learners"][t]]
+    if topics:
+        p5, p25, p50, p75, p95 = distribution["percentiles"]
+        figure, axis = plt.subplots(figsize=(8, 0.45 * len(topics) + 1.5))
+        axis.bxp([{"label": f"{cohort.topics[t][:30]} ({distribution['learners'][t]})", "whislo": p5[t], "q1": p25[t],
+                   "med": p50[t], "q3": p75[t], "whishi": p95[t], "mean": distribution["mean"][t]} for t in topics][::-1],
+                 orientation="horizontal", showfliers=False, showmeans=True)
+        axis.set_xlim(0, 100)
+        axis.set_xlabel("Maîtrise (%) — boîte : Q1–Q3, moustaches : 5e–95e centile, triangle : moyenne")
+        axis.set_title("Maîtrise par sujet (nombre d'apprenants)")
+        charts["mastery"] = png(figure)
+
+    eligible = stats["answers"] >= MIN_ANSWERS
+    if eligible.any():
+        figure, axis = plt.subplots(figsize=(8, 3.5))
+        axis.hist(stats["error_rate"][eligible] * 100, bins=20, range=(0, 100), color="#d9534f")
+        axis.set_xlabel("Taux d'erreur (%)")
+        axis.set_ylabel("Questions")
+        axis.set_title(f"Taux d'erreur des questions (au moins {MIN_ANSWERS} réponses)")
+        charts["errors"] = png(figure)
+
+    distractor_rows = [row for row in item_rows if row["Part des erreurs (%)"] is not None][:10]
+    if distractor_rows:
+        figure, axis = plt.subplots(figsize=(9, 0.45 * len(distractor_rows) + 2))
+        labels = [f"{row['Question'][:40].rstrip()}…" for row in distractor_rows][::-1]
+        axis.barh(labels, [row["Taux d'erreur (%)"] for row in distractor_rows][::-1], color="#f0ad4e",
+                  label="Taux d'erreur")
+        axis.barh(labels, [row["Taux d'erreur (%)"] * row["Part des erreurs (%)"] / 100 for row in distractor_rows][::-1],
+                  color="#d9534f", label="dont distracteur principal")
+        axis.set_xlim(0, 100)
+        axis.set_xlabel("% des réponses")
+        axis.set_title("Questions les plus manquées")
+        axis.legend(loc="upper center", bbox_to_anchor=(0.5, -0.15), ncol=2)
+        charts["distractors"] = png(figure)
+    return charts
+
+
+class DashboardCache:
+    """
+    Dashboard tables and charts written once per data version in DIRECTORY:
+    while no profile is saved and no answer is logged, the dashboard is read
+    back from disk instead of reloading the cohort and redrawing the charts.
+    Older versions are removed when a new one is written.
+    """
+
+    DIRECTORY = "analytics_cache"
+
+    def __init__(self, directory: str = None):
+        self.directory = directory or os.getenv("QUIZ_ANALYTICS_DIR", self.DIRECTORY)
+        self._lock = threading.Lock()
+
+    def _path(self, version: str, name: str) -> str:
+        return os.path.join(self.directory, f"{name}_{version}")
+
+    def load(self, version: str) -> Optional[Dashboard]:
+        try:
+            with open(self._path(version, "dashboard") + ".json", "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        charts = {name: self._path(version, name) + ".png" for name in data["charts"]}
+        if not all(os.path.exists(path) for path in charts.values()):
+            return None
+        return Dashboard(version, data["summary"], data["mastery"], data["items"], charts)
+
+    def save(self, version: str, summary: Dict, mastery: List[Dict], items: List[Dict],
+             charts: Dict[str, bytes]) -> Dashboard:
+        os.makedirs(self.directory, exist_ok=True)
+        paths = {}
+        for name, image in charts.items():
+            paths[name] = self._path(version, name) + ".png"
+            atomic_write_bytes(paths[name], image)
+        # Written last: a dashboard file means its charts are complete
+        atomic_write_json(self._path(version, "dashboard") + ".json",
+                          {"summary": summary, "mastery": mastery, "items": items, "charts": list(charts)},
+                          ensure_ascii=False)
+        self._prune(version)
+        return Dashboard(version, summary, mastery, items, paths)
+
+    def _prune(self, version: str):
+        for name in os.listdir(self.directory):
+            stem = os.path.splitext(name)[0]
+            if not stem.endswith(f"_{version}"):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass  # Being read or already removed by another process
+
+    def get(self, cache, learner_store=None) -> Dashboard:
+        """The dashboard of the current data, built on the first call after it changed"""
+        version = data_version(cache, learner_store)
+        dashboard = self.load(version)
+        if dashboard is not None:
+            return dashboard
+        with self._lock:
+            dashboard = self.load(version)
+            if dashboard is not None:
+                return dashboard
+            return self.build(cache, learner_store, version)
+
+    def build(self, cache, learner_store, version: str) -> Dashboard:
+        cohort = load_cohort(cache, learner_store)
+        distribution = mastery_distribution(cohort)
+        stats = item_statistics(cohort)
+        mastery = _mastery_rows(cohort, distribution)
+        items = _item_rows(cache, cohort, stats)
+        summary = {
+            "learners": int(cohort.total.shape[0]),
+            "learners_answering": cohort.learners_answering,
+            "topics": len(cohort.topics),
+            "answers": int(len(cohort.items)),
+            "questions": len(cohort.digests),
+            "error_rate": round(float((~cohort.answer_correct).mean()) * 100, 1) if len(cohort.items) else None
+        }
+        return self.save(version, summary, mastery, items, render_charts(cohort, distribution, stats, items))
+
+
+_dashboard_cache = None
+_dashboard_cache_lock = threading.Lock()
+
+
+def get_dashboard_cache() -> DashboardCache:
+    """Process-wide dashboard cache, shared by every teacher session"""
+    global _dashboard_cache
+    if _dashboard_cache is None:
+        with _dashboard_cache_lock:
+            if _dashboard_cache is None:
+                _dashboard_cache = DashboardCache()
+    return _dashboard_cache
+
+
+if __name__ == "__main__":
+    from quiz_generator import get_question_cache
+
+    dashboard = get_dashboard_cache().get(get_question_cache())
+    summary = dashboard.summary
+    print(f"✅ Tableau de bord {dashboard.version} : {summary['learners']} apprenants, {summary['topics']} sujets, "
+          f"{summary['answers']} réponses sur {summary['questions']} questions")
+    for name, path in dashboard.charts.items():
+        print(f"    {name:<12}{path}")
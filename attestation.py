@@ -1,10 +1,16 @@
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.enums import TA_CENTER
-from reportlab.lib.units import cm
+# reportlab is imported on first render: it costs ~0.2 s at startup otherwise
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from functools import lru_cache
+import argparse
+import csv
+import io
 import os
+import zipfile
+
+LOGO_PATH = "assets/logo_universite.png"
+SIGNATURE_PATH = "assets/signature.png"
+
 
 def get_mention(score, total):
     percent = (score / total) * 100
@@ -17,17 +23,16 @@ def get_mention(score, total):
     else:
         return "Insuffisant"
 
-def generate_attestation(nom_apprenant=None, score=None, total=None, sujet=None, **kwargs):
-    file_path = "attestation_quiz.pdf"
 
-    doc = SimpleDocTemplate(
-        file_path,
-        pagesize=A4,
-        rightMargin=2*cm,
-        leftMargin=2*cm,
-        topMargin=2*cm,
-        bottomMargin=2*cm
-    )
+@lru_cache(maxsize=1)
+def _styles():
+    """Paragraph styles, built once per process (first use of reportlab)"""
+    from reportlab import rl_config
+    from reportlab.lib.enums import TA_CENTER
+    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+
+    # Binary image streams: the pure-Python ASCII85 encoder was most of the render time
+    rl_config.useA85 = 0
 
     styles = getSampleStyleSheet()
 
@@ -54,13 +59,74 @@ def generate_attestation(nom_apprenant=None, score=None, total=None, sujet=None,
         alignment=TA_CENTER,
         fontSize=10
     )
+    return title, body, footer
+
+
+@lru_cache(maxsize=None)
+def _image_reader(path):
+    """Decoded image, read and decoded once per process (None if missing)"""
+    if not os.path.exists(path):
+        return None
+    from reportlab.lib.utils import ImageReader
+    return ImageReader(path)
+
+
+@lru_cache(maxsize=1)
+def _cached_image_class():
+    """Flowable drawing an already decoded image, defined on first use of reportlab"""
+    from reportlab.platypus import Flowable
+
+    class CachedImage(Flowable):
+        """Fixed-size image drawn from a shared ImageReader, so the file is never reopened"""
+
+        def __init__(self, reader, width, height):
+            super().__init__()
+            self.reader = reader
+            self.drawWidth = width
+            self.drawHeight = height
+            self.hAlign = "CENTER"
+
+        def wrap(self, availWidth, availHeight):
+            return self.drawWidth, self.drawHeight
+
+        def draw(self):
+            self.canv.drawImage(self.reader, 0, 0, self.drawWidth, self.drawHeight, mask="auto")
+
+    return CachedImage
+
+
+def _image(path, width, height):
+    """Flowable drawing the cached decoded image of `path` (None if missing)"""
+    reader = _image_reader(path)
+    if reader is None:
+        return None
+    return _cached_image_class()(reader, width, height)
+
+
+def render_attestation(nom_apprenant=None, score=None, total=None, sujet=None, date=None, **kwargs) -> bytes:
+    """Render the certificate in memory and return the PDF bytes"""
+    title, body, footer = _styles()
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import cm
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer
+
+    buffer = io.BytesIO()
+
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=A4,
+        rightMargin=2*cm,
+        leftMargin=2*cm,
+        topMargin=2*cm,
+        bottomMargin=2*cm
+    )
 
     story = []
 
     # -------- LOGO --------
-    logo_path = "assets/logo_universite.png"
-    if os.path.exists(logo_path):
-        story.append(Image(logo_path, width=4*cm, height=4*cm))
+    logo = _image(LOGO_PATH, width=4*cm, height=4*cm)
+    if logo is not None:
+        story.append(logo)
     story.append(Spacer(1, 1*cm))
 
     # -------- TITLE --------
@@ -79,16 +145,16 @@ def generate_attestation(nom_apprenant=None, score=None, total=None, sujet=None,
         f"Sujet : <b>{sujet}</b><br/>"
         f"Score obtenu : <b>{score} / {total}</b><br/>"
         f"Mention : <b>{mention}</b><br/><br/>"
-        f"Date : {datetime.now().strftime('%d/%m/%Y')}",
+        f"Date : {(date or datetime.now()).strftime('%d/%m/%Y')}",
         body
     ))
 
     story.append(Spacer(1, 2*cm))
 
     # -------- SIGNATURE --------
-    signature_path = "assets/signature.png"
-    if os.path.exists(signature_path):
-        story.append(Image(signature_path, width=5*cm, height=2*cm))
+    signature = _image(SIGNATURE_PATH, width=5*cm, height=2*cm)
+    if signature is not None:
+        story.append(signature)
 
     story.append(Spacer(1, 0.5*cm))
     story.append(Paragraph(
@@ -97,4 +163,86 @@ def generate_attestation(nom_apprenant=None, score=None, total=None, sujet=None,
     ))
 
     doc.build(story)
+    return buffer.getvalue()
+
+
+def generate_attestation(nom_apprenant=None, score=None, total=None, sujet=None, file_path="attestation_quiz.pdf", **kwargs):
+    """Render the certificate and write it to `file_path`"""
+    pdf = render_attestation(nom_apprenant=nom_apprenant, score=score, total=total, sujet=sujet, **kwargs)
+    with open(file_path, "wb") as f:
+        f.write(pdf)
     return file_path
+
+
+def _render_record(record):
+    return render_attestation(**record)
+
+
+def render_attestations_batch(records, max_workers=None):
+    """
+    Render certificates for a whole cohort on a process pool.
+    `records` are dicts with nom_apprenant, score, total and sujet;
+    returns the PDF bytes in the same order.
+    """
+    records = list(records)
+    if not records:
+        return []
+    workers = max_workers or os.cpu_count() or 1
+    chunksize = max(1, len(records) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_render_record, records, chunksize=chunksize))
+
+
+def write_attestations_zip(records, max_workers=None) -> bytes:
+    """Render a cohort and pack the certificates in a ZIP archive (one PDF per learner)"""
+    records = list(records)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for position, (record, pdf) in enumerate(zip(records, render_attestations_batch(records, max_workers)), start=1):
+            name = "".join(c if c.isalnum() else "_" for c in str(record.get("nom_apprenant", ""))).strip("_")
+            archive.writestr(f"{position:04d}_{name or 'apprenant'}.pdf", pdf)
+    return buffer.getvalue()
+
+
+def read_records(path):
+    """
+    Cohort records from a CSV file with the columns nom_apprenant, score,
+    total and sujet (and optionally date, as DD/MM/YYYY)
+    """
+    records = []
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        for line, row in enumerate(csv.DictReader(f), start=2):
+            try:
+                record = {
+                    "nom_apprenant": row["nom_apprenant"].strip(),
+                    "score": int(row["score"]),
+                    "total": int(row["total"]),
+                    "sujet": row["sujet"].strip()
+                }
+                if row.get("date"):
+                    record["date"] = datetime.strptime(row["date"].strip(), "%d/%m/%Y")
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(f"❌ Ligne {line} de {path} invalide : {e}") from e
+            records.append(record)
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Générer les attestations d'une cohorte dans une archive ZIP")
+    parser.add_argument("csv", help="fichier CSV : nom_apprenant, score, total, sujet (et date, facultative)")
+    parser.add_argument("--output", default="attestations.zip")
+    parser.add_argument("--workers", type=int, help="processus de rendu (par défaut : un par cœur)")
+    args = parser.parse_args()
+
+    records = read_records(args.csv)
+    if not records:
+        print(f"⚠️ Aucun apprenant dans {args.csv}")
+        return
+    archive = write_attestations_zip(records, args.workers)
+    with open(args.output, "wb") as f:
+        f.write(archive)
+    print(f"✅ {len(records)} attestations écrites dans {args.output}")
+
+
+if __name__ == "__main__":
+    main()
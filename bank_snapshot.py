@@ -0,0 +1,78 @@
+"""
+Question Bank Snapshot
+Versioned binary image of the in-memory bank (compact records plus the
+prebuilt near-duplicate index), so a new process neither re-parses the JSON
+bank nor recomputes every MinHash signature
+"""
+
+import os
+import pickle
+from typing import Dict, List, NamedTuple, Optional
+
+from file_utils import atomic_write_bytes
+from question_store import QuestionRecord
+
+MAGIC = b"SQBANK"
+# Bump when the payload layout changes: older snapshots are then ignored and rebuilt
+VERSION = 1
+HEADER = MAGIC + VERSION.to_bytes(2, "little")
+
+COLUMNS = ["id", "topic", "level", "question", "options", "correct_answer", "type", "user_choice"]
+
+
+class BankSnapshot(NamedTuple):
+    fingerprint: Dict  # Store state the snapshot matches (see the stores' fingerprint())
+    records: List[QuestionRecord]  # In near-duplicate index row order
+    near: Dict  # NearDuplicateIndex.export_state()
+
+
+def default_path(store) -> Optional[str]:
+    """Snapshot file next to the store's file; None when disabled (QUIZ_BANK_SNAPSHOT=0)"""
+    if os.getenv("QUIZ_BANK_SNAPSHOT", "1") == "0":
+        return None
+    path = getattr(store, "path", None)
+    return f"{path}.snapshot" if path else None
+
+
+def save(path: str, fingerprint: Dict, records: List[QuestionRecord], near: Dict):
+    """Write the snapshot atomically, one column per field"""
+    columns = {field: [getattr(record, field) for record in records] for field in COLUMNS}
+    columns["digest"] = b"".join(record.digest for record in records)
+    payload = pickle.dumps({"fingerprint": fingerprint, "columns": columns, "near": near},
+                           protocol=pickle.HIGHEST_PROTOCOL)
+    atomic_write_bytes(path, HEADER + payload)
+
+
+def load(path: str) -> Optional[BankSnapshot]:
+    """
+    Read a snapshot; None if it is missing, from another version or unreadable.
+    The file is written by the app next to its own bank and trusted like it.
+    """
+    try:
+        with open(path, "rb") as f:
+            header = f.read(len(HEADER))
+            if header[:len(MAGIC)] != MAGIC:
+                print(f"⚠️ {path} n'est pas un snapshot de banque, ignoré")
+                return None
+            if header != HEADER:
+                print(f"ℹ️ Snapshot de banque d'une autre version ignoré ({path}), reconstruction")
+                return None
+            data = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ValueError) as e:
+        print(f"⚠️ Snapshot de banque illisible ({e}), rechargement depuis le stockage")
+        return None
+
+    columns = data["columns"]
+    digests = columns["digest"]
+    records = [
+        QuestionRecord(digests[16 * row:16 * (row + 1)], *fields)
+        for row, fields in enumerate(zip(*(columns[field] for field in COLUMNS)))
+    ]
+    return BankSnapshot(data["fingerprint"], records, data["near"])
+
+
+def remove(path: Optional[str]):
+    if path and os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,146 @@
+"""
+Adaptive selection simulation
+
+Simulated learners with a known ability answer a synthetic bank whose items
+have known 2PL parameters. A first cohort takes exams with the coarse rule
+(three right answers up, two wrong down) and random draws; its answer log
+is calibrated and the fitted parameters are compared with the true ones.
+A second cohort takes every exam twice, once with the coarse rule and once
+with IRT selection, and the report compares how many questions each needs
+to settle on the learner's true level.
+
+    python -m benchmarks.adaptive
+    python -m benchmarks.adaptive --items 200 --calibration-learners 800 --learners 300 --length 20
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.micro import _vocabulary, build_store, synthetic_question
+from irt import LEVEL_DIFFICULTY, AbilityEstimate, Calibration, calibrate, level_for, probability
+from learner_model import LEVELS, adapt_level
+from question_cache import QuestionCache
+from question_store import QuestionRecord
+
+TOPIC = "simulation"
+
+
+def synthetic_bank(items_per_level, rng):
+    """Records of one topic and their true (discrimination, difficulty) by digest"""
+    words = _vocabulary(rng, 5_000)
+    records, truth = [], {}
+    for level in LEVELS:
+        for _ in range(items_per_level):
+            record = QuestionRecord.from_question(synthetic_question(rng, words, TOPIC, level, len(records)))
+            truth[record.digest] = (float(np.exp(rng.gauss(0.0, 0.3))), rng.gauss(LEVEL_DIFFICULTY[level], 0.5))
+            records.append(record)
+    return records, truth
+
+
+def run_exam(cache, truth, theta, start, length, use_irt, rng, learner):
+    """Levels reported after each answer of one exam (and, with IRT, the answer count at first confidence)"""
+    session = cache.session()
+    session.start_session(learner)
+    ability = session.track_ability(TOPIC, start) if use_irt else None
+    level, streak_correct, streak_incorrect = start, 0, 0
+    levels, confident_at = [], None
+    for _ in range(length):
+        question = session.get_cached_question(TOPIC, level)
+        if question is None:
+            break
+        session.mark_as_asked(question)
+        a, b = truth[cache.get_question_hash(question)]
+        correct = rng.random() < probability(theta, a, b)
+        wrong = next(option for option in question.options if option != question.correct_answer)
+        session.save_user_choice(question, question.correct_answer if correct else wrong)
+        if ability is not None:
+            level = ability.level()
+            if confident_at is None and ability.is_confident():
+                confident_at = len(levels) + 1
+        else:
+            level, streak_correct, streak_incorrect, _ = adapt_level(level, streak_correct, streak_incorrect, correct)
+        levels.append(level)
+    return levels, confident_at
+
+
+def settled_after(levels, target, length):
+    """Answers after which the reported level is the true one until the end (length + 1 if never)"""
+    settled = length + 1
+    for position in range(len(levels), 0, -1):
+        if levels[position - 1] != target:
+            break
+        settled = position
+    return settled
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Coarse adaptive rule vs IRT selection on simulated learners")
+    parser.add_argument("--items", type=int, default=150, help="items per level")
+    parser.add_argument("--calibration-learners", type=int, default=600)
+    parser.add_argument("--learners", type=int, default=200, help="learners compared on both policies")
+    parser.add_argument("--length", type=int, default=20, help="questions per exam")
+    parser.add_argument("--start", choices=LEVELS, default="Beginner", help="starting level")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    records, truth = synthetic_bank(args.items, rng)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = build_store("sqlite", tmp, records)
+        calibration = Calibration(os.path.join(tmp, "irt_params.json"))
+        cache = QuestionCache(store, snapshot=False, calibration=calibration)
+
+        # -------- Calibration from coarse-rule exams --------
+        started = time.perf_counter()
+        for learner in range(args.calibration_learners):
+            run_exam(cache, truth, rng.gauss(0.0, 1.0), args.start, args.length, False, rng, f"calibration {learner}")
+        simulated = time.perf_counter() - started
+        summary = calibrate(cache, calibration)
+        fitted = [(truth[digest], calibration.params(digest, None)) for digest in calibration.items
+                  if calibration.is_calibrated(digest)]
+        true_a, true_b = np.array([t for t, _ in fitted]).T
+        fit_a, fit_b = np.array([f for _, f in fitted]).T
+        print(f"Calibration : {summary['answers']} réponses de {summary['learners']} apprenants simulées en {simulated:.1f}s, "
+              f"ajustées en {summary['seconds']}s ({summary['iterations']} itérations)")
+        print(f"    items calibrés            {summary['calibrated']} / {len(records)}")
+        print(f"    corrélation difficulté    {np.corrcoef(true_b, fit_b)[0, 1]:.3f}  "
+              f"(écart quadratique {np.sqrt(np.mean((true_b - fit_b) ** 2)):.3f})")
+        print(f"    corrélation discrimination {np.corrcoef(true_a, fit_a)[0, 1]:.3f}")
+
+        # -------- Same learners, both policies --------
+        checkpoints = [k for k in (3, 5, 10, args.length) if k <= args.length]
+        results = {False: {"settled": [], "correct": {k: 0 for k in checkpoints}},
+                   True: {"settled": [], "correct": {k: 0 for k in checkpoints}, "confident": [], "confident_correct": 0}}
+        for learner in range(args.learners):
+            theta = rng.gauss(0.0, 1.0)
+            target = level_for(theta)
+            for use_irt in (False, True):
+                levels, confident_at = run_exam(cache, truth, theta, args.start, args.length, use_irt, rng,
+                                                f"comparison {learner}")
+                result = results[use_irt]
+                result["settled"].append(settled_after(levels, target, args.length))
+                for k in checkpoints:
+                    result["correct"][k] += len(levels) >= k and levels[k - 1] == target
+                if use_irt and confident_at is not None:
+                    result["confident"].append(confident_at)
+                    result["confident_correct"] += levels[confident_at - 1] == target
+
+    print(f"\n{'politique':<22}{'questions pour se fixer':>26}" + "".join(f"{'juste après ' + str(k):>16}" for k in checkpoints))
+    for use_irt, name in ((False, "règle 3/2, aléatoire"), (True, "IRT, info. maximale")):
+        result = results[use_irt]
+        print(f"{name:<22}{np.mean(result['settled']):>26.1f}"
+              + "".join(f"{result['correct'][k] / args.learners:>16.0%}" for k in checkpoints))
+    confident = results[True]["confident"]
+    if confident:
+        print(f"\nIRT : niveau atteint avec {results[True]['confident_correct'] / len(confident):.0%} de justesse "
+              f"et une confiance ≥ {AbilityEstimate.CONFIDENCE:.0%} après {np.mean(confident):.1f} questions en moyenne "
+              f"({len(confident)} apprenants sur {args.learners})")
+
+
+if __name__ == "__main__":
+    main()
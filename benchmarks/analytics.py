@@ -0,0 +1,91 @@
+"""
+Cohort analytics benchmark
+
+Builds the teacher dashboard on a synthetic cohort (learner profiles and an
+answer log over a synthetic bank) and times each step of a cold build,
+then the warm load served from the chart cache.
+
+    python -m benchmarks.analytics
+    python -m benchmarks.analytics --learners 20000 --answers 500000 --items 5000
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+import analytics
+from benchmarks.micro import TOPICS, build_store, synthetic_records
+from learner_model import LearnerStore
+from question_cache import QuestionCache
+
+
+def synthetic_cohort(tmp, learners, answers, items, rng):
+    """(cache, learner store) with `learners` profiles and `answers` logged answers"""
+    records = synthetic_records(items)
+    store = build_store("json", tmp, records)
+    learner_store = LearnerStore(directory=os.path.join(tmp, "profiles"), flush_interval=3600)
+    os.makedirs(learner_store.directory)
+    for learner in range(learners):
+        name = f"Apprenant {learner}"
+        ability = rng.random()
+        scores = {}
+        for topic in rng.sample(TOPICS, rng.randint(1, 4)):
+            total = rng.randint(5, 40)
+            scores[topic] = {"correct": sum(rng.random() < ability for _ in range(total)), "total": total}
+        with open(learner_store.path(name), "w") as f:
+            json.dump({"learner": name, "scores": scores}, f)
+
+    # Same lines as JsonQuestionStore.log_answer, written in one go
+    with open(store.answers_path, "w", encoding="utf-8") as f:
+        for _ in range(answers):
+            record = records[rng.randrange(items)]
+            choice = rng.choice(record.options)
+            f.write(json.dumps({"hash": record.hash, "learner": f"l{rng.randrange(learners)}",
+                                "correct": choice == record.correct_answer, "choice": choice,
+                                "at": 0}, ensure_ascii=False) + "\n")
+    return QuestionCache(store, snapshot=False), learner_store
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold and cached builds of the teacher dashboard")
+    parser.add_argument("--learners", type=int, default=5_000)
+    parser.add_argument("--answers", type=int, default=100_000)
+    parser.add_argument("--items", type=int, default=2_000, help="questions in the bank")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        cache, learner_store = synthetic_cohort(tmp, args.learners, args.answers, args.items, rng)
+        dashboards = analytics.DashboardCache(os.path.join(tmp, "analytics_cache"))
+
+        version, version_time = timed(analytics.data_version, cache, learner_store)
+        cohort, load_time = timed(analytics.load_cohort, cache, learner_store)
+        distribution, mastery_time = timed(analytics.mastery_distribution, cohort)
+        stats, items_time = timed(analytics.item_statistics, cohort)
+        _, cold_time = timed(dashboards.get, cache, learner_store)
+        dashboard, warm_time = timed(dashboards.get, cache, learner_store)
+
+    print(f"Cohorte : {args.learners} apprenants, {len(cohort.topics)} sujets, "
+          f"{len(cohort.items)} réponses sur {len(cohort.digests)} questions")
+    for name, seconds in (("version des données", version_time),
+                          ("chargement en tableaux", load_time),
+                          ("distributions de maîtrise", mastery_time),
+                          ("erreurs et distracteurs", items_time),
+                          ("tableau de bord (à froid)", cold_time),
+                          ("tableau de bord (en cache)", warm_time)):
+        print(f"    {name:<30}{seconds * 1000:>10.1f} ms")
+    print(f"    graphiques : {', '.join(dashboard.charts)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+End-to-end generation benchmark
+
+Drives quiz_generator.generate_question across topics and levels against the
+replay backend (or the live API) and reports throughput, latency, retries and
+cache hit ratio. The question bank and the generation telemetry used during
+the run are temporary, so the app's tuning data is never touched.
+
+    python -m benchmarks.generation --synthetic --latency 0.3 --low-quality-rate 0.2
+
+Replayed fixtures repeat once exhausted, and a repeat is rejected as a
+duplicate: --synthetic replays enough distinct questions for the run, and
+the report counts duplicate rejections apart from the quality ones.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+import generation_stats
+import llm_backend
+import quiz_generator
+from benchmarks.micro import _vocabulary, synthetic_question
+from generation_stats import GenerationTelemetry, percentile
+from model_router import DEFAULT_MODELS
+from question_cache import QuestionCache
+from question_store import JsonQuestionStore, QuestionRecord, SqliteQuestionStore
+
+
+class CountingBackend:
+    """Wraps a backend and counts completion calls"""
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.name = inner.name
+        self.requires_api_key = inner.requires_api_key
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def complete(self, request):
+        with self._lock:
+            self.calls += 1
+        return self.inner.complete(request)
+
+    async def acomplete(self, request):
+        with self._lock:
+            self.calls += 1
+        return await self.inner.acomplete(request)
+
+    def stream(self, request):
+        with self._lock:
+            self.calls += 1
+        return self.inner.stream(request)
+
+
+def synthetic_fixtures(topics, levels, per_bucket, fixtures_dir, batch_size, seed=0):
+    """Replay fixtures of `per_bucket` distinct questions per (topic, level); returns the file count"""
+    rng = random.Random(seed)
+    words = _vocabulary(rng)
+    records = []
+    for topic in topics:
+        for level in levels:
+            for _ in range(per_bucket):
+                question = synthetic_question(rng, words, topic, level, len(records))
+                records.append(QuestionRecord.from_question(question).as_dict())
+    return llm_backend.seed_fixtures_from_records(records, fixtures_dir, batch_size)
+
+
+def rejections(telemetry):
+    """Rejected attempts by reason, over every bucket of `telemetry`"""
+    counts = {}
+    for bucket in telemetry.buckets.values():
+        for reason, count in bucket["rejections"].items():
+            counts[reason] = counts.get(reason, 0) + count
+    return counts
+
+
+def run(topics, levels, per_bucket, params, backend, store, telemetry):
+    counting = CountingBackend(backend)
+    llm_backend.set_backend(counting)
+    # Batches and accepted questions are added through get_question_cache(): point it at the temporary bank
+    cache = QuestionCache(store, snapshot=False)
+    previous_cache, quiz_generator._question_cache = quiz_generator._question_cache, cache
+    # Replayed latencies and rejections must not tune the app's hedge delay, temperature or budgets
+    previous_telemetry = generation_stats.set_telemetry(telemetry)
+    session = cache.session()
+    session.start_session()
+
+    latencies, miss_retries = [], []
+    hits = failures = 0
+    started = time.perf_counter()
+    try:
+        for topic in topics:
+            for level in levels:
+                for index in range(1, per_bucket + 1):
+                    calls_before = counting.calls
+                    t0 = time.perf_counter()
+                    try:
+                        question = quiz_generator.generate_question(topic, level, index, params, session)
+                    except Exception as e:
+                        failures += 1
+                        print(f"⚠️ {topic}/{level} #{index} : {e}")
+                        continue
+                    latencies.append(time.perf_counter() - t0)
+                    calls = counting.calls - calls_before
+                    if calls == 0:
+                        hits += 1
+                    else:
+                        miss_retries.append(calls - 1)
+                    session.mark_as_asked(question)
+    finally:
+        quiz_generator._question_cache = previous_cache
+        generation_stats.set_telemetry(previous_telemetry)
+    elapsed = time.perf_counter() - started
+
+    served = len(latencies)
+    rejected = rejections(telemetry)
+    duplicates = rejected.pop(generation_stats.DUPLICATE, 0)
+    return {
+        "backend": backend.name,
+        "served": served,
+        "failures": failures,
+        "api_calls": counting.calls,
+        "elapsed_s": round(elapsed, 3),
+        "questions_per_s": round(served / elapsed, 2) if elapsed else 0.0,
+        "latency_p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "latency_p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "latency_p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "retries_per_accepted": round(statistics.mean(miss_retries), 3) if miss_retries else 0.0,
+        "quality_rejections": rejected,
+        "duplicate_rejections": duplicates,
+        "cache_hit_ratio": round(hits / served, 3) if served else 0.0,
+        "prompt_tokens": session.usage.prompt_tokens,
+        "completion_tokens": session.usage.completion_tokens,
+        "tokens_per_question": session.usage.per_question(served),
+        "bank_size": cache.get_stats()["total_cached"]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark question generation")
+    parser.add_argument("--topics", nargs="+", default=["python"])
+    parser.add_argument("--levels", nargs="+", default=["Beginner", "Intermediate", "Advanced"])
+    parser.add_argument("--questions", type=int, default=20, help="questions per (topic, level)")
+    parser.add_argument("--backend", choices=["replay", "live"], default="replay")
+    parser.add_argument("--fixtures", default="fixtures", help="replay fixture directory")
+    parser.add_argument("--seed-from-cache", action="store_true",
+                        help="build replay fixtures from questions_cache.json into a temporary directory")
+    parser.add_argument("--synthetic", action="store_true",
+                        help="replay distinct synthetic questions, enough that none repeats during the run")
+    parser.add_argument("--latency", type=float, default=0.0, help="artificial replay latency (s)")
+    parser.add_argument("--low-quality-rate", type=float, default=0.0)
+    parser.add_argument("--invalid-json-rate", type=float, default=0.0)
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="share of replayed calls 10x slower than --latency")
+    parser.add_argument("--candidates", type=int, default=quiz_generator.DEFAULT_CANDIDATES,
+                        help="candidate completions raced per question")
+    parser.add_argument("--routing", nargs="*", metavar="MODEL",
+                        help="route between these models (default: the router's models)")
+    parser.add_argument("--no-hedge", action="store_true", help="never send a hedge request after p95 latency")
+    parser.add_argument("--batch-size", type=int, default=quiz_generator.DEFAULT_BATCH_SIZE)
+    parser.add_argument("--no-streaming", action="store_true", help="wait for full completions before validating")
+    parser.add_argument("--fixed-max-tokens", action="store_true", help="always send the configured max_tokens")
+    parser.add_argument("--store", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--warm", action="store_true", help="start from a copy of the current bank instead of an empty one")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the report as JSON to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fixtures = args.fixtures
+        if args.backend == "replay" and args.seed_from_cache:
+            fixtures = os.path.join(tmp, "fixtures")
+            count = llm_backend.seed_fixtures_from_records(
+                [record.as_dict() for record in JsonQuestionStore().load()], fixtures, args.batch_size)
+            print(f"{count} fixtures générées depuis {JsonQuestionStore.FILE}")
+        elif args.backend == "replay" and args.synthetic:
+            fixtures = os.path.join(tmp, "fixtures")
+            # Room for retries and for the extra questions of batches
+            count = synthetic_fixtures(args.topics, args.levels, args.questions * 4, fixtures,
+                                       args.batch_size, args.seed)
+            print(f"{count} fixtures synthétiques générées")
+
+        if args.backend == "replay":
+            backend = llm_backend.ReplayBackend(fixtures, args.latency, args.low_quality_rate,
+                                                args.invalid_json_rate, seed=args.seed, slow_rate=args.slow_rate)
+        else:
+            backend = llm_backend.GroqBackend()
+
+        if args.store == "sqlite":
+            store = SqliteQuestionStore(os.path.join(tmp, "bank.db"))
+        else:
+            store = JsonQuestionStore(os.path.join(tmp, "bank.json"))
+        if args.warm:
+            for record in JsonQuestionStore().load():
+                store.upsert(record)
+
+        params = {
+            "api_key": os.getenv("GROQ_API_KEY"),
+            "model": "llama-3.1-8b-instant",
+            "temperature": 0.5,
+            "max_tokens": 600,
+            "batch_size": args.batch_size,
+            "streaming": not args.no_streaming,
+            "adaptive_max_tokens": not args.fixed_max_tokens,
+            "candidates": args.candidates,
+            "hedge": not args.no_hedge
+        }
+        if args.routing is not None:
+            params.update(routing=True, models=args.routing or DEFAULT_MODELS)
+        telemetry = GenerationTelemetry(os.path.join(tmp, "generation_stats.json"))
+        report = run(args.topics, args.levels, args.questions, params, backend, store, telemetry)
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+Microbenchmarks of the hot paths
+
+Times the question cache, the learner model, response parsing and the
+attestation on synthetic banks of growing size, saves the results as a
+JSON baseline and flags regressions against a previous baseline.
+
+    python -m benchmarks.micro --save benchmarks/baselines/micro.json
+    python -m benchmarks.micro --compare benchmarks/baselines/micro.json --threshold 0.2
+
+Bank sizes default to 1k, 10k and 100k questions; --full adds 1M (several
+minutes and a few GB of memory). Every run works on temporary copies: the
+real bank, profiles and attestation are never touched.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+from attestation import generate_attestation
+from learner_model import LEVELS, LearnerModel, LearnerStore
+from models import Question
+from question_cache import QuestionCache
+from question_store import JsonQuestionStore, QuestionRecord, SqliteQuestionStore
+from quiz_generator import extract_json_from_text, is_low_quality
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+FULL_SIZES = DEFAULT_SIZES + [1_000_000]
+TOPICS = ["python", "machine learning", "web", "sql", "réseaux", "algorithmique", "linux", "sécurité"]
+
+SAMPLE_REPLY = """Voici la question :
+{"id": "q_1", "topic": "python", "level": "Intermediate",
+ "question": "Que renvoie sorted() appliqué à un dictionnaire dont les clés sont des chaînes ?",
+ "options": ["La liste triée des clés", "La liste triée des valeurs", "Un dictionnaire trié", "Une erreur TypeError"],
+ "correct_answer": "La liste triée des clés", "type": "MCQ"}
+Bonne chance !"""
+
+
+# ==========================================================
+# ✅ Synthetic data
+# ==========================================================
+def _vocabulary(rng, size=20_000):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(4, 10))) for _ in range(size)]
+
+
+def synthetic_question(rng, words, topic, level, index) -> Question:
+    """A distinct question (random words, so no two are near-duplicates)"""
+    options = [" ".join(rng.sample(words, 3)) for _ in range(4)]
+    return Question(
+        id=f"q_{index}",
+        topic=topic,
+        level=level,
+        question=f"Dans le cas {index}, " + " ".join(rng.sample(words, 12)) + " ?",
+        options=options,
+        correct_answer=options[0],
+        type="MCQ"
+    )
+
+
+def synthetic_records(size, seed=0):
+    """`size` bank records spread over TOPICS x LEVELS"""
+    rng = random.Random(seed)
+    words = _vocabulary(rng)
+    records = []
+    for index in range(size):
+        question = synthetic_question(rng, words, TOPICS[index % len(TOPICS)],
+                                      LEVELS[(index // len(TOPICS)) % len(LEVELS)], index)
+        records.append(QuestionRecord.from_question(question))
+    return records
+
+
+def build_store(kind, directory, records):
+    """A store of `kind` holding `records`, written in one go"""
+    if kind == "sqlite":
+        store = SqliteQuestionStore(os.path.join(directory, "bank.db"))
+        with store._connect() as connection:
+            connection.executemany(
+                "INSERT INTO questions (hash, id, topic, level, question, options, correct_answer, type, user_choice) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(r.hash, r.id, r.topic, r.level, r.question, json.dumps(list(r.options), ensure_ascii=False),
+                  r.correct_answer, r.type, r.user_choice) for r in records]
+            )
+        return store
+    path = os.path.join(directory, "bank.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"questions": [r.as_dict() for r in records], "session_asked": []}, f, ensure_ascii=False)
+    return JsonQuestionStore(path)
+
+
+# ==========================================================
+# ✅ Timing
+# ==========================================================
+def measure(func, ops=1, repeat=5, setup=None):
+    """
+    Best seconds per operation over `repeat` runs of `ops` calls (the minimum
+    is the least noisy estimate for sub-microsecond paths).
+    `setup()` runs before each repeat, untimed, and its result is passed to `func`.
+    """
+    samples = []
+    for _ in range(repeat):
+        state = setup() if setup else None
+        started = time.perf_counter()
+        for i in range(ops):
+            func(state, i)
+        samples.append((time.perf_counter() - started) / ops)
+    return min(samples)
+
+
+def _result(name, size, seconds, ops):
+    return {"name": name, "size": size, "us_per_op": round(seconds * 1e6, 3), "ops": ops}
+
+
+def bench_bank(size, kind, seed=0):
+    """Cache benchmarks on a bank of `size` questions"""
+    results = []
+    records = synthetic_records(size, seed)
+    rng = random.Random(seed + 1)
+    words = _vocabulary(rng, 5_000)
+    big = size >= 100_000
+    with tempfile.TemporaryDirectory() as tmp:
+        store = build_store(kind, tmp, records)
+        del records
+
+        # Load: read the store and build the hash and bucket indexes
+        load = measure(lambda _, i: QuestionCache(store, snapshot=False), ops=1, repeat=1 if big else 3)
+        results.append(_result("QuestionCache.load", size, load, 1))
+        # The near-duplicate index is built on its first query
+        probe = synthetic_question(rng, words, "bench", "Beginner", -1)
+        build = measure(lambda loaded, i: loaded.find_near_duplicates(probe), ops=1, repeat=1 if big else 3,
+                        setup=lambda: QuestionCache(store, snapshot=False))
+        results.append(_result("QuestionCache.near_index", size, build, 1))
+        cache = QuestionCache(store, snapshot=os.path.join(tmp, "bank.snapshot"))
+        cache.save_snapshot(force=True)
+        # Load from the snapshot: records and paraphrase index restored without parsing or MinHash
+        snapshot = measure(lambda _, i: QuestionCache(store, snapshot=cache.snapshot_path), ops=1, repeat=3)
+        results.append(_result("QuestionCache.load_snapshot", size, snapshot, 1))
+
+        ops = 200
+        lookup = measure(lambda session, i: session.get_cached_question(TOPICS[i % len(TOPICS)], LEVELS[i % 3]),
+                         ops=ops, setup=cache.session)
+        results.append(_result("get_cached_question", size, lookup, ops))
+
+        def draw_and_mark(session, i):
+            question = session.get_cached_question(TOPICS[i % len(TOPICS)], LEVELS[i % 3])
+            if question is not None:
+                session.mark_as_asked(question)
+        mark = measure(draw_and_mark, ops=ops, setup=cache.session)
+        results.append(_result("get_cached_question+mark_as_asked", size, mark, ops))
+
+        # Writes go to the store: the JSON store rewrites the whole file each time
+        write_ops = 5 if (kind == "json" and big) else 50
+        write_repeat = 1 if (kind == "json" and big) else 3
+        counter = iter(range(10 ** 9))
+        fresh = lambda: [synthetic_question(rng, words, "bench", "Advanced", size + next(counter))
+                         for _ in range(write_ops)]
+        add = measure(lambda questions, i: cache.add_question(questions[i]), ops=write_ops,
+                      repeat=write_repeat, setup=fresh)
+        results.append(_result("add_question", size, add, write_ops))
+
+        existing = [record.to_question() for record in cache.cache["questions"][:write_ops]]
+        choice = measure(lambda _, i: cache.save_user_choice(existing[i], existing[i].options[1]),
+                         ops=write_ops, repeat=write_repeat)
+        results.append(_result("save_user_choice", size, choice, write_ops))
+
+        near = measure(lambda questions, i: cache.find_near_duplicates(questions[i]), ops=ops,
+                       setup=lambda: [synthetic_question(rng, words, "bench", "Beginner", i) for i in range(ops)])
+        results.append(_result("find_near_duplicates", size, near, ops))
+    return results
+
+
+def bench_fixed():
+    """Benchmarks that do not depend on the bank size"""
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        store = LearnerStore(directory=os.path.join(tmp, "profiles"), flush_interval=3600)
+        store.LEGACY_FILE = os.path.join(tmp, "learner_profile.json")
+        model = LearnerModel("Bench Learner", store=store)
+        ops = 10_000
+        update = measure(lambda _, i: model.update(TOPICS[i % len(TOPICS)], correct=i % 3 != 0), ops=ops)
+        results.append(_result("LearnerModel.update", None, update, ops))
+        mastery = measure(lambda _, i: model.mastery(TOPICS[i % len(TOPICS)]), ops=ops)
+        results.append(_result("LearnerModel.mastery", None, mastery, ops))
+
+        parse = measure(lambda _, i: extract_json_from_text(SAMPLE_REPLY), ops=ops)
+        results.append(_result("extract_json_from_text", None, parse, ops))
+        data = extract_json_from_text(SAMPLE_REPLY)
+        quality = measure(lambda _, i: is_low_quality(data), ops=ops)
+        results.append(_result("is_low_quality", None, quality, ops))
+
+        pdf_path = os.path.join(tmp, "attestation.pdf")
+        attestation = measure(lambda _, i: generate_attestation("Bench Learner", 8, 10, "python", file_path=pdf_path),
+                              ops=10)
+        results.append(_result("generate_attestation", None, attestation, 10))
+    return results
+
+
+# ==========================================================
+# ✅ Baselines
+# ==========================================================
+def _key(result):
+    return f"{result['name']}@{result['size']}"
+
+
+def compare(results, baseline, threshold):
+    """Rows (name, size, baseline µs, current µs, ratio, regressed) for every shared benchmark"""
+    previous = {_key(r): r for r in baseline["results"]}
+    rows = []
+    for result in results:
+        old = previous.get(_key(result))
+        if old is None or not old["us_per_op"]:
+            continue
+        ratio = result["us_per_op"] / old["us_per_op"]
+        rows.append((result["name"], result["size"], old["us_per_op"], result["us_per_op"], ratio, ratio > 1 + threshold))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks of the cache, learner model and parsing")
+    parser.add_argument("--sizes", type=int, nargs="+", help="bank sizes (default: 1k 10k 100k)")
+    parser.add_argument("--full", action="store_true", help="also run the 1M-question bank")
+    parser.add_argument("--store", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="write the results as a JSON baseline to this file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="slowdown ratio flagged as a regression (0.2 = +20%%)")
+    args = parser.parse_args()
+
+    sizes = args.sizes or (FULL_SIZES if args.full else DEFAULT_SIZES)
+    results = bench_fixed()
+    for size in sizes:
+        print(f"… banque de {size} questions ({args.store})", file=sys.stderr)
+        results.extend(bench_bank(size, args.store, args.seed))
+
+    print(f"{'benchmark':<36}{'taille':>10}{'µs/op':>14}")
+    for result in results:
+        size = result["size"] if result["size"] is not None else "-"
+        print(f"{result['name']:<36}{size:>10}{result['us_per_op']:>14.2f}")
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "store": args.store,
+        "results": results
+    }
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"✅ Référence enregistrée dans {args.save}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("store") != args.store:
+            print(f"❌ Référence mesurée sur le stockage {baseline.get('store')}, relancez avec --store {baseline.get('store')}")
+            sys.exit(2)
+        rows = compare(results, baseline, args.threshold)
+        regressions = [row for row in rows if row[5]]
+        print(f"\n{'benchmark':<36}{'taille':>10}{'réf. µs':>12}{'µs':>12}{'ratio':>8}")
+        for name, size, old, new, ratio, regressed in rows:
+            flag = "  ❌ RÉGRESSION" if regressed else ""
+            print(f"{name:<36}{size if size is not None else '-':>10}{old:>12.2f}{new:>12.2f}{ratio:>8.2f}{flag}")
+        if regressions:
+            print(f"\n❌ {len(regressions)} régression(s) au-delà de +{args.threshold:.0%}")
+            sys.exit(1)
+        print(f"\n✅ Aucune régression au-delà de +{args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Cold-start report
+
+Import time of each entry module, measured in a fresh interpreter with
+`python -X importtime`, the packages that cost the most, and whether the
+heavy optional SDKs were loaded at import; then the time to load a
+synthetic question bank from its store and from its snapshot.
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --modules quiz_generator pregenerate --top 15 --bank-sizes 10000 100000
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.micro import build_store, synthetic_records
+from question_cache import QuestionCache
+
+DEFAULT_MODULES = ["quiz_generator", "question_cache", "llm_backend", "attestation", "pregenerate"]
+# Loaded on first use only: seeing one of them here is a cold-start regression
+LAZY_MODULES = ["groq", "reportlab", "streamlit"]
+
+
+def import_profile(module: str):
+    """(total seconds, {root package: self seconds}, lazy modules loaded) for `import module` in a fresh interpreter"""
+    code = f"import sys, {module}; print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            capture_output=True, text=True, check=True)
+    total = 0.0
+    by_package = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        package = name.strip().split(".")[0]
+        by_package[package] = by_package.get(package, 0.0) + int(own) / 1e6
+        if name.strip() == module:
+            total = int(cumulative) / 1e6
+    loaded = [m for m in result.stdout.strip().split(",") if m]
+    return total, by_package, loaded
+
+
+def bank_load_times(size: int, kind: str):
+    """
+    (store load, paraphrase index build and snapshot write, snapshot load)
+    seconds for a bank of `size` questions
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        store = build_store(kind, tmp, synthetic_records(size))
+        snapshot = os.path.join(tmp, "bank.snapshot")
+
+        started = time.perf_counter()
+        cache = QuestionCache(store, snapshot=False)
+        from_store = time.perf_counter() - started
+
+        cache.snapshot_path = snapshot
+        started = time.perf_counter()
+        cache.save_snapshot(force=True)
+        write = time.perf_counter() - started
+        del cache
+
+        started = time.perf_counter()
+        QuestionCache(store.__class__(store.path), snapshot=snapshot)
+        from_snapshot = time.perf_counter() - started
+    return from_store, write, from_snapshot
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time and bank load time at startup")
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES)
+    parser.add_argument("--top", type=int, default=8, help="packages listed per module")
+    parser.add_argument("--bank-sizes", type=int, nargs="*", default=[1_000, 10_000],
+                        help="synthetic bank sizes to load (none to skip)")
+    parser.add_argument("--store", choices=["json", "sqlite"], default="json")
+    args = parser.parse_args()
+
+    for module in args.modules:
+        total, by_package, loaded = import_profile(module)
+        flag = f"  ❌ chargés à l'import : {', '.join(loaded)}" if loaded else ""
+        print(f"\nimport {module} : {total * 1000:.0f} ms{flag}")
+        for package, seconds in sorted(by_package.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"    {package:<28}{seconds * 1000:>8.1f} ms")
+
+    if args.bank_sizes:
+        print(f"\n{'banque':>10}{'stockage (s)':>16}{'index + snapshot (s)':>24}{'snapshot (s)':>16}")
+    for size in args.bank_sizes:
+        from_store, write, from_snapshot = bank_load_times(size, args.store)
+        print(f"{size:>10}{from_store:>16.3f}{write:>24.3f}{from_snapshot:>16.3f}")
+
+
+if __name__ == "__main__":
+    main()
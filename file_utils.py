@@ -0,0 +1,36 @@
+"""
+File helpers shared by the JSON-backed stores and the bank snapshot
+"""
+
+import json
+import os
+import tempfile
+
+
+def _atomic_write(path, data, mode, **open_kwargs):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode, **open_kwargs) as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def atomic_write_text(path, text):
+    """Write text to a temp file in the same directory, then atomically replace `path`"""
+    _atomic_write(path, text, "w", encoding="utf-8")
+
+
+def atomic_write_bytes(path, data):
+    """Write bytes to a temp file in the same directory, then atomically replace `path`"""
+    _atomic_write(path, data, "wb")
+
+
+def atomic_write_json(path, data, **dump_kwargs):
+    """Write JSON to a temp file in the same directory, then atomically replace `path`"""
+    atomic_write_text(path, json.dumps(data, **dump_kwargs))
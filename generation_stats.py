@@ -0,0 +1,390 @@
+"""
+Generation quality telemetry, kept per (topic, level, model) bucket.
+
+Every candidate returned by the model is recorded as accepted or rejected
+with a reason code, together with the tokens it cost. The observed
+acceptance rate then drives the retry budget and the temperature used for
+the next generations of the same bucket, the lengths of accepted
+answers size max_tokens per model, and call latencies set when a hedge
+request is sent.
+"""
+
+import atexit
+import json
+import math
+import os
+import threading
+import time
+
+from file_utils import atomic_write_json
+
+# Rejection reason codes (shared by the single, streaming and batch paths)
+EMPTY = "empty"
+INVALID_JSON = "invalid_json"
+MISSING_FIELD = "missing_field"
+INVALID_OPTIONS = "invalid_options"
+TOO_SHORT = "too_short"
+GENERIC_START = "generic_start"
+PLACEHOLDER_OPTIONS = "placeholder_options"
+ANSWER_NOT_IN_OPTIONS = "answer_not_in_options"
+DUPLICATE = "duplicate"
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) when the API reports none"""
+    return len(text) // 4
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers (0 when empty)"""
+    if not values:
+        return 0
+    ordered = sorted(values)
+    rank = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[rank]
+
+
+class TokenUsage:
+    """Token counters of one scope (a learner session, a benchmark run)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def add(self, prompt_tokens: int, completion_tokens: int):
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def per_question(self, delivered: int) -> float:
+        return round(self.total_tokens / delivered, 1) if delivered else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens
+        }
+
+
+class GenerationTelemetry:
+    """
+    Counters per (topic, level, model):
+    attempts, accepted, rejections by reason, tokens spent on accepted and
+    rejected candidates, generations that ran out of retries, and API calls
+    with their prompt and completion tokens. The most recent accepted
+    single-question lengths and call latencies are kept per model (batch
+    call latencies apart, they are not comparable).
+    Saved to FILE at most every SAVE_INTERVAL seconds and at exit.
+    """
+
+    FILE = "generation_stats.json"
+    SAVE_INTERVAL = 10.0
+
+    # Retry budget bounds and the target probability of running out of retries
+    MIN_RETRIES = 3
+    MAX_RETRIES = 8
+    DEFAULT_RETRIES = 5
+    MIN_SAMPLES = 10
+    FAILURE_TARGET = 0.05
+    # Outcomes kept per bucket for the recent acceptance rate (model routing)
+    RECENT_WINDOW = 50
+
+    # Adaptive max_tokens: p99 of the accepted answer lengths plus a margin
+    LENGTH_WINDOW = 500
+    MIN_LENGTH_SAMPLES = 20
+    LENGTH_MARGIN = 1.2
+    LENGTH_PADDING = 32
+    MIN_MAX_TOKENS = 100
+
+    # Hedged requests: sent once a call is slower than this percentile
+    HEDGE_PERCENTILE = 95
+    MIN_LATENCY_SAMPLES = 20
+
+    def __init__(self, path=None, save_interval=None):
+        self.path = path or self.FILE
+        self.save_interval = save_interval if save_interval is not None else self.SAVE_INTERVAL
+        self.lock = threading.RLock()
+        self._last_save = time.monotonic()
+        self._dirty = False
+        self.buckets, self.lengths, self.latencies, self.batch_latencies = self.load()
+
+    @staticmethod
+    def key(topic, level, model):
+        return f"{topic}|{level}|{model}"
+
+    def load(self):
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                return (data.get("buckets", {}), data.get("lengths", {}), data.get("latencies", {}),
+                        data.get("batch_latencies", {}))
+            except (OSError, ValueError):
+                pass
+        return {}, {}, {}, {}
+
+    def save(self):
+        with self.lock:
+            if not self._dirty:
+                return
+            data = json.loads(json.dumps({"buckets": self.buckets, "lengths": self.lengths,
+                                          "latencies": self.latencies,
+                                          "batch_latencies": self.batch_latencies}))
+            self._dirty = False
+            self._last_save = time.monotonic()
+        atomic_write_json(self.path, data, indent=2, ensure_ascii=False)
+
+    def clear(self):
+        with self.lock:
+            self.buckets = {}
+            self.lengths = {}
+            self.latencies = {}
+            self.batch_latencies = {}
+            self._dirty = True
+        self.save()
+
+    def _bucket(self, topic, level, model):
+        key = self.key(topic, level, model)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = {
+                "topic": topic, "level": level, "model": model,
+                "attempts": 0, "accepted": 0, "exhausted": 0,
+                "accepted_tokens": 0, "rejected_tokens": 0,
+                "calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "estimated_calls": 0,
+                "rejections": {}, "recent": []
+            }
+            self.buckets[key] = bucket
+        for field in ["calls", "prompt_tokens", "completion_tokens", "estimated_calls"]:
+            bucket.setdefault(field, 0)  # Files saved before call accounting
+        bucket.setdefault("recent", [])
+        return bucket
+
+    def _touch(self):
+        self._dirty = True
+        if time.monotonic() - self._last_save >= self.save_interval:
+            try:
+                self.save()
+            except OSError as e:
+                print(f"⚠️ Sauvegarde des statistiques échouée : {e}")
+
+    # --- Recording ---
+    def record(self, topic, level, model, reason="", tokens=0):
+        """One candidate: accepted when `reason` is empty, rejected otherwise"""
+        with self.lock:
+            bucket = self._bucket(topic, level, model)
+            bucket["attempts"] += 1
+            bucket["recent"].append(0 if reason else 1)
+            del bucket["recent"][:-self.RECENT_WINDOW]
+            if reason:
+                bucket["rejections"][reason] = bucket["rejections"].get(reason, 0) + 1
+                bucket["rejected_tokens"] += tokens
+            else:
+                bucket["accepted"] += 1
+                bucket["accepted_tokens"] += tokens
+            self._touch()
+
+    def record_call(self, topic, level, model, prompt_tokens, completion_tokens, estimated=False):
+        """
+        Token usage of one API call (one call may carry several candidates);
+        `estimated` when the provider reported none (stream cancelled midway)
+        """
+        with self.lock:
+            bucket = self._bucket(topic, level, model)
+            bucket["calls"] += 1
+            bucket["prompt_tokens"] += prompt_tokens
+            bucket["completion_tokens"] += completion_tokens
+            if estimated:
+                bucket["estimated_calls"] += 1
+            self._touch()
+
+    def record_length(self, model, tokens):
+        """Completion length of an accepted single question"""
+        with self.lock:
+            lengths = self.lengths.setdefault(model, [])
+            lengths.append(tokens)
+            del lengths[:-self.LENGTH_WINDOW]
+            self._touch()
+
+    def record_latency(self, model, seconds, batch=False):
+        """
+        Duration of one complete call (streams aborted early are not samples).
+        Batch calls are kept apart: only single questions set the hedge delay.
+        """
+        with self.lock:
+            latencies = (self.batch_latencies if batch else self.latencies).setdefault(model, [])
+            latencies.append(round(seconds, 3))
+            del latencies[:-self.LENGTH_WINDOW]
+            self._touch()
+
+    def record_exhausted(self, topic, level, model):
+        """A generation that used its whole retry budget without an accepted question"""
+        with self.lock:
+            self._bucket(topic, level, model)["exhausted"] += 1
+            self._touch()
+
+    # --- Adaptation ---
+    def acceptance_rate(self, topic, level, model) -> float:
+        """Laplace-smoothed share of accepted candidates"""
+        with self.lock:
+            bucket = self.buckets.get(self.key(topic, level, model))
+            attempts = bucket["attempts"] if bucket else 0
+            accepted = bucket["accepted"] if bucket else 0
+        return (accepted + 1) / (attempts + 2)
+
+    def retry_budget(self, topic, level, model) -> int:
+        """
+        Attempts needed so that all of them fail with probability below
+        FAILURE_TARGET, given the bucket's acceptance rate.
+        """
+        with self.lock:
+            bucket = self.buckets.get(self.key(topic, level, model))
+            if not bucket or bucket["attempts"] < self.MIN_SAMPLES:
+                return self.DEFAULT_RETRIES
+        p = self.acceptance_rate(topic, level, model)
+        needed = math.ceil(math.log(self.FAILURE_TARGET) / math.log(1 - p))
+        return max(self.MIN_RETRIES, min(self.MAX_RETRIES, needed))
+
+    def temperature(self, topic, level, model, base: float) -> float:
+        """
+        Lower the temperature of buckets where most candidates are rejected;
+        never above the configured `base`.
+        """
+        with self.lock:
+            bucket = self.buckets.get(self.key(topic, level, model))
+            if not bucket or bucket["attempts"] < self.MIN_SAMPLES:
+                return base
+        p = self.acceptance_rate(topic, level, model)
+        return round(max(min(0.1, base), min(base, base * (0.5 + p))), 2)
+
+    def max_tokens(self, model, configured: int) -> int:
+        """
+        Completion budget of one question for `model`: p99 of the accepted
+        lengths plus a margin, never above the `configured` admin value.
+        """
+        with self.lock:
+            lengths = list(self.lengths.get(model, []))
+        if len(lengths) < self.MIN_LENGTH_SAMPLES:
+            return configured
+        budget = int(percentile(lengths, 99) * self.LENGTH_MARGIN) + self.LENGTH_PADDING
+        return max(min(self.MIN_MAX_TOKENS, configured), min(configured, budget))
+
+    def recent_acceptance(self, model, level, topic=None):
+        """
+        (samples, Laplace-smoothed acceptance rate) over the last RECENT_WINDOW
+        candidates of the (topic, level, model) bucket, or of every topic at
+        this level when `topic` is None.
+        """
+        with self.lock:
+            if topic is not None:
+                bucket = self.buckets.get(self.key(topic, level, model))
+                outcomes = list(bucket.get("recent", [])) if bucket else []
+            else:
+                outcomes = [o for b in self.buckets.values()
+                            if b["model"] == model and b["level"] == level for o in b.get("recent", [])]
+        return len(outcomes), (sum(outcomes) + 1) / (len(outcomes) + 2)
+
+    def latency_percentile(self, model, pct):
+        """Call latency percentile of `model` in seconds, or None without enough samples"""
+        with self.lock:
+            latencies = list(self.latencies.get(model, []))
+        if len(latencies) < self.MIN_LATENCY_SAMPLES:
+            return None
+        return percentile(latencies, pct)
+
+    def hedge_delay(self, model):
+        """Seconds after which a call counts as slow (p95), or None without enough samples"""
+        return self.latency_percentile(model, self.HEDGE_PERCENTILE)
+
+    # --- Reporting ---
+    def rows(self):
+        """One flat row per bucket, for the admin panel"""
+        with self.lock:
+            buckets = json.loads(json.dumps(list(self.buckets.values())))
+        rows = []
+        for bucket in sorted(buckets, key=lambda b: (b["topic"], b["level"], b["model"])):
+            accepted = bucket["accepted"]
+            rows.append({
+                "Sujet": bucket["topic"],
+                "Niveau": bucket["level"],
+                "Modèle": bucket["model"],
+                "Essais": bucket["attempts"],
+                "Acceptées": accepted,
+                "Essais / question": round(bucket["attempts"] / accepted, 2) if accepted else None,
+                "Appels": bucket.get("calls", 0),
+                "Appels estimés": bucket.get("estimated_calls", 0),
+                "Tokens prompt": bucket.get("prompt_tokens", 0),
+                "Tokens réponse": bucket.get("completion_tokens", 0),
+                "Tokens / question": round((bucket.get("prompt_tokens", 0) + bucket.get("completion_tokens", 0))
+                                           / accepted) if accepted else None,
+                "Tokens rejetés": bucket["rejected_tokens"],
+                "Échecs": bucket["exhausted"],
+                "Retries": self.retry_budget(bucket["topic"], bucket["level"], bucket["model"]),
+                "Rejets": ", ".join(f"{reason}: {n}" for reason, n in
+                                    sorted(bucket["rejections"].items(), key=lambda item: -item[1]))
+            })
+        return rows
+
+    def usage_by_model(self):
+        """Token totals and the adaptive max_tokens per model"""
+        with self.lock:
+            buckets = json.loads(json.dumps(list(self.buckets.values())))
+            models = set(self.lengths) | set(self.latencies) | set(self.batch_latencies)
+        totals = {}
+        for bucket in buckets:
+            models.add(bucket["model"])
+            total = totals.setdefault(bucket["model"], {"calls": 0, "tokens": 0, "accepted": 0})
+            total["calls"] += bucket.get("calls", 0)
+            total["tokens"] += bucket.get("prompt_tokens", 0) + bucket.get("completion_tokens", 0)
+            total["accepted"] += bucket["accepted"]
+        rows = []
+        for model in sorted(models, key=str):
+            total = totals.get(model, {"calls": 0, "tokens": 0, "accepted": 0})
+            with self.lock:
+                lengths = list(self.lengths.get(model, []))
+                latencies = list(self.latencies.get(model, []))
+                batch_latencies = list(self.batch_latencies.get(model, []))
+            rows.append({
+                "Modèle": model,
+                "Appels": total["calls"],
+                "Tokens": total["tokens"],
+                "Tokens / question": round(total["tokens"] / total["accepted"]) if total["accepted"] else None,
+                "Longueur p50": percentile(lengths, 50) if lengths else None,
+                "Longueur p99": percentile(lengths, 99) if lengths else None,
+                "Échantillons": len(lengths),
+                "Latence p50 (s)": percentile(latencies, 50) if latencies else None,
+                "Latence p95 (s)": percentile(latencies, 95) if latencies else None,
+                "Latence lot p50 (s)": percentile(batch_latencies, 50) if batch_latencies else None
+            })
+        return rows
+
+
+_telemetry = None
+_telemetry_lock = threading.Lock()
+
+
+def get_telemetry():
+    """Process-wide telemetry, saved at interpreter exit"""
+    global _telemetry
+    if _telemetry is None:
+        with _telemetry_lock:
+            if _telemetry is None:
+                _telemetry = GenerationTelemetry()
+                atexit.register(_telemetry.save)
+    return _telemetry
+
+
+def set_telemetry(telemetry):
+    """Replace the process-wide telemetry (benchmarks, offline runs); returns the previous one"""
+    global _telemetry
+    previous, _telemetry = _telemetry, telemetry
+    return previous
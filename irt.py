@@ -0,0 +1,429 @@
+"""
+Item Response Theory
+2PL calibration of item difficulty and discrimination from the answer log,
+and per-learner ability estimates used to pick the most informative question
+
+    python irt.py            # calibrate from the default bank and its answer log
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from file_utils import atomic_write_json
+from learner_model import LEVELS
+
+# Difficulty assumed for items without enough answers, and prior mean of the fit
+LEVEL_DIFFICULTY = {"Beginner": -1.0, "Intermediate": 0.0, "Advanced": 1.0}
+# Ability cut points between levels
+LEVEL_CUTS = (-0.5, 0.5)
+
+
+def level_for(theta: float) -> str:
+    if theta < LEVEL_CUTS[0]:
+        return LEVELS[0]
+    if theta < LEVEL_CUTS[1]:
+        return LEVELS[1]
+    return LEVELS[2]
+
+
+def probability(theta, discrimination, difficulty):
+    """P(correct) under the 2PL model"""
+    return 1.0 / (1.0 + np.exp(-discrimination * (theta - difficulty)))
+
+
+def information(theta, discrimination, difficulty):
+    """Fisher information of an item at ability `theta` (a² p (1 - p), highest where theta = b)"""
+    p = probability(theta, discrimination, difficulty)
+    return discrimination ** 2 * p * (1.0 - p)
+
+
+# ==========================================================
+# ✅ Calibration
+# ==========================================================
+# Ability grid the answers are integrated over, and Newton steps per M-step
+QUADRATURE = np.linspace(-4.0, 4.0, 41)
+M_STEPS = 3
+
+
+class FitResult(NamedTuple):
+    discrimination: np.ndarray  # Per item
+    difficulty: np.ndarray  # Per item
+    ability: np.ndarray  # Per learner
+    iterations: int
+
+
+class _Groups:
+    """Row sums of an (answers, grid) array per learner or item, in one reduceat over answers sorted once"""
+
+    def __init__(self, keys: np.ndarray, size: int):
+        self.order = np.argsort(keys, kind="stable")
+        self.is_sorted = bool((self.order == np.arange(len(keys))).all())
+        counts = np.bincount(keys, minlength=size)
+        self.present = np.flatnonzero(counts)
+        self.starts = (np.cumsum(counts) - counts)[self.present]
+        self.size = size
+
+    def sum(self, values: np.ndarray) -> np.ndarray:
+        sums = np.zeros((self.size, values.shape[1]))
+        if len(self.order):
+            sums[self.present] = np.add.reduceat(values if self.is_sorted else values[self.order], self.starts, axis=0)
+        return sums
+
+
+def fit_2pl(learners: np.ndarray, items: np.ndarray, correct: np.ndarray, n_learners: int, n_items: int,
+            prior_difficulty: np.ndarray = None, difficulty_sd: float = 1.0, log_discrimination_sd: float = 0.5,
+            max_iterations: int = 200, tolerance: float = 1e-4) -> FitResult:
+    """
+    Marginal MAP fit of a 2PL model on (learner, item, correct) answer
+    triples, by EM over a quadrature grid of abilities (Bock-Aitkin).
+    Abilities are integrated out under their N(0, 1) prior, which fixes the
+    scale (a joint fit of abilities and items drifts towards shrunk
+    abilities and inflated discriminations). Difficulties are shrunk towards
+    `prior_difficulty` and log-discriminations towards 0, so items with few
+    answers stay close to their level. The E-step weights every learner's
+    grid points by their posterior; the M-step takes damped diagonal Newton
+    steps on the item parameters against the expected answers per grid
+    point. Sums over answers are one np.add.reduceat each. The abilities
+    returned are the posterior means.
+    """
+    learners = np.asarray(learners, dtype=np.int64)
+    items = np.asarray(items, dtype=np.int64)
+    y = np.asarray(correct, dtype=np.float64)
+    b0 = np.zeros(n_items) if prior_difficulty is None else np.asarray(prior_difficulty, dtype=np.float64)
+    b = b0.copy()
+    log_a = np.zeros(n_items)
+    b_precision = 1.0 / difficulty_sd ** 2
+    a_precision = 1.0 / log_discrimination_sd ** 2
+    nodes = QUADRATURE
+    log_prior = -0.5 * nodes ** 2
+    # Answers grouped by learner, so the E-step sums need no reordering
+    order = np.argsort(learners, kind="stable")
+    learners, items, y = learners[order], items[order], y[order]
+    is_correct = y > 0.5
+
+    by_learner = _Groups(learners, n_learners)
+    by_item = _Groups(items, n_items)
+
+    iteration = 0
+    posterior = None
+    for iteration in range(1, max_iterations + 1):
+        # E-step: each learner's posterior over the grid
+        p = probability(nodes, np.exp(log_a)[:, None], b[:, None])
+        log_likelihood = np.where(is_correct[:, None], np.log(p)[items], np.log1p(-p)[items])
+        log_posterior = by_learner.sum(log_likelihood) + log_prior
+        posterior = np.exp(log_posterior - log_posterior.max(axis=1, keepdims=True))
+        posterior /= posterior.sum(axis=1, keepdims=True)
+        # Expected answers and right answers of each item at each grid point
+        weights = posterior[learners]
+        expected = by_item.sum(weights)
+        expected_correct = by_item.sum(weights * y[:, None])
+
+        # M-step: item difficulty and discrimination
+        largest = 0.0
+        for _ in range(M_STEPS):
+            a = np.exp(log_a)
+            p = probability(nodes, a[:, None], b[:, None])
+            residual = expected_correct - expected * p
+            weight = expected * p * (1.0 - p)
+            spread = nodes - b[:, None]
+            gradient = -a * residual.sum(axis=1) - (b - b0) * b_precision
+            hessian = a * a * weight.sum(axis=1) + b_precision
+            b_step = np.clip(gradient / hessian, -1.0, 1.0)
+            gradient = a * (spread * residual).sum(axis=1) - log_a * a_precision
+            hessian = a * a * (spread * spread * weight).sum(axis=1) + a_precision
+            a_step = np.clip(gradient / hessian, -0.5, 0.5)
+            b += b_step
+            log_a += a_step
+            largest = max(largest, np.abs(b_step).max(initial=0.0), np.abs(a_step).max(initial=0.0))
+
+        if largest < tolerance:
+            break
+    theta = posterior @ nodes if posterior is not None else np.zeros(n_learners)
+    return FitResult(np.exp(log_a), b, theta, iteration)
+
+
+class Calibration:
+    """
+    Fitted (discrimination, difficulty, answers) per item digest, saved as
+    JSON. Items with fewer than MIN_RESPONSES answers fall back to the
+    difficulty of their level and a discrimination of 1. `version` changes
+    on every reload, so selection indexes know when to rebuild.
+    """
+
+    FILE = "irt_params.json"
+    MIN_RESPONSES = 5
+
+    def __init__(self, path: str = None):
+        self.path = path or os.getenv("QUIZ_IRT_FILE", self.FILE)
+        self.items: Dict[bytes, Tuple[float, float, int]] = {}
+        self.summary: Dict = {}
+        self.version = 0
+        self._lock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        items, summary = {}, {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                items = {bytes.fromhex(h): (a, b, n) for h, (a, b, n) in data.get("items", {}).items()}
+                summary = {k: v for k, v in data.items() if k != "items"}
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Calibration IRT illisible ({e}), difficultés par niveau utilisées")
+        with self._lock:
+            self.items = items
+            self.summary = summary
+            self.version += 1
+
+    def is_calibrated(self, digest: bytes) -> bool:
+        item = self.items.get(digest)
+        return item is not None and item[2] >= self.MIN_RESPONSES
+
+    @staticmethod
+    def default_params(level: str) -> Tuple[float, float]:
+        """(discrimination, difficulty) assumed for an item that is not calibrated yet"""
+        return 1.0, LEVEL_DIFFICULTY.get(level, 0.0)
+
+    def params(self, digest: bytes, level: str) -> Tuple[float, float]:
+        """(discrimination, difficulty) of an item"""
+        item = self.items.get(digest)
+        if item is not None and item[2] >= self.MIN_RESPONSES:
+            return item[0], item[1]
+        return self.default_params(level)
+
+    def save(self, digests: List[bytes], fit: FitResult, counts: np.ndarray, answers: int):
+        data = {
+            "fitted_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "answers": answers,
+            "learners": len(fit.ability),
+            "iterations": fit.iterations,
+            "items": {
+                digest.hex(): [round(float(a), 4), round(float(b), 4), int(n)]
+                for digest, a, b, n in zip(digests, fit.discrimination, fit.difficulty, counts)
+            }
+        }
+        atomic_write_json(self.path, data, ensure_ascii=False)
+        self.reload()
+
+    def rows(self, cache, limit: int = 50):
+        """Calibrated items with the most answers, for the admin panel"""
+        rows = []
+        for digest, (a, b, n) in sorted(self.items.items(), key=lambda item: -item[1][2])[:limit]:
+            record = cache.get_record(digest)
+            if record is None:
+                continue
+            rows.append({
+                "Question": record.question[:80],
+                "Sujet": record.topic,
+                "Niveau": record.level,
+                "Réponses": n,
+                "Difficulté (b)": round(b, 2),
+                "Discrimination (a)": round(a, 2)
+            })
+        return rows
+
+
+_calibration = None
+_calibration_lock = threading.Lock()
+
+
+def get_calibration() -> Calibration:
+    """Process-wide calibration, shared by every session"""
+    global _calibration
+    if _calibration is None:
+        with _calibration_lock:
+            if _calibration is None:
+                _calibration = Calibration()
+    return _calibration
+
+
+def calibrate(cache, calibration: Calibration = None) -> Optional[Dict]:
+    """
+    Fit every item of the bank that has answers in the store's log and save
+    the parameters. Answers to questions no longer in the bank are ignored.
+    Returns a summary, or None when there is nothing to fit.
+    """
+    calibration = calibration or get_calibration()
+    learner_index: Dict[str, int] = {}
+    item_index: Dict[bytes, int] = {}
+    digests: List[bytes] = []
+    prior: List[float] = []
+    learners, items, correct = [], [], []
+    for question_hash, learner, is_correct, _ in cache.store.load_answers():
+        digest = bytes.fromhex(question_hash)
+        position = item_index.get(digest)
+        if position is None:
+            record = cache.get_record(digest)
+            if record is None:
+                continue
+            position = item_index[digest] = len(digests)
+            digests.append(digest)
+            prior.append(LEVEL_DIFFICULTY.get(record.level, 0.0))
+        items.append(position)
+        learners.append(learner_index.setdefault(learner, len(learner_index)))
+        correct.append(1.0 if is_correct else 0.0)
+    if not items:
+        return None
+
+    started = time.perf_counter()
+    items = np.array(items)
+    fit = fit_2pl(np.array(learners), items, np.array(correct), len(learner_index), len(digests),
+                  prior_difficulty=np.array(prior))
+    counts = np.bincount(items, minlength=len(digests))
+    calibration.save(digests, fit, counts, len(correct))
+    return {
+        "answers": len(correct),
+        "learners": len(learner_index),
+        "items": len(digests),
+        "calibrated": int((counts >= calibration.MIN_RESPONSES).sum()),
+        "iterations": fit.iterations,
+        "seconds": round(time.perf_counter() - started, 3)
+    }
+
+
+# ==========================================================
+# ✅ Item selection
+# ==========================================================
+class ItemIndex:
+    """
+    Calibrated items of one (topic, level) bucket, sorted by difficulty.
+    Information peaks where the ability equals the difficulty, so the most
+    informative unasked items are found by scanning outward from
+    searchsorted(theta) over at most CANDIDATES items instead of scoring the
+    whole bucket. One of the items within TOLERANCE of the best is picked at
+    random, so learners at the same ability do not all get the same question.
+    """
+
+    CANDIDATES = 16
+    TOLERANCE = 0.05
+
+    def __init__(self, records, calibration: Calibration):
+        calibrated = sorted(
+            ((calibration.items[record.digest], record) for record in records
+             if calibration.is_calibrated(record.digest)),
+            key=lambda item: item[0][1]
+        )
+        self.records = [record for _, record in calibrated]
+        self.discrimination = np.array([params[0] for params, _ in calibrated])
+        self.difficulty = np.array([params[1] for params, _ in calibrated])
+
+    def __len__(self):
+        return len(self.records)
+
+    def _nearest(self, theta: float, is_asked: Callable[[bytes], bool]) -> List[int]:
+        """Positions of the unasked items closest in difficulty to theta"""
+        difficulty = self.difficulty
+        right = int(np.searchsorted(difficulty, theta))
+        left = right - 1
+        size = len(self.records)
+        found = []
+        while len(found) < self.CANDIDATES and (left >= 0 or right < size):
+            if right >= size or (left >= 0 and theta - difficulty[left] <= difficulty[right] - theta):
+                position, left = left, left - 1
+            else:
+                position, right = right, right + 1
+            if not is_asked(self.records[position].digest):
+                found.append(position)
+        return found
+
+    def pick(self, theta: float, is_asked: Callable[[bytes], bool], floor: float = 0.0):
+        """
+        An unasked item with close to the most information at theta, or None
+        if there is none or the best does not reach `floor`.
+        """
+        positions = np.array(self._nearest(theta, is_asked), dtype=np.int64)
+        if not len(positions):
+            return None
+        info = information(theta, self.discrimination[positions], self.difficulty[positions])
+        best = info.max()
+        if best < floor:
+            return None
+        return self.records[int(random.choice(positions[info >= best * (1.0 - self.TOLERANCE)]))]
+
+
+# ==========================================================
+# ✅ Ability estimate
+# ==========================================================
+class AbilityEstimate:
+    """
+    Expected a posteriori estimate of one learner's ability on one topic,
+    on a fixed grid, with a normal prior centred on the starting level.
+    The level is considered reached once CONFIDENCE of the posterior mass
+    lies within its band.
+    """
+
+    GRID = np.linspace(-4.0, 4.0, 161)
+    GRID_LEVELS = np.array([level_for(theta) for theta in GRID])
+    CONFIDENCE = 0.8
+
+    def __init__(self, level: str = None, prior_sd: float = 1.0):
+        mean = LEVEL_DIFFICULTY.get(level, 0.0)
+        self.log_posterior = -0.5 * ((self.GRID - mean) / prior_sd) ** 2
+        self.answers = 0
+
+    def update(self, discrimination: float, difficulty: float, correct: bool):
+        p = probability(self.GRID, discrimination, difficulty)
+        # Rebound rather than updated in place: prefetch threads may be reading it
+        self.log_posterior = self.log_posterior + np.log(p if correct else 1.0 - p)
+        self.answers += 1
+
+    def peek(self, discrimination: float, difficulty: float, correct: bool) -> "AbilityEstimate":
+        """The estimate after one more answer, leaving this one unchanged"""
+        estimate = AbilityEstimate.__new__(AbilityEstimate)
+        estimate.log_posterior = self.log_posterior
+        estimate.answers = self.answers
+        estimate.update(discrimination, difficulty, correct)
+        return estimate
+
+    def _posterior(self) -> np.ndarray:
+        weights = np.exp(self.log_posterior - self.log_posterior.max())
+        return weights / weights.sum()
+
+    @property
+    def theta(self) -> float:
+        return float(self._posterior() @ self.GRID)
+
+    @property
+    def standard_error(self) -> float:
+        posterior = self._posterior()
+        mean = posterior @ self.GRID
+        return float(np.sqrt(posterior @ (self.GRID - mean) ** 2))
+
+    def level(self) -> str:
+        return level_for(self.theta)
+
+    def level_confidence(self) -> float:
+        """Posterior probability that the ability lies in the band of the estimated level"""
+        posterior = self._posterior()
+        return float(posterior[self.GRID_LEVELS == self.level()].sum())
+
+    def is_confident(self) -> bool:
+        return self.level_confidence() >= self.CONFIDENCE
+
+    def next_levels(self, discrimination: float, difficulty: float) -> List[str]:
+        """Levels the next question may be asked at, depending on the current answer"""
+        levels = []
+        for correct in (True, False):
+            level = self.peek(discrimination, difficulty, correct).level()
+            if level not in levels:
+                levels.append(level)
+        return levels
+
+
+if __name__ == "__main__":
+    from quiz_generator import get_question_cache
+
+    summary = calibrate(get_question_cache())
+    if summary is None:
+        print("Aucune réponse enregistrée : rien à calibrer")
+    else:
+        print(f"✅ {summary['items']} items calibrés sur {summary['answers']} réponses de {summary['learners']} "
+              f"apprenants ({summary['calibrated']} avec au moins {Calibration.MIN_RESPONSES} réponses, "
+              f"{summary['iterations']} itérations, {summary['seconds']}s)")
@@ -1,29 +1,202 @@
+import atexit
+import hashlib
 import json
 import os
+import re
+import threading
+
+from file_utils import atomic_write_json
+from metrics import timed
+
+LEVELS = ["Beginner", "Intermediate", "Advanced"]
+
+
+def adapt_level(level, consecutive_correct, consecutive_incorrect, correct):
+    """
+    Apply the adaptive rule after one answer: three right answers in a row
+    go up a level, two wrong answers in a row go down a level.
+    Returns (level, consecutive_correct, consecutive_incorrect, change).
+    """
+    if correct:
+        consecutive_correct += 1
+        consecutive_incorrect = 0
+    else:
+        consecutive_correct = 0
+        consecutive_incorrect += 1
+    idx = LEVELS.index(level)
+    if consecutive_correct >= 3 and idx < len(LEVELS) - 1:
+        return LEVELS[idx + 1], 0, consecutive_incorrect, 1
+    if consecutive_incorrect >= 2 and idx > 0:
+        return LEVELS[idx - 1], consecutive_correct, 0, -1
+    return level, consecutive_correct, consecutive_incorrect, 0
+
+
+def reachable_levels(level, consecutive_correct, consecutive_incorrect):
+    """Levels the next question may be asked at, depending on the current answer"""
+    levels = []
+    for correct in (True, False):
+        next_level = adapt_level(level, consecutive_correct, consecutive_incorrect, correct)[0]
+        if next_level not in levels:
+            levels.append(next_level)
+    return levels
+
+
+class LearnerStore:
+    """
+    Per-learner profiles held in memory and written behind by a background thread.
+    Updates only mark a profile dirty; dirty profiles are flushed every
+    FLUSH_INTERVAL seconds, on flush() (end of session) and at exit.
+    Profiles are loaded lazily, one file per learner.
+    """
+
+    DIRECTORY = "learner_profiles"
+    LEGACY_FILE = "learner_profile.json"  # Profile of anonymous sessions
+    FLUSH_INTERVAL = 5.0
+
+    def __init__(self, directory=None, flush_interval=None):
+        self.directory = directory or self.DIRECTORY
+        self.flush_interval = flush_interval if flush_interval is not None else self.FLUSH_INTERVAL
+        self.lock = threading.RLock()
+        self._profiles = {}
+        self._dirty = set()
+        self._wakeup = threading.Event()
+        self._writer = None
+
+    def path(self, learner_id):
+        if learner_id is None:
+            return self.LEGACY_FILE
+        slug = re.sub(r"[^a-z0-9]+", "_", learner_id.strip().lower()).strip("_")[:40] or "learner"
+        digest = hashlib.sha1(learner_id.strip().lower().encode()).hexdigest()[:10]
+        return os.path.join(self.directory, f"{slug}_{digest}.json")
+
+    def get(self, learner_id):
+        """Profile of one learner, loaded from disk on first access"""
+        with self.lock:
+            profile = self._profiles.get(learner_id)
+            if profile is None:
+                path = self.path(learner_id)
+                if os.path.exists(path):
+                    with open(path, "r") as f:
+                        profile = json.load(f)
+                elif learner_id is None:
+                    profile = {"scores": {}}
+                else:
+                    profile = {"learner": learner_id, "scores": {}}
+                self._profiles[learner_id] = profile
+            return profile
+
+    def mark_dirty(self, learner_id):
+        with self.lock:
+            self._dirty.add(learner_id)
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_behind, name="learner-writer", daemon=True)
+                self._writer.start()
+
+    def _write_behind(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️ Sauvegarde des profils échouée : {e}")
+
+    def flush(self, learner_id=None):
+        """Write dirty profiles now (all of them, or only `learner_id`)"""
+        with self.lock:
+            if learner_id is None:
+                ids = list(self._dirty)
+            else:
+                ids = [learner_id] if learner_id in self._dirty else []
+            # Serialize under the lock so the snapshot is consistent, write outside it;
+            # ids without a profile were cleared since they were marked dirty
+            snapshots = [(self.path(i), json.loads(json.dumps(self._profiles[i]))) for i in ids if i in self._profiles]
+            self._dirty.difference_update(ids)
+        for path, data in snapshots:
+            atomic_write_json(path, data, indent=2)
+
+    def _profile_files(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return [entry for entry in os.scandir(self.directory) if entry.name.endswith(".json") and entry.is_file()]
+
+    def version(self):
+        """Changes whenever a named profile is written (file count, total size, latest mtime); stat only"""
+        self.flush()
+        count = size = latest = 0
+        for entry in self._profile_files():
+            info = entry.stat()
+            count += 1
+            size += info.st_size
+            latest = max(latest, info.st_mtime_ns)
+        return {"profiles": count, "size": size, "mtime_ns": latest}
+
+    def iter_profiles(self):
+        """Every named learner's profile as saved on disk (anonymous sessions share one profile, left out)"""
+        self.flush()
+        for entry in self._profile_files():
+            try:
+                with open(entry.path, "r") as f:
+                    yield json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Profil illisible ignoré ({entry.name}) : {e}")
+
+    def clear(self):
+        """Delete every learner profile"""
+        with self.lock:
+            self._profiles = {}
+            self._dirty = set()
+            if os.path.isdir(self.directory):
+                for name in os.listdir(self.directory):
+                    if name.endswith(".json"):
+                        os.remove(os.path.join(self.directory, name))
+            atomic_write_json(self.LEGACY_FILE, {"scores": {}}, indent=2)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_learner_store():
+    """Process-wide learner store, flushed at interpreter exit"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = LearnerStore()
+                atexit.register(_store.flush)
+    return _store
+
 
 class LearnerModel:
-    FILE = "learner_profile.json"
+    def __init__(self, learner_id=None, store=None):
+        self.learner_id = learner_id.strip() if learner_id and learner_id.strip() else None
+        self.store = store or get_learner_store()
+        self.load()
 
-    def __init__(self):
-        self.profile = self.load()
+    @property
+    def profile(self):
+        # Looked up on every use: after store.clear() this learner starts from an empty profile
+        return self.store.get(self.learner_id)
 
     def load(self):
-        if os.path.exists(self.FILE):
-            with open(self.FILE, "r") as f:
-                return json.load(f)
-        return {"scores": {}}
+        return self.store.get(self.learner_id)
 
     def save(self):
-        with open(self.FILE, "w") as f:
-            json.dump(self.profile, f, indent=2)
+        """Write this learner's pending updates to disk immediately"""
+        self.store.flush(self.learner_id)
 
+    @timed("learner_update")
     def update(self, topic, correct):
-        if topic not in self.profile["scores"]:
-            self.profile["scores"][topic] = {"correct": 0, "total": 0}
-        self.profile["scores"][topic]["total"] += 1
-        if correct:
-            self.profile["scores"][topic]["correct"] += 1
-        self.save()
+        with self.store.lock:
+            scores = self.profile["scores"]
+            if topic not in scores:
+                scores[topic] = {"correct": 0, "total": 0}
+            scores[topic]["total"] += 1
+            if correct:
+                scores[topic]["correct"] += 1
+        # Written by the background thread, the answer click does not wait for disk I/O
+        self.store.mark_dirty(self.learner_id)
 
     def mastery(self, topic):
         d = self.profile["scores"].get(topic, {"correct": 0, "total": 0})
@@ -0,0 +1,468 @@
+"""
+LLM Completion Backends
+Live Groq calls, recording to disk, or offline replay from fixtures
+"""
+
+import asyncio
+import glob
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import weakref
+from typing import TYPE_CHECKING, Dict, Iterator, List, NamedTuple, Optional, Union
+
+from metrics import timed
+from resilience import CircuitBreaker, CircuitOpenError, RateLimitedError, TokenBucket, is_provider_failure
+
+if TYPE_CHECKING:
+    from groq import AsyncGroq, Groq
+
+
+class CompletionRequest(NamedTuple):
+    kind: str  # "question" (one MCQ) or "batch" (JSON array of MCQs)
+    topic: str
+    level: str
+    prompt: str
+    model: str
+    temperature: float
+    max_tokens: int
+    api_key: Optional[str] = None
+
+
+class Completion(NamedTuple):
+    content: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+class StreamUsage(NamedTuple):
+    """Token usage a stream yields after its last text chunk (absent when the stream is closed early)"""
+    prompt_tokens: int
+    completion_tokens: int
+
+
+# ==========================================================
+# ✅ Shared Groq Clients (connection pooling)
+# ==========================================================
+_clients = {}
+_async_clients = weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
+
+# Per-request timeout and SDK retries: a slow provider must not stall an exam
+REQUEST_TIMEOUT = float(os.getenv("QUIZ_LLM_TIMEOUT", "15"))
+MAX_RETRIES = 1
+
+
+@timed("client")
+def get_groq_client(api_key: str) -> "Groq":
+    """
+    Return the process-wide client for this API key.
+    The underlying HTTP connections are kept alive and shared by all sessions.
+    """
+    client = _clients.get(api_key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(api_key)
+            if client is None:
+                # Imported on first use: the SDK takes ~0.3 s to import, replay and scripts never need it
+                from groq import Groq
+                client = _clients[api_key] = Groq(api_key=api_key, timeout=REQUEST_TIMEOUT, max_retries=MAX_RETRIES)
+    return client
+
+
+@timed("client")
+def get_async_groq_client(api_key: str) -> "AsyncGroq":
+    """
+    Return the async client for this API key on the running event loop.
+    Async connections cannot move between loops, so there is one pool per loop.
+    """
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        per_loop = _async_clients.setdefault(loop, {})
+        client = per_loop.get(api_key)
+        if client is None:
+            from groq import AsyncGroq
+            client = per_loop[api_key] = AsyncGroq(api_key=api_key, timeout=REQUEST_TIMEOUT, max_retries=MAX_RETRIES)
+    return client
+
+
+def _to_completion(response) -> Completion:
+    content = ""
+    if response.choices and response.choices[0].message.content:
+        content = response.choices[0].message.content
+    usage = getattr(response, "usage", None)
+    return Completion(
+        content=content,
+        prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+        completion_tokens=getattr(usage, "completion_tokens", 0) or 0
+    )
+
+
+# ==========================================================
+# ✅ Backends
+# ==========================================================
+class GroqBackend:
+    """Live completions from the Groq API"""
+
+    name = "live"
+    requires_api_key = True
+
+    @staticmethod
+    def _arguments(request: CompletionRequest) -> dict:
+        return dict(
+            model=request.model,
+            messages=[{"role": "user", "content": request.prompt}],
+            temperature=request.temperature,
+            max_tokens=request.max_tokens
+        )
+
+    def complete(self, request: CompletionRequest) -> Completion:
+        client = get_groq_client(request.api_key)
+        return _to_completion(client.chat.completions.create(**self._arguments(request)))
+
+    async def acomplete(self, request: CompletionRequest) -> Completion:
+        client = get_async_groq_client(request.api_key)
+        return _to_completion(await client.chat.completions.create(**self._arguments(request)))
+
+    def stream(self, request: CompletionRequest) -> Iterator[Union[str, StreamUsage]]:
+        """
+        Yield the completion text as it is generated, then the StreamUsage
+        Groq sends in the final chunk (x_groq.usage). Closing the generator
+        closes the HTTP response, which stops the generation server-side.
+        """
+        client = get_groq_client(request.api_key)
+        response = client.chat.completions.create(stream=True, **self._arguments(request))
+        try:
+            for chunk in response:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                usage = getattr(getattr(chunk, "x_groq", None), "usage", None) or getattr(chunk, "usage", None)
+                if usage is not None:
+                    yield StreamUsage(getattr(usage, "prompt_tokens", 0) or 0,
+                                      getattr(usage, "completion_tokens", 0) or 0)
+        finally:
+            response.close()
+
+
+def _fixture_key(request: CompletionRequest) -> str:
+    text = json.dumps([request.kind, request.topic, request.level, request.model, request.prompt])
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def write_fixture(directory: str, request: CompletionRequest, completion: Completion, suffix: str = "") -> str:
+    """Save one request/completion pair as a JSON fixture file"""
+    os.makedirs(directory, exist_ok=True)
+    key = _fixture_key(request)
+    path = os.path.join(directory, f"{request.kind}_{key[:16]}{suffix}.json")
+    request_data = request._asdict()
+    request_data.pop("api_key")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"key": key, "request": request_data, "completion": completion._asdict()},
+                  f, indent=2, ensure_ascii=False)
+    return path
+
+
+class RecordingBackend:
+    """Forwards to another backend and saves every completion as a fixture"""
+
+    name = "record"
+
+    def __init__(self, inner, fixtures_dir: str):
+        self.inner = inner
+        self.fixtures_dir = fixtures_dir
+        self.requires_api_key = inner.requires_api_key
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def _record(self, request: CompletionRequest, completion: Completion):
+        with self._lock:
+            self._count += 1
+            suffix = f"_{os.getpid()}_{self._count}"
+        write_fixture(self.fixtures_dir, request, completion, suffix)
+
+    def complete(self, request: CompletionRequest) -> Completion:
+        completion = self.inner.complete(request)
+        self._record(request, completion)
+        return completion
+
+    async def acomplete(self, request: CompletionRequest) -> Completion:
+        completion = await self.inner.acomplete(request)
+        self._record(request, completion)
+        return completion
+
+    def stream(self, request: CompletionRequest) -> Iterator[Union[str, StreamUsage]]:
+        """Forward the stream; only completions read to the end are recorded"""
+        parts = []
+        usage = StreamUsage(0, 0)
+        for item in self.inner.stream(request):
+            if isinstance(item, StreamUsage):
+                usage = item
+            else:
+                parts.append(item)
+            yield item
+        self._record(request, Completion("".join(parts), *usage))
+
+
+class GuardedBackend:
+    """
+    Sends calls to another backend through a shared rate limiter and circuit
+    breaker. Raises RateLimitedError when no request slot frees up within
+    `max_wait` seconds, and CircuitOpenError while the provider is failing,
+    without sending anything.
+    """
+
+    def __init__(self, inner, breaker: CircuitBreaker, limiter: Optional[TokenBucket] = None,
+                 max_wait: float = 2.0):
+        self.inner = inner
+        self.name = inner.name
+        self.requires_api_key = inner.requires_api_key
+        self.breaker = breaker
+        self.limiter = limiter
+        self.max_wait = max_wait
+
+    def _admit(self):
+        if not self.breaker.allow():
+            raise CircuitOpenError("❌ Fournisseur IA indisponible (circuit ouvert).", self.breaker.retry_after())
+
+    def _rate_limited(self):
+        self.breaker.release()
+        return RateLimitedError("❌ Limite de requêtes atteinte.", self.limiter.wait_time())
+
+    def _failed(self, error: Exception):
+        if is_provider_failure(error):
+            self.breaker.record_failure()
+        else:
+            self.breaker.release()
+
+    def complete(self, request: CompletionRequest) -> Completion:
+        self._admit()
+        if self.limiter and not self.limiter.acquire(self.max_wait):
+            raise self._rate_limited()
+        try:
+            completion = self.inner.complete(request)
+        except Exception as e:
+            self._failed(e)
+            raise
+        self.breaker.record_success()
+        return completion
+
+    async def acomplete(self, request: CompletionRequest) -> Completion:
+        self._admit()
+        if self.limiter and not await self.limiter.acquire_async(self.max_wait):
+            raise self._rate_limited()
+        try:
+            completion = await self.inner.acomplete(request)
+        except Exception as e:
+            self._failed(e)
+            raise
+        self.breaker.record_success()
+        return completion
+
+    def stream(self, request: CompletionRequest) -> Iterator[Union[str, StreamUsage]]:
+        """Forward the stream; a stream closed early by the caller still counts as a success"""
+        self._admit()
+        if self.limiter and not self.limiter.acquire(self.max_wait):
+            raise self._rate_limited()
+        try:
+            yield from self.inner.stream(request)
+        except GeneratorExit:
+            self.breaker.record_success()
+            raise
+        except Exception as e:
+            self._failed(e)
+            raise
+        self.breaker.record_success()
+
+
+class ReplayBackend:
+    """
+    Serves recorded completions without network access.
+    Fixtures are matched on the exact request first, then on (kind, topic, level),
+    then on kind alone, rotating through the matches. `latency` adds an artificial
+    delay and the two rates inject rejected or unparsable replies. A share
+    `slow_rate` of the calls takes `slow_factor` times longer (tail latency).
+    """
+
+    name = "replay"
+    requires_api_key = False
+
+    LOW_QUALITY = {
+        "question": "What is it?",
+        "options": ["Option A", "Option B", "Option C", "Option D"],
+        "correct_answer": "Option A"
+    }
+
+    def __init__(self, fixtures_dir: str, latency: float = 0.0, low_quality_rate: float = 0.0,
+                 invalid_json_rate: float = 0.0, seed: Optional[int] = None,
+                 slow_rate: float = 0.0, slow_factor: float = 10.0):
+        self.latency = latency
+        self.slow_rate = slow_rate
+        self.slow_factor = slow_factor
+        self.low_quality_rate = low_quality_rate
+        self.invalid_json_rate = invalid_json_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._by_key: Dict[str, List[Completion]] = {}
+        self._by_bucket: Dict[tuple, List[Completion]] = {}
+        self._by_kind: Dict[str, List[Completion]] = {}
+        self._turns: Dict[tuple, int] = {}
+        for path in sorted(glob.glob(os.path.join(fixtures_dir, "*.json"))):
+            with open(path, "r", encoding="utf-8") as f:
+                fixture = json.load(f)
+            request = fixture["request"]
+            completion = Completion(**fixture["completion"])
+            self._by_key.setdefault(fixture["key"], []).append(completion)
+            self._by_bucket.setdefault((request["kind"], request["topic"], request["level"]), []).append(completion)
+            self._by_kind.setdefault(request["kind"], []).append(completion)
+        if not self._by_kind:
+            raise ValueError(f"❌ Aucune fixture trouvée dans {fixtures_dir}")
+
+    def _next(self, name: tuple, completions: List[Completion]) -> Completion:
+        turn = self._turns.get(name, 0)
+        self._turns[name] = turn + 1
+        return completions[turn % len(completions)]
+
+    def _pick(self, request: CompletionRequest) -> Completion:
+        with self._lock:
+            key = _fixture_key(request)
+            if key in self._by_key:
+                completion = self._next(("key", key), self._by_key[key])
+            elif (request.kind, request.topic, request.level) in self._by_bucket:
+                bucket = (request.kind, request.topic, request.level)
+                completion = self._next(("bucket",) + bucket, self._by_bucket[bucket])
+            elif request.kind in self._by_kind:
+                completion = self._next(("kind", request.kind), self._by_kind[request.kind])
+            else:
+                raise ValueError(f"❌ Aucune fixture pour une requête de type {request.kind}")
+            draw = self._random.random()
+        if draw < self.invalid_json_rate:
+            return completion._replace(content=completion.content[: len(completion.content) // 2])
+        if draw < self.invalid_json_rate + self.low_quality_rate:
+            bad = dict(self.LOW_QUALITY, topic=request.topic, level=request.level, id="q_0", type="MCQ")
+            content = json.dumps([bad] if request.kind == "batch" else bad)
+            return completion._replace(content=content)
+        return completion
+
+    def _latency(self) -> float:
+        if not self.slow_rate:
+            return self.latency
+        with self._lock:
+            slow = self._random.random() < self.slow_rate
+        return self.latency * self.slow_factor if slow else self.latency
+
+    def complete(self, request: CompletionRequest) -> Completion:
+        completion = self._pick(request)
+        latency = self._latency()
+        if latency:
+            time.sleep(latency)
+        return completion
+
+    async def acomplete(self, request: CompletionRequest) -> Completion:
+        completion = self._pick(request)
+        latency = self._latency()
+        if latency:
+            await asyncio.sleep(latency)
+        return completion
+
+    # Characters per replayed stream chunk (roughly a few tokens)
+    STREAM_CHUNK = 16
+
+    def stream(self, request: CompletionRequest) -> Iterator[Union[str, StreamUsage]]:
+        """
+        Yield the replayed completion in chunks, spreading `latency` over them,
+        then its recorded usage (fixtures recorded without usage have none)
+        """
+        completion = self._pick(request)
+        content = completion.content
+        chunks = [content[i:i + self.STREAM_CHUNK] for i in range(0, len(content), self.STREAM_CHUNK)]
+        latency = self._latency()
+        delay = latency / len(chunks) if chunks and latency else 0.0
+        for text in chunks:
+            if delay:
+                time.sleep(delay)
+            yield text
+        if completion.completion_tokens:
+            yield StreamUsage(completion.prompt_tokens, completion.completion_tokens)
+
+
+def seed_fixtures_from_records(records: List[dict], fixtures_dir: str, batch_size: int = 5) -> int:
+    """
+    Build replay fixtures from cached question records, one single-question
+    fixture per record plus batch fixtures per (topic, level). Returns the file count.
+    """
+    fields = ["id", "topic", "level", "question", "options", "correct_answer", "type"]
+    written = 0
+    buckets: Dict[tuple, List[dict]] = {}
+    for position, record in enumerate(records):
+        data = {field: record[field] for field in fields if field in record}
+        buckets.setdefault((record.get("topic"), record.get("level")), []).append(data)
+        request = CompletionRequest("question", data.get("topic"), data.get("level"), "", "replay", 0.0, 0)
+        write_fixture(fixtures_dir, request, Completion(json.dumps(data, ensure_ascii=False)), f"_{position}")
+        written += 1
+    for (topic, level), items in buckets.items():
+        for start in range(0, len(items), batch_size):
+            request = CompletionRequest("batch", topic, level, "", "replay", 0.0, 0)
+            content = json.dumps(items[start:start + batch_size], ensure_ascii=False)
+            write_fixture(fixtures_dir, request, Completion(content), f"_{start}")
+            written += 1
+    return written
+
+
+_backend = None
+_breaker = None
+
+
+def get_circuit_breaker() -> CircuitBreaker:
+    """Process-wide breaker for the LLM provider, shared by every session"""
+    global _breaker
+    if _breaker is None:
+        with _clients_lock:
+            if _breaker is None:
+                _breaker = CircuitBreaker(
+                    failure_threshold=int(os.getenv("QUIZ_BREAKER_FAILURES", "3")),
+                    reset_timeout=float(os.getenv("QUIZ_BREAKER_RESET", "30"))
+                )
+    return _breaker
+
+
+def _guarded(inner) -> GuardedBackend:
+    rpm = float(os.getenv("QUIZ_LLM_RPM", "30"))
+    limiter = TokenBucket.per_minute(rpm, burst=float(os.getenv("QUIZ_LLM_BURST", "5"))) if rpm > 0 else None
+    return GuardedBackend(inner, get_circuit_breaker(), limiter, max_wait=float(os.getenv("QUIZ_LLM_MAX_WAIT", "2")))
+
+
+def get_backend():
+    """
+    Backend selected by QUIZ_LLM_BACKEND: "live" (default), "record" or "replay".
+    Record and replay use the QUIZ_FIXTURES_DIR directory (default "fixtures").
+    Replay reads QUIZ_REPLAY_LATENCY, QUIZ_REPLAY_LOW_QUALITY_RATE,
+    QUIZ_REPLAY_INVALID_JSON_RATE and QUIZ_REPLAY_SLOW_RATE.
+    Calls to Groq go through the shared circuit breaker and a rate limiter of
+    QUIZ_LLM_RPM requests per minute (0 disables it).
+    """
+    global _backend
+    if _backend is None:
+        mode = os.getenv("QUIZ_LLM_BACKEND", "live").lower()
+        fixtures_dir = os.getenv("QUIZ_FIXTURES_DIR", "fixtures")
+        if mode == "record":
+            _backend = _guarded(RecordingBackend(GroqBackend(), fixtures_dir))
+        elif mode == "replay":
+            _backend = ReplayBackend(
+                fixtures_dir,
+                latency=float(os.getenv("QUIZ_REPLAY_LATENCY", "0")),
+                low_quality_rate=float(os.getenv("QUIZ_REPLAY_LOW_QUALITY_RATE", "0")),
+                invalid_json_rate=float(os.getenv("QUIZ_REPLAY_INVALID_JSON_RATE", "0")),
+                slow_rate=float(os.getenv("QUIZ_REPLAY_SLOW_RATE", "0"))
+            )
+        else:
+            _backend = _guarded(GroqBackend())
+    return _backend
+
+
+def set_backend(backend):
+    """Replace the process-wide backend (benchmarks, offline runs)"""
+    global _backend
+    _backend = backend
@@ -1,9 +1,18 @@
 import streamlit as st
-import json
+import streamlit.components.v1 as components
+import contextlib
+import io
 import time
-from quiz_generator import generate_question, question_cache
-from attestation import generate_attestation
-from learner_model import LearnerModel
+from quiz_generator import DEFAULT_BATCH_SIZE, DEFAULT_CANDIDATES, generate_question, get_admin_params, question_cache
+from attestation import render_attestation
+from generation_stats import get_telemetry
+from model_router import DEFAULT_MODELS, DEFAULT_QUALITY_TARGET, get_model_router
+from metrics import SessionProfile, metrics
+from learner_model import LEVELS, LearnerModel, adapt_level, get_learner_store, reachable_levels
+from irt import calibrate, get_calibration
+from analytics import get_dashboard_cache
+from prefetch import QuestionPrefetcher
+from resilience import is_provider_failure
 import os
 
 # =============================
@@ -11,10 +20,60 @@ import os
 # =============================
 DEFAULT_TOTAL_QUESTIONS = 10
 DEFAULT_EXAM_DURATION = 5 * 60  # 5 minutes
+REVIEW_PAGE_SIZE = 10  # Questions par page dans la revue de fin d'examen
 
 st.set_page_config(page_title="SmartQuiz IA", layout="centered")
+# Histogrammes des étapes réécrits régulièrement dans metrics.prom (format Prometheus)
+metrics.start_exporter()
 st.title("SmartQuiz – QCM IA Adaptatif")
 
+# =============================
+# TIMER CÔTÉ NAVIGATEUR
+# =============================
+def render_countdown(remaining):
+    """
+    Compte à rebours exécuté dans le navigateur : aucune réexécution du script
+    côté serveur pendant que l'apprenant réfléchit. Le temps limite est
+    vérifié côté serveur à chaque interaction.
+    """
+    html = f"""
+        <div id="timer" style="font-family: 'Source Sans Pro', sans-serif; padding: 0.75rem 1rem;
+             border-radius: 0.5rem; background-color: rgba(28, 131, 225, 0.1); color: rgb(0, 66, 128);">
+        </div>
+        <script>
+        const deadline = Date.now() + {int(remaining)} * 1000;
+        const timer = document.getElementById("timer");
+        function tick() {{
+            const left = Math.max(0, Math.round((deadline - Date.now()) / 1000));
+            const minutes = String(Math.floor(left / 60)).padStart(2, "0");
+            const seconds = String(left % 60).padStart(2, "0");
+            timer.textContent = left > 0
+                ? `⏱ Temps restant : ${{minutes}}:${{seconds}}`
+                : "⏰ Temps écoulé : vos réponses ne sont plus prises en compte";
+            if (left > 0) setTimeout(tick, 250);
+        }}
+        tick();
+        </script>
+        """
+    # st.iframe remplace components.html dans les versions récentes de Streamlit
+    if hasattr(st, "iframe"):
+        st.iframe(html, height=60)
+    else:
+        components.html(html, height=60)
+
+
+def profiling():
+    """Capture cProfile du bloc si le profilage de cette session est actif"""
+    profile = st.session_state.get("session_profile")
+    return profile.capture() if profile is not None else contextlib.nullcontext()
+
+
+def exam_elapsed():
+    """Temps d'examen écoulé, sans les pauses dues à une panne du fournisseur IA"""
+    paused_since = st.session_state.get("outage_since")
+    return (paused_since or time.time()) - st.session_state.start_time
+
+
 # =============================
 # INITIALISATION SESSION
 # =============================
@@ -32,12 +91,36 @@ if "admin_max_tokens" not in st.session_state:
     st.session_state.admin_max_tokens = 600
 if "admin_model" not in st.session_state:
     st.session_state.admin_model = "llama-3.1-8b-instant"
+if "admin_batch_size" not in st.session_state:
+    st.session_state.admin_batch_size = DEFAULT_BATCH_SIZE
+if "admin_streaming" not in st.session_state:
+    st.session_state.admin_streaming = True
+if "admin_adaptive_max_tokens" not in st.session_state:
+    st.session_state.admin_adaptive_max_tokens = True
+if "admin_candidates" not in st.session_state:
+    st.session_state.admin_candidates = DEFAULT_CANDIDATES
+if "admin_hedge" not in st.session_state:
+    st.session_state.admin_hedge = True
+if "admin_routing" not in st.session_state:
+    st.session_state.admin_routing = False
+if "admin_models" not in st.session_state:
+    st.session_state.admin_models = DEFAULT_MODELS
+if "admin_quality_target" not in st.session_state:
+    st.session_state.admin_quality_target = DEFAULT_QUALITY_TARGET
+if "admin_irt" not in st.session_state:
+    # Désactivée tant que les items ne sont pas calibrés (irt_params.json)
+    st.session_state.admin_irt = False
+if "admin_profile_next" not in st.session_state:
+    st.session_state.admin_profile_next = False
 if "admin_groq_key" not in st.session_state:
     st.session_state.admin_groq_key = ""
 
 if "start_time" not in st.session_state:
     st.session_state.start_time = None
 
+if "outage_since" not in st.session_state:
+    st.session_state.outage_since = None  # Début de la pause en cas de panne du fournisseur IA
+
 if "index" not in st.session_state:
     st.session_state.index = 1
 
@@ -59,6 +142,13 @@ if "consecutive_correct" not in st.session_state:
 if "consecutive_incorrect" not in st.session_state:
     st.session_state.consecutive_incorrect = 0
 
+# Vue propre à cette session sur la banque de questions partagée
+if "cache_session" not in st.session_state:
+    st.session_state.cache_session = question_cache.session()
+
+if "prefetcher" not in st.session_state:
+    st.session_state.prefetcher = QuestionPrefetcher(st.session_state.cache_session)
+
 # =============================
 # PAGE QCM (AVANT EXAMEN)
 # =============================
@@ -87,6 +177,7 @@ Vous pouvez obtenir une clé gratuite sur [GROQ Console](https://console.groq.co
         admin_groq_key = st.text_input("Clé GROQ API", value=st.session_state.admin_groq_key, type="password")
         model_options = [
             "llama-3.1-8b-instant",
+            "llama-3.3-70b-versatile",
             "llama-3-8b",
             "llama-3-70b",
             "mixtral-8x7b",
@@ -98,8 +189,23 @@ Vous pouvez obtenir une clé gratuite sur [GROQ Console](https://console.groq.co
             admin_model = st.text_input("Nom du modèle personnalisé", value=st.session_state.admin_model)
         else:
             admin_model = selected_model
+        admin_routing = st.checkbox("Routage automatique entre plusieurs modèles", value=st.session_state.admin_routing, help="Chaque sujet/niveau va au modèle le plus rapide qui atteint l'objectif de qualité ; bascule sur le modèle suivant en cas d'échec")
+        if admin_routing:
+            routing_options = [m for m in model_options if m != "autre (personnalisé)"]
+            admin_models = st.multiselect("Modèles candidats (du moins cher au plus cher)", routing_options, default=[m for m in st.session_state.admin_models if m in routing_options])
+            admin_models = [m for m in routing_options if m in admin_models]  # Ordre de cascade
+            admin_quality_target = st.slider("Objectif de qualité (taux d'acceptation)", min_value=0.1, max_value=1.0, value=st.session_state.admin_quality_target, step=0.05)
+        else:
+            admin_models = st.session_state.admin_models
+            admin_quality_target = st.session_state.admin_quality_target
         admin_temperature = st.slider("Température", min_value=0.0, max_value=2.0, value=st.session_state.admin_temperature, step=0.01)
         admin_max_tokens = st.number_input("Max tokens", min_value=100, max_value=4096, value=st.session_state.admin_max_tokens, step=1)
+        admin_adaptive_max_tokens = st.checkbox("Max tokens adaptatif (p99 des réponses acceptées + marge)", value=st.session_state.admin_adaptive_max_tokens, help="Max tokens reste la limite supérieure")
+        admin_streaming = st.checkbox("Streaming avec arrêt anticipé des questions faibles", value=st.session_state.admin_streaming)
+        admin_batch_size = st.number_input("Questions générées par appel API", min_value=1, max_value=10, value=st.session_state.admin_batch_size, step=1, help="Les questions supplémentaires sont mises en cache pour la suite de l'examen")
+        admin_candidates = st.number_input("Candidats générés en parallèle", min_value=1, max_value=4, value=st.session_state.admin_candidates, step=1, help="La première question valide est retenue, les autres sont annulées (plus de quota, moins d'attente)")
+        admin_hedge = st.checkbox("Requête de couverture si la réponse dépasse la latence p95", value=st.session_state.admin_hedge)
+        admin_irt = st.checkbox("Sélection adaptative IRT", value=st.session_state.admin_irt, help="Le niveau suit la capacité estimée de l'apprenant et la question en cache la plus informative à cette capacité est posée (à activer une fois les items calibrés)")
         if st.button("✅ Sauvegarder les paramètres"):
             error_msgs = []
             if st.session_state.admin_mode:
@@ -107,6 +213,8 @@ Vous pouvez obtenir une clé gratuite sur [GROQ Console](https://console.groq.co
                     error_msgs.append("La clé GROQ API est obligatoire en mode admin.")
                 if not admin_model:
                     error_msgs.append("Le nom du modèle est obligatoire.")
+                if admin_routing and not admin_models:
+                    error_msgs.append("Choisissez au moins un modèle pour le routage.")
                 if not (0.0 <= admin_temperature <= 2.0):
                     error_msgs.append("La température doit être comprise entre 0.0 et 2.0.")
                 if not (100 <= admin_max_tokens <= 4096):
@@ -119,20 +227,89 @@ Vous pouvez obtenir une clé gratuite sur [GROQ Console](https://console.groq.co
                 st.session_state.admin_model = admin_model
                 st.session_state.admin_temperature = admin_temperature
                 st.session_state.admin_max_tokens = admin_max_tokens
+                st.session_state.admin_batch_size = int(admin_batch_size)
+                st.session_state.admin_streaming = admin_streaming
+                st.session_state.admin_adaptive_max_tokens = admin_adaptive_max_tokens
+                st.session_state.admin_candidates = int(admin_candidates)
+                st.session_state.admin_hedge = admin_hedge
+                st.session_state.admin_irt = admin_irt
+                st.session_state.admin_routing = admin_routing
+                st.session_state.admin_models = admin_models
+                st.session_state.admin_quality_target = admin_quality_target
                 st.success("Paramètres admin sauvegardés et pris en compte !")
         st.info("Les paramètres admin seront utilisés pour la génération des questions si le mode admin est activé.")
 
+        # -------- QUALITÉ DE GÉNÉRATION --------
+        stats_rows = get_telemetry().rows()
+        if stats_rows:
+            st.markdown("**📈 Qualité de génération (par sujet, niveau et modèle)**")
+            st.dataframe(stats_rows, hide_index=True)
+            st.caption("Le nombre d'essais et la température s'ajustent au taux d'acceptation observé.")
+            st.markdown("**🪙 Consommation de tokens par modèle**")
+            st.dataframe(get_telemetry().usage_by_model(), hide_index=True)
+            if st.session_state.admin_routing:
+                st.markdown("**🧭 Routage des modèles (taux d'acceptation récent et échantillons)**")
+                routed_topics = sorted({row["Sujet"] for row in stats_rows})
+                st.dataframe(get_model_router().rows(routed_topics, LEVELS, st.session_state.admin_models,
+                                                     st.session_state.admin_quality_target), hide_index=True)
+
+        # -------- TEMPS PAR ÉTAPE --------
+        stage_rows = metrics.rows()
+        if stage_rows:
+            st.markdown("**⏱️ Temps par étape du cycle de question**")
+            st.dataframe(stage_rows, hide_index=True)
+            st.download_button("⬇️ Métriques (format Prometheus)", data=metrics.prometheus_text(), file_name="metrics.prom", mime="text/plain")
+        # -------- CALIBRATION IRT --------
+        if st.button("🧮 Recalibrer les items (IRT)"):
+            summary = calibrate(question_cache)
+            if summary is None:
+                st.info("Aucune réponse enregistrée : rien à calibrer")
+            else:
+                st.success(f"✅ {summary['calibrated']} items calibrés sur {summary['answers']} réponses de {summary['learners']} apprenants ({summary['seconds']}s)")
+        calibration_rows = get_calibration().rows(question_cache)
+        if calibration_rows:
+            st.markdown("**🧮 Paramètres IRT des items les plus répondus**")
+            st.dataframe(calibration_rows, hide_index=True)
+        st.session_state.admin_profile_next = st.checkbox("Profiler la prochaine session (cProfile)", value=st.session_state.admin_profile_next, help="Le profil est enregistré dans profiles/ à la fin de l'examen")
+
     # Les boutons de reset sont déplacés à la fin du quiz
         # -------- RÉINITIALISER TOUT --------
         if st.button("🧹 Vider cache et données"):
             question_cache.clear_cache()
             try:
-                with open("learner_profile.json", "w", encoding="utf-8") as f:
-                    f.write('{"scores": {}}')
-            except Exception:
-                pass
+                get_learner_store().clear()
+            except OSError as e:
+                print(f"⚠️ Suppression des profils apprenants échouée : {e}")
+                st.warning(f"⚠️ Profils apprenants non supprimés : {e}")
             st.success("✅ Cache et données réinitialisés !")
 
+    # =============================
+    # TABLEAU DE BORD ENSEIGNANT
+    # =============================
+    if st.session_state.admin_mode:
+        with st.expander("👩‍🏫 Tableau de bord enseignant"):
+            if st.checkbox("Afficher les statistiques de la cohorte", help="Recalculé seulement si des profils ou des réponses ont changé depuis le dernier affichage"):
+                dashboard = get_dashboard_cache().get(question_cache)
+                summary = dashboard.summary
+                col1, col2, col3, col4 = st.columns(4)
+                col1.metric("👥 Apprenants", summary["learners"])
+                col2.metric("✍️ Réponses", summary["answers"])
+                col3.metric("❓ Questions répondues", summary["questions"])
+                col4.metric("❌ Taux d'erreur", f"{summary['error_rate']}%" if summary["error_rate"] is not None else "—")
+                if dashboard.mastery:
+                    st.markdown("**📚 Maîtrise par sujet**")
+                    if "mastery" in dashboard.charts:
+                        st.image(dashboard.charts["mastery"])
+                    st.dataframe(dashboard.mastery, hide_index=True)
+                if "errors" in dashboard.charts:
+                    st.markdown("**❌ Questions les plus manquées et distracteurs les plus choisis**")
+                    st.image(dashboard.charts["errors"])
+                    if "distractors" in dashboard.charts:
+                        st.image(dashboard.charts["distractors"])
+                    st.dataframe(dashboard.items, hide_index=True)
+                elif not dashboard.mastery:
+                    st.info("Aucune donnée : les statistiques apparaissent après les premiers examens.")
+
     nom_apprenant = st.text_input("👤 Nom et Prénom de l'étudiant")
 
     topic = st.text_input(
@@ -171,6 +348,7 @@ Vous pouvez obtenir une clé gratuite sur [GROQ Console](https://console.groq.co
             st.warning("⚠️ Veuillez saisir un sujet")
         else:
             st.session_state.nom_apprenant = nom_apprenant
+            st.session_state.learner_model = LearnerModel(nom_apprenant)
             st.session_state.topic = topic.strip()
             st.session_state.started = True
             if not st.session_state.start_time:
@@ -180,33 +358,21 @@ Vous pouvez obtenir une clé gratuite sur [GROQ Console](https://console.groq.co
             st.session_state.consecutive_incorrect = 0
             st.session_state.total_questions = int(total_questions)
             st.session_state.exam_duration = int(exam_minutes) * 60
-            question_cache.start_session()
+            st.session_state.cache_session.start_session(nom_apprenant)
+            if get_admin_params()["irt"]:
+                st.session_state.cache_session.track_ability(st.session_state.topic, level)
+            st.session_state.prefetcher.discard()
+            st.session_state.session_profile = SessionProfile(nom_apprenant) if st.session_state.admin_profile_next else None
+            st.session_state.profile_path = None
             st.rerun()
 
 # =============================
 # MODE EXAMEN
 # =============================
 if st.session_state.started:
-    # Rafraîchissement automatique toutes les secondes pour le timer
-    _has_autorefresh = False
-    try:
-        from streamlit_extras.st_autorefresh import st_autorefresh
-        _has_autorefresh = True
-    except ModuleNotFoundError:
-        pass
-    if _has_autorefresh:
-        st_autorefresh(interval=1000, limit=None, key="timer_autorefresh")
-    else:
-        import time as _time
-        _time.sleep(1)
-        # Compatibilité rerun selon version Streamlit
-        if hasattr(st, "experimental_rerun"):
-            st.experimental_rerun()
-        elif hasattr(st, "_rerun"):
-            st._rerun()
     total_questions = st.session_state.get("total_questions", DEFAULT_TOTAL_QUESTIONS)
     exam_duration = st.session_state.get("exam_duration", DEFAULT_EXAM_DURATION)
-    elapsed = int(time.time() - st.session_state.start_time)
+    elapsed = int(exam_elapsed())
     remaining = exam_duration - elapsed
 
     # =============================
@@ -215,75 +381,117 @@ if st.session_state.started:
     if remaining <= 0 or st.session_state.index >= total_questions:
         # Arrêt immédiat du test si le temps est écoulé
         import streamlit as st
+        # Fin de session : écrire tout de suite le profil de l'apprenant
+        st.session_state.learner_model.save()
         st.error("⏰ Examen terminé")
         st.success(
             f"🏆 Score : {st.session_state.score} / {total_questions}"
         )
+        final_ability = st.session_state.cache_session.abilities.get(st.session_state.topic)
+        if final_ability is not None:
+            st.info(f"🎯 Niveau estimé : {final_ability.level()} (confiance {final_ability.level_confidence():.0%})")
+        if st.session_state.admin_mode:
+            session_stats = st.session_state.cache_session.get_stats()
+            st.caption(
+                f"🪙 Tokens consommés pendant cette session : {session_stats['tokens_this_session']} "
+                f"({session_stats['tokens_per_question']} par question posée)"
+            )
+        # -------- PROFIL cProfile DE LA SESSION --------
+        session_profile = st.session_state.get("session_profile")
+        if session_profile is not None and session_profile.captures:
+            if not st.session_state.get("profile_path"):
+                st.session_state.profile_path = session_profile.dump()
+            with st.expander("🔬 Profil de la session (cProfile)"):
+                st.caption(f"Enregistré dans {st.session_state.profile_path}")
+                st.code(session_profile.summary(), language="text")
+                with open(st.session_state.profile_path, "rb") as f:
+                    st.download_button("⬇️ Télécharger le profil (.prof)", data=f.read(), file_name=os.path.basename(st.session_state.profile_path))
         # -------- ATTESTATION PDF --------
         if st.button("📄 Attestation PDF"):
-            pdf_path = generate_attestation(
+            # PDF généré en mémoire : pas de fichier partagé entre les apprenants
+            pdf_bytes = render_attestation(
                 nom_apprenant=st.session_state.nom_apprenant,
                 score=st.session_state.score,
                 total=total_questions,
                 sujet=st.session_state.topic
             )
-            with open(pdf_path, "rb") as f:
-                st.download_button(
-                    label="⬇️ Télécharger l'attestation",
-                    data=f,
-                    file_name="attestation_quiz.pdf",
-                    mime="application/pdf"
-                )
+            st.download_button(
+                label="⬇️ Télécharger l'attestation",
+                data=pdf_bytes,
+                file_name="attestation_quiz.pdf",
+                mime="application/pdf"
+            )
         # -------- ACCUEIL --------
         if st.button("🏠 Accueil"):
             st.session_state.started = False
             st.session_state.start_time = None
+            st.session_state.outage_since = None
             st.session_state.index = 1
             st.session_state.score = 0
             st.session_state.question = None
             st.session_state.nom_apprenant = ""
             st.session_state.total_questions = DEFAULT_TOTAL_QUESTIONS
             st.session_state.exam_duration = DEFAULT_EXAM_DURATION
+            st.session_state.prefetcher.discard()
             st.rerun()
         # -------- EXPORT/VOIR QUESTIONS --------
         with st.expander("📦 Exporter / Voir les questions générées"):
-            try:
-                with open("questions_cache.json", "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                questions = data.get("questions", [])
-                st.write(f"Nombre de questions dans le cache : {len(questions)}")
-                for q in questions:
+            total_session = len(st.session_state.cache_session.session_order)
+            if total_session == 0:
+                st.info("Aucune question posée pendant cette session.")
+            else:
+                st.write(f"Questions posées pendant cette session : {total_session}")
+                page_size = REVIEW_PAGE_SIZE
+                page_count = (total_session + page_size - 1) // page_size
+                page = st.number_input("Page", min_value=1, max_value=page_count, value=1, step=1) if page_count > 1 else 1
+                for q in st.session_state.cache_session.get_session_records((page - 1) * page_size, page_size):
                     st.markdown(f"**Sujet :** {q.get('topic','')} | **Niveau :** {q.get('level','')}")
                     st.markdown(f"**Q :** {q.get('question','')}")
-                    st.markdown(f"**Choix :**")
-                    for opt in q.get('options', []):
-                        if opt == q.get('correct_answer'):
-                            st.markdown(f"- ✅ **{opt}**")
-                        else:
-                            st.markdown(f"- {opt}")
+                    choices = "\n".join(
+                        f"- ✅ **{opt}**" if opt == q.get('correct_answer') else f"- {opt}"
+                        for opt in q.get('options', [])
+                    )
+                    st.markdown(f"**Choix :**\n{choices}")
                     user_choice = q.get('user_choice', None)
                     correct_answer = q.get('correct_answer', None)
                     if user_choice is not None:
                         if user_choice == correct_answer:
                             st.markdown(f"**Votre choix :** {user_choice} ✅ <span style='color:green'>(Correct)</span>", unsafe_allow_html=True)
                         else:
-                            st.markdown(f"**Votre choix :** {user_choice} ❌ <span style='color:red'>(Faux)</span>", unsafe_allow_html=True)
-                            st.markdown(f"**Bonne réponse :** {correct_answer} ✅", unsafe_allow_html=True)
+                            st.markdown(f"**Votre choix :** {user_choice} ❌ <span style='color:red'>(Faux)</span><br/>**Bonne réponse :** {correct_answer} ✅", unsafe_allow_html=True)
                     st.markdown("---")
-                st.download_button("⬇️ Exporter mes réponses", data=json.dumps(data, ensure_ascii=False, indent=2), file_name="questions_cache.json", mime="application/json")
-            except Exception as e:
-                st.info("Aucune question générée ou cache introuvable.")
+
+                export_format = st.radio("Format d'export", ["JSON Lines", "CSV"], horizontal=True)
+                fmt, mime, extension = ("csv", "text/csv", "csv") if export_format == "CSV" else ("jsonl", "application/x-ndjson", "jsonl")
+                # Écrit par morceaux : le coût dépend de la session, pas de la taille de la banque
+                export_file = io.BytesIO()
+                for chunk in st.session_state.cache_session.iter_session_export(fmt):
+                    export_file.write(chunk.encode("utf-8"))
+                export_file.seek(0)
+                st.download_button("⬇️ Exporter mes réponses", data=export_file, file_name=f"mes_reponses.{extension}", mime=mime)
         st.stop()
 
     # =============================
     # TIMER + PROGRESSION
     # =============================
-    minutes = remaining // 60
-    seconds = remaining % 60
+    if st.session_state.outage_since is not None:
+        st.info(f"⏸️ Examen en pause — temps restant : {remaining // 60:02d}:{remaining % 60:02d}")
+    else:
+        render_countdown(remaining)
+
+    # Une seule réexécution à l'échéance pour afficher la fin de l'examen
+    if hasattr(st, "fragment"):
+        @st.fragment(run_every=remaining + 1)
+        def _deadline_watch():
+            if exam_elapsed() >= exam_duration:
+                st.rerun()
+        _deadline_watch()
 
-    st.info(f"⏱ Temps restant : {minutes:02d}:{seconds:02d}")
     st.progress(st.session_state.index / total_questions)
 
+    # Capacité estimée (IRT) si la sélection adaptative est active pour cette session
+    ability = st.session_state.cache_session.abilities.get(st.session_state.topic)
+
     # Afficher le niveau actuel et la maîtrise
     mastery = st.session_state.learner_model.mastery(st.session_state.topic)
     col1, col2 = st.columns(2)
@@ -291,39 +499,107 @@ if st.session_state.started:
         st.metric("📚 Niveau Actuel", st.session_state.level)
     with col2:
         st.metric("🎯 Maîtrise", f"{mastery:.1f}%")
+    if ability is not None and st.session_state.admin_mode:
+        st.caption(
+            f"🧮 Capacité estimée θ = {ability.theta:+.2f} ± {ability.standard_error:.2f} "
+            f"(niveau {ability.level()}, confiance {ability.level_confidence():.0%}, {ability.answers} réponses)"
+        )
 
     # =============================
     # QUESTION
     # =============================
+    if st.session_state.question is None and ability is not None:
+        # Question en cache la plus informative selon la capacité mise à jour par la dernière réponse
+        # (le préchargement a choisi la sienne avant cette réponse)
+        st.session_state.question = st.session_state.cache_session.get_cached_question(
+            st.session_state.topic,
+            st.session_state.level
+        )
+        if st.session_state.question is not None:
+            st.session_state.prefetcher.discard()
     if st.session_state.question is None:
         try:
-            st.session_state.question = generate_question(
+            # Question préchargée pendant la question précédente (ses erreurs sont levées ici),
+            # sinon génération directe
+            st.session_state.question = st.session_state.prefetcher.take(
                 st.session_state.topic,
                 st.session_state.level,
                 st.session_state.index
             )
+            if st.session_state.question is None:
+                with profiling():
+                    st.session_state.question = generate_question(
+                        st.session_state.topic,
+                        st.session_state.level,
+                        st.session_state.index,
+                        session=st.session_state.cache_session
+                    )
         except Exception as e:
-            st.error(f"❌ Erreur lors de la génération de la question : {e}")
+            if not is_provider_failure(e):
+                st.error(f"❌ Erreur lors de la génération de la question : {e}")
+                st.stop()
+            # Panne ou limite du fournisseur et aucune question en cache :
+            # l'examen est mis en pause (le chrono s'arrête) et la génération est retentée
+            if st.session_state.outage_since is None:
+                st.session_state.outage_since = time.time()
+            retry_in = int(min(10, max(2, getattr(e, "retry_after", 0) or 5)))
+            retry_at = time.time() + retry_in
+            st.warning(f"⏸️ Service IA momentanément indisponible : l'examen est en pause, nouvelle tentative dans {retry_in}s…")
+            if hasattr(st, "fragment"):
+                @st.fragment(run_every=retry_in)
+                def _retry_watch():
+                    if time.time() >= retry_at:
+                        st.rerun()
+                _retry_watch()
+            else:
+                time.sleep(retry_in)
+                st.rerun()
             st.stop()
 
+    if st.session_state.outage_since is not None:
+        # Fin de la pause : le temps d'attente n'est pas décompté de l'examen
+        st.session_state.start_time += time.time() - st.session_state.outage_since
+        st.session_state.outage_since = None
+        st.rerun()
+
     q = st.session_state.question
     
     # Mark question as asked in this session
-    question_cache.mark_as_asked(q)
+    st.session_state.cache_session.mark_as_asked(q)
+
+    # Précharger la question suivante pour chaque niveau atteignable
+    if st.session_state.index + 1 < total_questions:
+        if ability is not None:
+            next_levels = ability.next_levels(*question_cache.item_params(question_cache.get_question_hash(q), q.level))
+        else:
+            next_levels = reachable_levels(
+                st.session_state.level,
+                st.session_state.consecutive_correct,
+                st.session_state.consecutive_incorrect
+            )
+        st.session_state.prefetcher.prefetch(
+            st.session_state.topic,
+            next_levels,
+            st.session_state.index + 1,
+            get_admin_params()
+        )
 
     # Affichage de la question et des boutons de navigation
     top_quit_col, top_spacer, top_right = st.columns([1, 6, 1])
     with top_right:
         if st.button("🏠 Accueil", key="top_quit"):
-            question_cache.clear_cache()
+            # Seule la session de cet apprenant est réinitialisée, la banque partagée est conservée
+            st.session_state.cache_session.start_session()
             st.session_state.started = False
             st.session_state.start_time = None
+            st.session_state.outage_since = None
             st.session_state.index = 1
             st.session_state.score = 0
             st.session_state.question = None
             st.session_state.nom_apprenant = ""
             st.session_state.total_questions = DEFAULT_TOTAL_QUESTIONS
             st.session_state.exam_duration = DEFAULT_EXAM_DURATION
+            st.session_state.prefetcher.discard()
             st.rerun()
 
     st.subheader(f"Question {st.session_state.index} / {total_questions}")
@@ -336,27 +612,33 @@ if st.session_state.started:
     )
 
     if st.button("Question Suivante ➡️"):
-        # Sauvegarder le choix utilisateur dans le cache
-        question_cache.save_user_choice(q, answer)
-        is_correct = answer == q.correct_answer
-        if is_correct:
-            st.session_state.score += 1
-            st.session_state.consecutive_correct += 1
-            st.session_state.consecutive_incorrect = 0
-            st.session_state.learner_model.update(st.session_state.topic, correct=True)
+        with profiling():
+            # Sauvegarder le choix utilisateur dans le cache
+            st.session_state.cache_session.save_user_choice(q, answer)
+            is_correct = answer == q.correct_answer
+            if is_correct:
+                st.session_state.score += 1
+            st.session_state.learner_model.update(st.session_state.topic, correct=is_correct)
+        if ability is not None:
+            # Niveau de la capacité estimée, mise à jour avec cette réponse
+            previous_level = LEVELS.index(st.session_state.level)
+            st.session_state.level = ability.level()
+            level_change = LEVELS.index(st.session_state.level) - previous_level
         else:
-            st.session_state.consecutive_correct = 0
-            st.session_state.consecutive_incorrect += 1
-            st.session_state.learner_model.update(st.session_state.topic, correct=False)
-        levels = ["Beginner", "Intermediate", "Advanced"]
-        current_level_idx = levels.index(st.session_state.level)
-        if st.session_state.consecutive_correct >= 3 and current_level_idx < 2:
-            st.session_state.level = levels[current_level_idx + 1]
-            st.session_state.consecutive_correct = 0
+            (
+                st.session_state.level,
+                st.session_state.consecutive_correct,
+                st.session_state.consecutive_incorrect,
+                level_change
+            ) = adapt_level(
+                st.session_state.level,
+                st.session_state.consecutive_correct,
+                st.session_state.consecutive_incorrect,
+                is_correct
+            )
+        if level_change > 0:
             st.success("⬆️ Niveau +1")
-        elif st.session_state.consecutive_incorrect >= 2 and current_level_idx > 0:
-            st.session_state.level = levels[current_level_idx - 1]
-            st.session_state.consecutive_incorrect = 0
+        elif level_change < 0:
             st.warning("⬇️ Niveau -1")
         st.session_state.index += 1
         st.session_state.question = None
@@ -0,0 +1,217 @@
+"""
+Stage Timing Metrics
+Histograms of the time spent in each stage of a question cycle, shown in
+the admin panel and written as a Prometheus text file, plus an optional
+cProfile capture of one learner session
+"""
+
+import cProfile
+import functools
+import io
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+from file_utils import atomic_write_text
+
+# Histogram bucket upper bounds, in seconds
+STAGE_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram (Prometheus layout, non-cumulative counts)"""
+
+    def __init__(self, buckets=STAGE_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        position = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                position = i
+                break
+        self.counts[position] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimate by linear interpolation inside the bucket holding the q-th observation"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for i, count in enumerate(self.counts):
+            upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+            if count and seen + count >= rank:
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = upper
+        return self.buckets[-1]
+
+
+class StageMetrics:
+    """
+    One histogram per stage name. Timing a stage costs two perf_counter()
+    calls and a short lock, so the hooks stay on in production.
+    Stages may nest (e.g. parse_json inside validate).
+    """
+
+    PREFIX = "smartquiz"
+    FILE = "metrics.prom"
+    EXPORT_INTERVAL = 15.0
+
+    def __init__(self):
+        self._histograms: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+        self._exporter = None
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+
+    # --- Reporting ---
+    def rows(self):
+        """One row per stage, for the admin panel"""
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            rows = []
+            for stage, h in histograms:
+                rows.append({
+                    "Étape": stage,
+                    "Appels": h.count,
+                    "Total (s)": round(h.sum, 3),
+                    "Moyenne (ms)": round(h.sum / h.count * 1000, 2) if h.count else 0.0,
+                    "p50 (ms)": round(h.quantile(0.5) * 1000, 2),
+                    "p95 (ms)": round(h.quantile(0.95) * 1000, 2),
+                    "p99 (ms)": round(h.quantile(0.99) * 1000, 2)
+                })
+        return rows
+
+    def prometheus_text(self) -> str:
+        """All histograms in the Prometheus text exposition format"""
+        name = f"{self.PREFIX}_stage_seconds"
+        lines = [
+            f"# HELP {name} Time spent in each stage of a question cycle.",
+            f"# TYPE {name} histogram"
+        ]
+        with self._lock:
+            for stage, h in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, count in zip(list(h.buckets) + ["+Inf"], h.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {h.sum:.6f}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {h.count}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str = None) -> str:
+        """Write the text dump (for the node_exporter textfile collector); returns the path"""
+        path = path or os.getenv("QUIZ_METRICS_FILE", self.FILE)
+        atomic_write_text(path, self.prometheus_text())
+        return path
+
+    def start_exporter(self, path: str = None, interval: float = None):
+        """Rewrite the Prometheus file every `interval` seconds from a daemon thread (idempotent)"""
+        with self._lock:
+            if self._exporter is not None:
+                return
+            interval = interval or self.EXPORT_INTERVAL
+            self._exporter = threading.Thread(target=self._export_loop, args=(path, interval),
+                                              name="metrics-exporter", daemon=True)
+            self._exporter.start()
+
+    def _export_loop(self, path, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.write_prometheus(path)
+            except OSError as e:
+                print(f"⚠️ Écriture des métriques échouée : {e}")
+
+
+metrics = StageMetrics()
+
+
+def stage(name: str):
+    """Time a block: `with stage("cache_lookup"): ...`"""
+    return metrics.timer(name)
+
+
+def timed(name: str):
+    """Decorator timing every call of a (synchronous) function as stage `name`"""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with metrics.timer(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# ==========================================================
+# ✅ Single-session profiling
+# ==========================================================
+class SessionProfile:
+    """
+    cProfile capture of one learner session, accumulated across Streamlit
+    reruns. Only code run inside capture() on the calling thread is profiled
+    (background prefetch threads are not).
+    """
+
+    DIRECTORY = "profiles"
+
+    def __init__(self, label: str = "session"):
+        self.label = "".join(c if c.isalnum() else "_" for c in label.strip().lower())[:40] or "session"
+        self.profile = cProfile.Profile()
+        self.captures = 0
+
+    @contextmanager
+    def capture(self):
+        try:
+            self.profile.enable()
+        except ValueError:
+            # Another profiler is already active on this interpreter
+            yield
+            return
+        try:
+            yield
+        finally:
+            self.profile.disable()
+            self.captures += 1
+
+    def dump(self, directory: str = None) -> str:
+        """Save the raw stats (open with snakeviz or pstats); returns the path"""
+        directory = directory or self.DIRECTORY
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.label}_{time.strftime('%Y%m%d_%H%M%S')}.prof")
+        self.profile.dump_stats(path)
+        return path
+
+    def summary(self, limit: int = 25, sort: str = "cumulative") -> str:
+        if not self.captures:
+            return ""
+        out = io.StringIO()
+        pstats.Stats(self.profile, stream=out).strip_dirs().sort_stats(sort).print_stats(limit)
+        return out.getvalue()
@@ -0,0 +1,148 @@
+"""
+Model Router
+Chooses the model of each (topic, level) generation from the live latency
+and acceptance rate measured by the generation telemetry
+"""
+
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+
+from generation_stats import get_telemetry
+
+SMALL_MODEL = "llama-3.1-8b-instant"
+LARGE_MODEL = "llama-3.3-70b-versatile"
+
+# Candidate models, cheapest first; also the cascade order
+DEFAULT_MODELS = [SMALL_MODEL, LARGE_MODEL]
+# Starting point while a level has no measurements yet
+DEFAULT_LEVEL_MODELS = {
+    "Beginner": SMALL_MODEL,
+    "Intermediate": SMALL_MODEL,
+    "Advanced": LARGE_MODEL
+}
+DEFAULT_QUALITY_TARGET = 0.6
+
+
+class ModelRouter:
+    """
+    Routes each request to the fastest model whose recent acceptance rate for
+    the (topic, level) meets the quality target. Topics with few samples use
+    the rate measured on the whole level, and levels with none start on
+    DEFAULT_LEVEL_MODELS. A small share of requests explores models that are
+    still under-sampled. A model that keeps failing at the provider is
+    skipped for COOLDOWN seconds.
+    """
+
+    EXPLORE_RATE = 0.1
+    FAILURES_BEFORE_COOLDOWN = 2
+    COOLDOWN = 60.0
+
+    def __init__(self, telemetry=None, level_models: Dict[str, str] = None,
+                 explore_rate: float = None, seed: Optional[int] = None):
+        self.telemetry = telemetry or get_telemetry()
+        self.level_models = level_models or DEFAULT_LEVEL_MODELS
+        self.explore_rate = self.EXPLORE_RATE if explore_rate is None else explore_rate
+        self._random = random.Random(seed)
+        self._failures: Dict[str, int] = {}
+        self._cooldown_until: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    # --- Health ---
+    def report_failure(self, model: str):
+        with self._lock:
+            self._failures[model] = self._failures.get(model, 0) + 1
+            if self._failures[model] >= self.FAILURES_BEFORE_COOLDOWN:
+                print(f"⚠️ Modèle {model} dégradé → écarté pendant {self.COOLDOWN:.0f}s")
+                self._cooldown_until[model] = time.monotonic() + self.COOLDOWN
+                self._failures[model] = 0
+
+    def report_success(self, model: str):
+        with self._lock:
+            self._failures.pop(model, None)
+
+    def available(self, models: List[str]) -> List[str]:
+        """Models not in cooldown (all of them if every model is)"""
+        now = time.monotonic()
+        with self._lock:
+            healthy = [m for m in models if self._cooldown_until.get(m, 0.0) <= now]
+        return healthy or list(models)
+
+    # --- Routing ---
+    def acceptance(self, model: str, topic: str, level: str):
+        """(samples, rate) for the bucket, or for the whole level if the bucket is under-sampled"""
+        samples, rate = self.telemetry.recent_acceptance(model, level, topic)
+        if samples < self.telemetry.MIN_SAMPLES:
+            samples, rate = self.telemetry.recent_acceptance(model, level)
+        return samples, rate
+
+    def choose(self, topic: str, level: str, models: List[str] = None,
+               quality_target: float = DEFAULT_QUALITY_TARGET, explore: bool = True) -> str:
+        models = self.available(models or DEFAULT_MODELS)
+        measured = {m: self.acceptance(m, topic, level) for m in models}
+
+        unexplored = [m for m in models if measured[m][0] < self.telemetry.MIN_SAMPLES]
+        if explore and unexplored:
+            with self._lock:
+                draw = self._random.random()
+                pick = self._random.choice(unexplored)
+            if draw < self.explore_rate:
+                return pick
+
+        qualified = [m for m in models
+                     if measured[m][0] >= self.telemetry.MIN_SAMPLES and measured[m][1] >= quality_target]
+        if qualified:
+            # Fastest qualified model; unknown latency ranks after known ones, cheapest first
+            def speed(model):
+                p50 = self.telemetry.latency_percentile(model, 50)
+                return (p50 is None, p50 or 0.0, models.index(model))
+            return min(qualified, key=speed)
+
+        default = self.level_models.get(level)
+        if default in models and default in unexplored:
+            return default
+        sampled = [m for m in models if m not in unexplored]
+        if sampled:
+            # Nobody meets the target: best acceptance rate
+            return max(sampled, key=lambda m: measured[m][1])
+        return default if default in models else models[0]
+
+    def cascade(self, model: str, models: List[str] = None) -> Optional[str]:
+        """Next model to try after `model` failed: the next larger one, else the previous"""
+        models = self.available(models or DEFAULT_MODELS)
+        if model not in models:
+            return models[-1] if models and models[-1] != model else None
+        position = models.index(model)
+        if position + 1 < len(models):
+            return models[position + 1]
+        return models[position - 1] if position > 0 else None
+
+    def rows(self, topics: List[str], levels: List[str], models: List[str] = None,
+             quality_target: float = DEFAULT_QUALITY_TARGET):
+        """Current routing decision per (topic, level), for the admin panel"""
+        models = models or DEFAULT_MODELS
+        rows = []
+        for topic in topics:
+            for level in levels:
+                row = {"Sujet": topic, "Niveau": level}
+                for model in models:
+                    samples, rate = self.acceptance(model, topic, level)
+                    row[model] = f"{rate:.0%} ({samples})"
+                row["Modèle choisi"] = self.choose(topic, level, models, quality_target, explore=False)
+                rows.append(row)
+        return rows
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_model_router() -> ModelRouter:
+    """Process-wide router, shared by every session"""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = ModelRouter()
+    return _router
@@ -0,0 +1,197 @@
+"""
+Near-Duplicate Question Index
+Character n-gram MinHash with LSH banding, so paraphrases of a cached
+question are found without comparing against the whole bank
+"""
+
+import re
+import zlib
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+_MERSENNE_PRIME = (1 << 31) - 1
+_FNV_OFFSET = np.uint64(0xCBF29CE484222325)
+_FNV_PRIME = np.uint64(0x100000001B3)
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def normalize(text: str) -> str:
+    """Lowercase and collapse punctuation/whitespace so trivial edits do not matter"""
+    return _NON_WORD.sub(" ", text.lower()).strip()
+
+
+class NearDuplicateIndex:
+    """
+    MinHash signatures of character shingles, bucketed by LSH bands.
+    With 64 permutations in 16 bands of 4 rows, two questions with a shingle
+    Jaccard similarity of 0.6 share at least one band ~89% of the time.
+    Candidates from the buckets are confirmed on the estimated similarity.
+
+    Storage stays compact on large banks: signatures are rows of one uint32
+    matrix and each band is folded into a uint64 bucket key, tagged with the
+    band number in its top bits. Bulk loads go into one sorted key array
+    searched with searchsorted; later additions go to a small dict that is
+    merged into the sorted array once it outgrows MERGE_FRACTION of it.
+    A single writer is assumed; queries are lock-free.
+    """
+
+    MIN_MERGE = 1024
+    MERGE_FRACTION = 0.125
+
+    def __init__(self, threshold: float = 0.6, num_perm: int = 64, bands: int = 16,
+                 shingle_size: int = 5, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm doit être un multiple de bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.seed = seed
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, _MERSENNE_PRIME, size=(num_perm, 1)).astype(np.uint64)
+        self._b = rng.randint(0, _MERSENNE_PRIME, size=(num_perm, 1)).astype(np.uint64)
+        self._band_bits = max(1, (bands - 1).bit_length())
+        self._band_tags = np.arange(bands, dtype=np.uint64) << np.uint64(64 - self._band_bits)
+        self.clear()
+
+    def clear(self):
+        self._keys: List[Hashable] = []  # Row -> key
+        self._rows: Dict[Hashable, int] = {}  # Key -> row
+        self._matrix = np.zeros((0, self.num_perm), dtype=np.uint32)
+        self._merged = 0  # Rows covered by the sorted arrays
+        # (sorted bucket keys, their rows, {bucket key: rows} added since the last merge),
+        # replaced as a whole so a query never sees half a merge
+        self._state = (np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.uint32), {})
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key: Hashable):
+        return key in self._rows
+
+    @property
+    def keys(self) -> List[Hashable]:
+        """Indexed keys, in row order"""
+        return self._keys
+
+    def row(self, key: Hashable) -> Optional[int]:
+        """Row of `key` (rows follow the order keys were added in), or None if it is not indexed"""
+        return self._rows.get(key)
+
+    def params(self) -> Tuple[int, int, int, int]:
+        """Settings a saved state is only valid for"""
+        return (self.num_perm, self.bands, self.shingle_size, self.seed)
+
+    def export_state(self) -> Dict:
+        """Arrays of the whole index, for a snapshot (keys are saved by the caller, in row order)"""
+        end = len(self._keys)
+        if end > self._merged:
+            self._merge(end)
+        sorted_keys, sorted_rows, _ = self._state
+        return {"params": self.params(), "matrix": self._matrix[:end], "bucket_keys": sorted_keys,
+                "bucket_rows": sorted_rows}
+
+    def restore_state(self, state: Dict, keys: List[Hashable]):
+        """Reload an exported state; `keys` must be the keys it was exported with, in row order"""
+        if tuple(state["params"]) != self.params() or len(state["matrix"]) != len(keys):
+            raise ValueError("état d'index incompatible")
+        self._keys = list(keys)
+        self._rows = {key: row for row, key in enumerate(self._keys)}
+        self._matrix = state["matrix"]
+        self._merged = len(self._keys)
+        self._state = (state["bucket_keys"], state["bucket_rows"], {})
+
+    def _shingles(self, text: str) -> np.ndarray:
+        text = normalize(text)
+        size = self.shingle_size
+        if len(text) <= size:
+            grams = {text}
+        else:
+            grams = {text[i:i + size] for i in range(len(text) - size + 1)}
+        # crc32 is stable across processes, unlike hash()
+        return np.fromiter((zlib.crc32(g.encode()) for g in grams), dtype=np.uint64, count=len(grams))
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature (uint32 per permutation) of the text"""
+        shingles = self._shingles(text)
+        hashed = (self._a * shingles + self._b) % _MERSENNE_PRIME
+        return hashed.min(axis=1).astype(np.uint32)
+
+    def _bucket_keys(self, signatures: np.ndarray) -> np.ndarray:
+        """(n, bands) uint64 bucket keys: FNV-1a fold of each band, band number in the top bits"""
+        blocks = signatures.reshape(len(signatures), self.bands, self.rows).astype(np.uint64)
+        folded = np.full(blocks.shape[:2], _FNV_OFFSET, dtype=np.uint64)
+        for row in range(self.rows):
+            folded = (folded ^ blocks[:, :, row]) * _FNV_PRIME
+        return (folded >> np.uint64(self._band_bits)) | self._band_tags
+
+    def add(self, key: Hashable, text: str):
+        """Index a question under `key` (the question digest)"""
+        self.add_many([(key, text)])
+
+    def add_many(self, items: Iterable[Tuple[Hashable, str]]):
+        """Index several (key, text) pairs at once (bulk loads skip the recent-additions dict)"""
+        pending = {}
+        for key, text in items:
+            if key not in self._rows and key not in pending:
+                pending[key] = text
+        if not pending:
+            return
+        signatures = np.stack([self.signature(text) for text in pending.values()])
+        start = len(self._keys)
+        end = start + len(signatures)
+        matrix = self._matrix
+        if end > len(matrix):
+            grown = np.zeros((max(end, int(len(matrix) * 1.5)), self.num_perm), dtype=np.uint32)
+            grown[:start] = matrix[:start]
+            matrix = grown
+        matrix[start:end] = signatures
+        self._matrix = matrix
+        for row, key in enumerate(pending, start):
+            self._keys.append(key)
+            self._rows[key] = row
+
+        # Publish in the buckets last: a query only finds rows whose signature is stored
+        if end - self._merged > max(self.MIN_MERGE, self.MERGE_FRACTION * self._merged):
+            self._merge(end)
+            return
+        recent = self._state[2]
+        for row, bucket_keys in enumerate(self._bucket_keys(signatures).tolist(), start):
+            for bucket_key in bucket_keys:
+                recent.setdefault(bucket_key, []).append(row)
+
+    def _merge(self, end: int):
+        """Fold every row up to `end` into the sorted arrays"""
+        sorted_keys, sorted_rows, _ = self._state
+        new_rows = np.arange(self._merged, end, dtype=np.uint32)
+        new_keys = self._bucket_keys(self._matrix[self._merged:end])
+        keys = np.concatenate([sorted_keys, new_keys.ravel()])
+        rows = np.concatenate([sorted_rows, np.repeat(new_rows, self.bands)])
+        order = np.argsort(keys, kind="stable")
+        self._state = (keys[order], rows[order], {})
+        self._merged = end
+
+    def query(self, text: str, exclude: Hashable = None) -> List[Tuple[Hashable, float]]:
+        """Keys whose estimated similarity with `text` reaches the threshold, best first"""
+        signature = self.signature(text)
+        probes = self._bucket_keys(signature[np.newaxis, :])[0]
+        sorted_keys, sorted_rows, recent = self._state
+        candidates = set()
+        lows = np.searchsorted(sorted_keys, probes, side="left").tolist()
+        highs = np.searchsorted(sorted_keys, probes, side="right").tolist()
+        for low, high in zip(lows, highs):
+            if high > low:
+                candidates.update(sorted_rows[low:high].tolist())
+        for probe in probes.tolist():
+            candidates.update(recent.get(probe, ()))
+        if not candidates:
+            return []
+        rows = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        similarities = np.count_nonzero(self._matrix[rows] == signature, axis=1) / self.num_perm
+        keys = self._keys
+        matches = [(keys[row], similarity) for row, similarity in zip(rows.tolist(), similarities.tolist())
+                   if similarity >= self.threshold and keys[row] != exclude]
+        matches.sort(key=lambda match: -match[1])
+        return matches
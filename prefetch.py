@@ -0,0 +1,65 @@
+"""
+Question Prefetcher
+Generates the next exam question in the background while the learner
+answers the current one
+"""
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from models import Question
+from quiz_generator import deferred_error_reports, generate_question
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Shared by every session so the number of generation threads stays bounded (created on first prefetch)"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="prefetch")
+    return _executor
+
+
+def _generate(topic: str, level: str, index: int, params: dict, session) -> Question:
+    """Worker side: errors are left in the future for take() to raise on the script thread"""
+    with deferred_error_reports():
+        return generate_question(topic, level, index, params, session)
+
+
+class QuestionPrefetcher:
+    """Per-session queue of questions being generated ahead of time"""
+
+    def __init__(self, session=None):
+        self.session = session
+        self.pending: Dict[Tuple[str, str, int], Future] = {}
+
+    def prefetch(self, topic: str, levels, index: int, params: dict):
+        """Start generating question `index` for each candidate level (idempotent)"""
+        for level in levels:
+            key = (topic, level, index)
+            if key not in self.pending:
+                self.pending[key] = _get_executor().submit(_generate, topic, level, index, params, self.session)
+
+    def take(self, topic: str, level: str, index: int) -> Optional[Question]:
+        """
+        Return the prefetched question for the chosen level and discard the others.
+        Returns None if nothing was prefetched, so the caller can fall back to a
+        synchronous call. If the background generation failed, its exception is
+        raised here, on the calling (script) thread, for the caller to report.
+        """
+        future = self.pending.pop((topic, level, index), None)
+        self.discard()
+        if future is None:
+            return None
+        return future.result()
+
+    def discard(self):
+        """Drop every pending prefetch. Questions already generated stay in the cache."""
+        for future in self.pending.values():
+            future.cancel()
+        self.pending = {}
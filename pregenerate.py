@@ -0,0 +1,138 @@
+"""
+Bulk Question Pre-generation
+Fills the question bank ahead of time so the first exams on a topic are
+served from the cache.
+
+    python pregenerate.py --topics "Python" "Machine Learning" --count 50 --rpm 30
+
+Running the same command again resumes: only the missing questions of each
+(topic, level) bucket are generated.
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from learner_model import LEVELS
+from quiz_generator import DEFAULT_BATCH_SIZE, agenerate_questions_batch, get_question_cache
+from resilience import ProviderUnavailable, TokenBucket
+
+# Chunks that keep failing are dropped after this many attempts
+MAX_CHUNK_ATTEMPTS = 5
+# Pause after a 429 from the provider (or an open circuit) before retrying the chunk
+RATE_LIMIT_BACKOFF = 10.0
+
+
+class PregenerationJob:
+    """Schedules batch generations over every bucket with bounded concurrency"""
+
+    def __init__(self, topics, levels, target, params, concurrency=4, rpm=30, batch_size=DEFAULT_BATCH_SIZE):
+        self.topics = topics
+        self.levels = levels
+        self.target = target
+        self.params = params
+        self.concurrency = concurrency
+        self.limiter = TokenBucket.per_minute(rpm, burst=concurrency)
+        self.batch_size = batch_size
+        self.generated = 0
+        self.failed_chunks = 0
+        self.planned = 0
+
+    def plan(self):
+        """Split what each bucket is missing into (topic, level, count) chunks"""
+        chunks = []
+        for topic in self.topics:
+            for level in self.levels:
+                missing = self.target - get_question_cache().count(topic, level)
+                while missing > 0:
+                    size = min(self.batch_size, missing)
+                    chunks.append((topic, level, size))
+                    missing -= size
+        return chunks
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            topic, level, size, attempt = await queue.get()
+            try:
+                await self._run_chunk(queue, topic, level, size, attempt)
+            finally:
+                queue.task_done()
+
+    async def _run_chunk(self, queue, topic, level, size, attempt):
+        await self.limiter.acquire_async()
+        start_index = get_question_cache().count(topic, level) + 1
+        try:
+            questions = await agenerate_questions_batch(topic, level, size, start_index, self.params, max_rounds=1)
+        except Exception as e:
+            if isinstance(e, ProviderUnavailable) or getattr(e, "status_code", None) == 429:
+                pause = getattr(e, "retry_after", 0) or RATE_LIMIT_BACKOFF
+                print(f"⏳ Fournisseur indisponible ou limite de débit atteinte, pause de {pause:.0f}s")
+                await asyncio.sleep(pause)
+            else:
+                print(f"⚠️ {topic}/{level} : {e}")
+            questions = []
+
+        self.generated += len(questions)
+        shortfall = size - len(questions)
+        if shortfall and attempt + 1 < MAX_CHUNK_ATTEMPTS:
+            queue.put_nowait((topic, level, shortfall, attempt + 1))
+        elif shortfall:
+            self.failed_chunks += 1
+        print(
+            f"[{self.generated}/{self.planned}] {topic} / {level} : +{len(questions)} "
+            f"({get_question_cache().count(topic, level)}/{self.target})"
+        )
+
+    async def run(self):
+        chunks = self.plan()
+        self.planned = sum(size for _, _, size in chunks)
+        if not chunks:
+            print("✅ Banque déjà remplie, rien à générer.")
+            return
+        print(f"{self.planned} questions à générer en {len(chunks)} lots")
+
+        queue = asyncio.Queue()
+        for topic, level, size in chunks:
+            queue.put_nowait((topic, level, size, 0))
+        workers = [asyncio.create_task(self._worker(queue)) for _ in range(self.concurrency)]
+        await queue.join()
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pré-générer des questions dans la banque")
+    parser.add_argument("--topics", nargs="+", required=True)
+    parser.add_argument("--levels", nargs="+", default=LEVELS, choices=LEVELS)
+    parser.add_argument("--count", type=int, required=True, help="nombre cible de questions par (sujet, niveau)")
+    parser.add_argument("--concurrency", type=int, default=4, help="requêtes simultanées au maximum")
+    parser.add_argument("--rpm", type=float, default=30, help="requêtes par minute autorisées par Groq")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--model", default="llama-3.1-8b-instant")
+    parser.add_argument("--temperature", type=float, default=0.5)
+    parser.add_argument("--max-tokens", type=int, default=600, help="tokens par question")
+    args = parser.parse_args()
+    # The job paces itself with --rpm; the backend's shared limiter would only add waits
+    os.environ.setdefault("QUIZ_LLM_RPM", "0")
+
+    params = {
+        "api_key": os.getenv("GROQ_API_KEY"),
+        "model": args.model,
+        "temperature": args.temperature,
+        "max_tokens": args.max_tokens,
+        "batch_size": args.batch_size
+    }
+    job = PregenerationJob(args.topics, args.levels, args.count, params,
+                           concurrency=args.concurrency, rpm=args.rpm, batch_size=args.batch_size)
+    started = time.time()
+    asyncio.run(job.run())
+    print(
+        f"✅ {job.generated} questions générées en {time.time() - started:.1f}s"
+        + (f", {job.failed_chunks} lots abandonnés" if job.failed_chunks else "")
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -3,140 +3,566 @@ Question Cache Manager
 Prevents repetition of questions within a quiz session and across sessions
 """
 
+import csv
+import io
 import json
-import os
-import hashlib
 import random
-from typing import List, Optional
+import threading
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Optional, Tuple, Union
+import bank_snapshot
+from generation_stats import TokenUsage
+from metrics import timed
 from models import Question
+from question_store import QuestionRecord, get_default_store, learner_key, question_digest
 
+if TYPE_CHECKING:
+    # numpy-backed, imported on first use
+    from irt import AbilityEstimate, Calibration, ItemIndex
+    from near_duplicate import NearDuplicateIndex
 
-class QuestionCache:
-    """Manages a cache of generated questions to prevent repetition"""
 
-    def save_user_choice(self, question: Question, user_choice: str):
-        """Ajoute le choix de l'utilisateur à la question correspondante dans le cache"""
-        question_hash = self.get_question_hash(question)
-        for q in self.cache["questions"]:
-            if q.get("hash") == question_hash:
-                q["user_choice"] = user_choice
-                self.save()
-                return
-        # Si la question n'est pas encore dans le cache, on l'ajoute avec le choix
-        question_data = {
-            "hash": question_hash,
-            "id": question.id,
-            "topic": question.topic,
-            "level": question.level,
-            "question": question.question,
-            "options": question.options,
-            "correct_answer": question.correct_answer,
-            "type": question.type,
-            "user_choice": user_choice
-        }
-        self.cache["questions"].append(question_data)
-        self.save()
+QUESTION_FIELDS = ["id", "topic", "level", "question", "options", "correct_answer", "type"]
+EXPORT_FIELDS = ["topic", "level", "question", "options", "correct_answer", "user_choice"]
+
+
+class _BucketCursor:
+    """A session's lazy shuffle over one (topic, level) bucket.
+
+    Positions before ``cursor`` hold questions already asked this session.
+    ``swaps`` stores the partial Fisher-Yates permutation of the remaining
+    positions, so drawing never copies or reshuffles the shared record list.
+    """
+
+    __slots__ = ("cursor", "swaps")
 
-    FILE = "questions_cache.json"
-    
     def __init__(self):
-        self.cache = self.load()
+        self.cursor = 0
+        self.swaps: Dict[int, int] = {}
+
+    def draw(self, records: List[QuestionRecord], is_asked: Callable[[bytes], bool]) -> Optional[QuestionRecord]:
+        """Return a random record not asked this session (O(1) amortized)"""
+        size = len(records)
+        while self.cursor < size:
+            pos = self.cursor
+            pick = random.randrange(pos, size)
+            current = self.swaps.get(pos, pos)
+            chosen = self.swaps.get(pick, pick)
+            self.swaps[pick] = current
+            self.swaps[pos] = chosen
+            record = records[chosen]
+            if not is_asked(record.digest):
+                return record
+            # Asked this session: move it behind the cursor for good
+            del self.swaps[pos]
+            self.cursor += 1
+        return None
+
+
+class QuestionSession:
+    """
+    One learner's view of the shared question bank.
+    Holds its own asked-set and bucket cursors, so sessions never reset or
+    block each other; only writes to the bank go through the bank lock.
+    """
+
+    def __init__(self, cache: "QuestionCache"):
+        self.cache = cache
+        self.start_session()
+
+    def start_session(self, learner_id: str = None):
+        """Reset session tracking for new quiz"""
         self.session_hashes = set()  # Track this session in memory
-    
-    def load(self):
-        """Load question cache from file"""
-        if os.path.exists(self.FILE):
-            with open(self.FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        return {"questions": [], "session_asked": []}
-    
-    def save(self):
-        """Save question cache to file"""
-        with open(self.FILE, "w", encoding="utf-8") as f:
-            json.dump(self.cache, f, indent=2, ensure_ascii=False)
-    
-    def get_question_hash(self, question: Question) -> str:
-        """Generate a hash for a question to detect duplicates"""
-        # Use just the question text for hashing to catch similar variations
-        question_text = question.question.strip().lower()
-        return hashlib.md5(question_text.encode()).hexdigest()
-    
-    def question_exists_globally(self, question: Question) -> bool:
-        """Check if question already exists in global cache"""
-        question_hash = self.get_question_hash(question)
-        for cached_q in self.cache["questions"]:
-            if cached_q.get("hash") == question_hash:
-                return True
-        return False
-    
+        self.session_order: List[bytes] = []  # Asked digests, in order
+        self.session_choices: Dict[bytes, str] = {}  # Answers given this session
+        self._session_blocked = set()  # Asked digests plus their cached paraphrases
+        self._marked_at = None  # Bank size at the first mark: questions cached later may be unblocked paraphrases
+        self.usage = TokenUsage()  # Tokens spent generating for this session
+        self.learner = learner_key(learner_id)  # Pseudonymous key in the answer log
+        self.abilities: Dict[str, "AbilityEstimate"] = {}  # Per topic, when selection is IRT-driven
+        self._cursors: Dict[Tuple, _BucketCursor] = {}
+        self._generation = self.cache.generation
+        self.cache.refresh()
+
+    def track_ability(self, topic: str, level: str) -> "AbilityEstimate":
+        """
+        Start (or return) the learner's ability estimate on `topic`, with a
+        prior centred on the starting level. The caller updates it with each
+        answer; while it is tracked, draws for `topic` pick the cached
+        question with the most information at the estimate instead of a
+        random one.
+        """
+        ability = self.abilities.get(topic)
+        if ability is None:
+            from irt import AbilityEstimate
+            ability = self.abilities[topic] = AbilityEstimate(level)
+        return ability
+
+    def _cursor(self, key: Tuple) -> _BucketCursor:
+        cursor = self._cursors.get(key)
+        if cursor is None:
+            cursor = self._cursors[key] = _BucketCursor()
+        return cursor
+
+    def _draw(self, topic: str, level: str) -> Optional[QuestionRecord]:
+        if self._generation != self.cache.generation:
+            # The bank was cleared: cursors point into old record lists
+            self._cursors = {}
+            self._generation = self.cache.generation
+            if self._marked_at is not None:
+                self._marked_at = 0
+        records = self.cache.bucket(topic, level)
+        if not records:
+            return None
+        ability = self.abilities.get(topic)
+        if ability is not None:
+            return self._draw_informative(topic, level, records, ability.theta)
+        return self._cursor((topic, level)).draw(records, self._session_blocked.__contains__)
+
+    def _draw_informative(self, topic: str, level: str, records: List[QuestionRecord],
+                          theta: float) -> Optional[QuestionRecord]:
+        """
+        The calibrated item with (close to) the most information at theta.
+        Uncalibrated items are assumed to sit at their level's difficulty:
+        when that would tell more than the best calibrated item, one of them
+        is drawn at random instead, which is also how they get the answers
+        that calibrate them.
+        """
+        is_asked = self._session_blocked.__contains__
+        index = self.cache.item_index(topic, level)
+        floor = 0.0
+        if len(index) < len(records):
+            from irt import Calibration, information
+            floor = information(theta, *Calibration.default_params(level))
+        record = index.pick(theta, is_asked, floor) if len(index) else None
+        if record is None and floor:
+            is_calibrated = self.cache.calibration.is_calibrated
+            record = self._cursor((topic, level, "uncalibrated")).draw(
+                records, lambda key: is_asked(key) or is_calibrated(key))
+        if record is None and len(index):
+            record = index.pick(theta, is_asked)
+        return record
+
+    def _draw_unasked(self, topic: str, level: str) -> Optional[QuestionRecord]:
+        """Draw a record, skipping paraphrases of asked questions cached after those were marked"""
+        record = self._draw(topic, level)
+        while record is not None and self._is_asked_paraphrase(record.question, record.digest):
+            self._session_blocked.add(record.digest)
+            record = self._draw(topic, level)
+        return record
+
+    def _is_asked_paraphrase(self, text: str, question_hash: bytes) -> bool:
+        if self._marked_at is None:
+            return False
+        position = self.cache.position(question_hash)
+        if position is not None and position < self._marked_at:
+            # Cached before any mark: blocked with the asked question it paraphrases
+            return False
+        blocked = self._session_blocked
+        return any(key in blocked for key in self.cache.near_duplicate_keys(text, question_hash))
+
+    @timed("cache_lookup")
     def get_cached_question(self, topic: str, level: str) -> Optional[Question]:
         """Get a random cached question for topic/level that hasn't been asked this session"""
-        # Filter questions matching topic and level
-        matching_questions = [
-            q for q in self.cache["questions"]
-            if q.get("topic") == topic and q.get("level") == level
-        ]
-        
-        if not matching_questions:
+        record = self._draw_unasked(topic, level)
+        if record is None:
+            # Another process may have filled this bucket meanwhile
+            self.cache.refresh()
+            record = self._draw_unasked(topic, level)
+        if record is None:
+            # All matching cached questions have been asked this session
             return None
-        
-        # Shuffle to get random questions
-        random.shuffle(matching_questions)
-        
-        # Return first one that hasn't been asked this session
-        for q_data in matching_questions:
-            q = Question(**{k: q_data[k] for k in ["id", "topic", "level", "question", "options", "correct_answer", "type"]})
-            if not self.was_asked_in_session(q):
-                return q
-        
-        # All matching cached questions have been asked this session
-        return None
-    
+        # The only pydantic model built per draw: the question actually served
+        return record.to_question()
+
     def was_asked_in_session(self, question: Question) -> bool:
-        """Check if question was asked in current session (fast in-memory check)"""
-        question_hash = self.get_question_hash(question)
-        return question_hash in self.session_hashes
-    
-    def add_question(self, question: Question):
-        """Add a new question to the global cache"""
-        if not self.question_exists_globally(question):
-            question_data = {
-                "hash": self.get_question_hash(question),
-                "id": question.id,
-                "topic": question.topic,
-                "level": question.level,
-                "question": question.question,
-                "options": question.options,
-                "correct_answer": question.correct_answer,
-                "type": question.type
-            }
-            self.cache["questions"].append(question_data)
-            self.save()
-    
-    def start_session(self):
-        """Reset session tracking for new quiz"""
-        self.session_hashes = set()  # Clear in-memory set
-    
+        """Check if question, or a paraphrase of it, was asked in current session"""
+        question_hash = self.cache.get_question_hash(question)
+        if question_hash in self._session_blocked:
+            return True
+        # Cached questions too: a paraphrase cached after the asked one was marked is not blocked yet
+        return self._is_asked_paraphrase(question.question, question_hash)
+
     def mark_as_asked(self, question: Question):
         """Mark a question as asked in this session"""
-        question_hash = self.get_question_hash(question)
+        question_hash = self.cache.get_question_hash(question)
+        if question_hash not in self.session_hashes:
+            self.session_order.append(question_hash)
         self.session_hashes.add(question_hash)  # Add to in-memory set
-    
+        if self._marked_at is None:
+            self._marked_at = self.cache.size()
+        if question_hash not in self._session_blocked:
+            self._session_blocked.add(question_hash)
+            self._session_blocked.update(self.cache.find_near_duplicates(question))
+
+    def save_user_choice(self, question: Question, user_choice: str):
+        """Record this session's answer, store it with the question in the bank and in the answer log"""
+        question_hash = self.cache.get_question_hash(question)
+        self.session_choices[question_hash] = user_choice
+        self.cache.save_user_choice(question, user_choice)
+        correct = user_choice == question.correct_answer
+        self.cache.log_answer(question_hash, self.learner, correct, user_choice)
+        ability = self.abilities.get(question.topic)
+        if ability is not None:
+            ability.update(*self.cache.item_params(question_hash, question.level), correct)
+
+    def get_session_records(self, offset: int = 0, limit: int = 10) -> List[dict]:
+        """One page of the questions asked this session, with this session's answers"""
+        page = []
+        for question_hash in self.session_order[offset:offset + limit]:
+            record = self.cache.get_record(question_hash)
+            if record is None:
+                continue
+            data = {field: getattr(record, field) for field in QUESTION_FIELDS}
+            data["options"] = list(record.options)
+            data["user_choice"] = self.session_choices.get(question_hash)
+            page.append(data)
+        return page
+
+    def iter_session_export(self, fmt: str = "jsonl", chunk_size: int = 50) -> Iterator[str]:
+        """Export this session's questions as JSON Lines or CSV, yielded in chunks"""
+        if fmt == "csv":
+            buffer = io.StringIO()
+            csv.writer(buffer).writerow(EXPORT_FIELDS)
+            yield buffer.getvalue()
+        for offset in range(0, len(self.session_order), chunk_size):
+            records = [
+                {field: record[field] for field in EXPORT_FIELDS}
+                for record in self.get_session_records(offset, chunk_size)
+            ]
+            if fmt == "csv":
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                for record in records:
+                    record["options"] = " | ".join(record["options"])
+                    writer.writerow([record[field] for field in EXPORT_FIELDS])
+                yield buffer.getvalue()
+            else:
+                yield "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+
     def get_stats(self) -> dict:
         """Get cache statistics"""
+        stats = self.cache.get_bank_stats()
+        stats["asked_this_session"] = len(self.session_hashes)
+        stats["tokens_this_session"] = self.usage.total_tokens
+        stats["tokens_per_question"] = self.usage.per_question(len(self.session_order))
+        return stats
+
+
+class QuestionCache:
+    """
+    Manages a cache of generated questions to prevent repetition.
+    The bank (records and indexes) is shared by every session of the process
+    and guarded by a lock for writes; per-learner state lives in QuestionSession
+    views created with session(). The session methods on the cache itself act
+    on a default session, for scripts that run a single quiz.
+
+    `snapshot` is the path of the bank snapshot (True: next to the store's
+    file, False: none). A valid snapshot replaces parsing the store and
+    rebuilding the paraphrase index. Without one, the paraphrase index is
+    built on its first use and the snapshot is written then; save_snapshot()
+    rewrites it once the bank has changed.
+
+    `calibration` holds the fitted IRT item parameters (the process-wide one
+    by default), used by sessions that track the learner's ability.
+    """
+
+    # Estimated Jaccard similarity (character 5-grams) above which two questions are paraphrases
+    NEAR_DUPLICATE_THRESHOLD = 0.6
+
+    def __init__(self, store=None, snapshot: Union[bool, str] = True, calibration: "Calibration" = None):
+        self.store = store or get_default_store()
+        self._calibration = calibration
+        self._item_indexes: Dict[Tuple[str, str], Tuple[Tuple, "ItemIndex"]] = {}
+        if snapshot is True:
+            snapshot = bank_snapshot.default_path(self.store)
+        self.snapshot_path = snapshot or None
+        self._lock = threading.RLock()
+        self.generation = 0  # Bumped when the bank is cleared
+        self._dirty = False  # Changed since the snapshot was written
+        self._near: Optional["NearDuplicateIndex"] = None  # Built on first use unless restored
+        self.cache = self.load()
+        self._default_session = QuestionSession(self)
+
+    def session(self) -> QuestionSession:
+        """New per-learner view of the bank"""
+        return QuestionSession(self)
+
+    # ------------------------------------------------------
+    # Shared bank
+    # ------------------------------------------------------
+    def load(self):
+        """Load question cache from its snapshot (or else the store) and rebuild the in-memory indexes"""
+        with self._lock:
+            questions = self._load_snapshot()
+            if questions is not None:
+                # Rows added to a shared store after the snapshot was taken
+                self._pull_new(questions)
+            else:
+                questions = self.store.load()
+                self._build_indexes(questions)
+            return {"questions": questions, "session_asked": []}
+
+    def refresh(self):
+        """Pull questions added by other processes sharing the same store"""
+        with self._lock:
+            self._pull_new(self.cache["questions"])
+
+    def _pull_new(self, questions: List[QuestionRecord]):
+        for record in self.store.load_new():
+            if record.digest not in self._by_hash:
+                self._insert(questions, record)
+
+    def _build_indexes(self, questions: List[QuestionRecord], near_state: Dict = None):
+        """
+        Index records by digest and group them in (topic, level) buckets.
+        The paraphrase index is restored from `near_state` when it matches,
+        otherwise left to _near_index() (hashing a large bank takes seconds).
+        """
+        self._by_hash: Dict[bytes, QuestionRecord] = {}
+        self._buckets: Dict[Tuple[str, str], List[QuestionRecord]] = {}
+        self._near = None
+        for record in questions:
+            self._index(record)
+        if near_state is not None:
+            from near_duplicate import NearDuplicateIndex
+            near = NearDuplicateIndex(threshold=self.NEAR_DUPLICATE_THRESHOLD)
+            try:
+                near.restore_state(near_state, [record.digest for record in questions])
+                self._near = near
+            except (KeyError, ValueError):
+                pass
+
+    def _near_index(self) -> "NearDuplicateIndex":
+        """Paraphrase index, bulk-loaded from the bank on first use (then saved in the snapshot)"""
+        near = self._near
+        if near is None:
+            with self._lock:
+                if self._near is None:
+                    from near_duplicate import NearDuplicateIndex
+                    near = NearDuplicateIndex(threshold=self.NEAR_DUPLICATE_THRESHOLD)
+                    near.add_many((record.digest, record.question) for record in self._by_hash.values())
+                    # Published once complete: queries read it without the lock
+                    self._near = near
+                    self.save_snapshot(force=True)
+                near = self._near
+        return near
+
+    def _index(self, record: QuestionRecord) -> bool:
+        if record.digest in self._by_hash:
+            return False
+        self._by_hash[record.digest] = record
+        self._buckets.setdefault((record.topic, record.level), []).append(record)
+        return True
+
+    def _insert(self, questions: List[QuestionRecord], record: QuestionRecord):
+        questions.append(record)
+        if self._index(record) and self._near is not None:
+            # Without an index yet, the record is hashed when it is built
+            self._near.add(record.digest, record.question)
+        self._dirty = True
+
+    def _append(self, record: QuestionRecord):
+        self._insert(self.cache["questions"], record)
+
+    # ------------------------------------------------------
+    # Snapshot
+    # ------------------------------------------------------
+    def _load_snapshot(self) -> Optional[List[QuestionRecord]]:
+        """Records of a snapshot still matching the store (indexes restored), else None"""
+        if not self.snapshot_path:
+            return None
+        snapshot = bank_snapshot.load(self.snapshot_path)
+        if snapshot is None or not self.store.resume(snapshot.fingerprint, snapshot.records):
+            return None
+        self._build_indexes(snapshot.records, snapshot.near)
+        self._dirty = False
+        return snapshot.records
+
+    def _write_snapshot(self):
+        if not self.snapshot_path or not self._by_hash or self._near is None:
+            return
+        fingerprint = self.store.fingerprint()
+        if fingerprint is None:
+            return
+        # Records in index row order, so the saved index rows line up with them
+        records = [self._by_hash[key] for key in self._near.keys]
+        try:
+            bank_snapshot.save(self.snapshot_path, fingerprint, records, self._near.export_state())
+            self._dirty = False
+        except OSError as e:
+            print(f"⚠️ Snapshot de la banque non écrit : {e}")
+
+    def save_snapshot(self, force: bool = False):
+        """
+        Rewrite the snapshot if the bank changed since the last one (registered at exit).
+        `force` also builds the paraphrase index if nothing has used it yet.
+        """
+        with self._lock:
+            if not (self._dirty or force):
+                return
+            if self._near is None:
+                if not force:
+                    return
+                self._near_index()  # Writes the snapshot once built
+            # Catch up with the store first: the snapshot must hold every row it claims
+            self._pull_new(self.cache["questions"])
+            self._write_snapshot()
+
+    def get_question_hash(self, question: Question) -> bytes:
+        """16-byte digest of a question, used to detect duplicates"""
+        # Use just the question text for hashing to catch similar variations
+        return question_digest(question.question)
+
+    def has_hash(self, question_hash: bytes) -> bool:
+        return question_hash in self._by_hash
+
+    def size(self) -> int:
+        """Number of distinct cached questions"""
+        return len(self._by_hash)
+
+    def position(self, question_hash: bytes) -> Optional[int]:
+        """Order in which a question was cached (0 for the first one), or None if it is not cached"""
+        return self._near_index().row(question_hash)
+
+    def get_record(self, question_hash: bytes) -> Optional[QuestionRecord]:
+        return self._by_hash.get(question_hash)
+
+    def bucket(self, topic: str, level: str) -> List[QuestionRecord]:
+        """Records cached for topic/level (shared list, append-only until the bank is cleared)"""
+        return self._buckets.get((topic, level), [])
+    
+    def question_exists_globally(self, question: Question) -> bool:
+        """Check if question already exists in global cache"""
+        return self.get_question_hash(question) in self._by_hash
+
+    def find_near_duplicates(self, question: Question) -> List[bytes]:
+        """Digests of cached questions that are paraphrases of this one (LSH lookup, no scan)"""
+        return self.near_duplicate_keys(question.question, self.get_question_hash(question))
+
+    def near_duplicate_keys(self, text: str, question_hash: bytes = None) -> List[bytes]:
+        """Digests of cached questions that are paraphrases of `text`, other than `question_hash`"""
+        # Lock-free read: add() stores a signature before publishing it in the bands
+        return [key for key, _ in self._near_index().query(text, exclude=question_hash)]
+    
+    @timed("add_question")
+    def add_question(self, question: Question) -> bool:
+        """Add a new question to the global cache, unless it (or a paraphrase) is already there"""
+        question_hash = self.get_question_hash(question)
+        with self._lock:
+            if question_hash in self._by_hash or self.find_near_duplicates(question):
+                return False
+            record = QuestionRecord.from_question(question, question_hash)
+            self._append(record)
+            self.store.upsert(record)
+            return True
+
+    @timed("save_user_choice")
+    def save_user_choice(self, question: Question, user_choice: str):
+        """Ajoute le choix de l'utilisateur à la question correspondante dans le cache"""
+        question_hash = self.get_question_hash(question)
+        with self._lock:
+            record = self._by_hash.get(question_hash)
+            if record is not None:
+                record.user_choice = record.shared(user_choice)
+                self.store.upsert(record)
+                self._dirty = True
+                return
+            # Si la question n'est pas encore dans le cache, on l'ajoute avec le choix
+            record = QuestionRecord.from_question(question, question_hash)
+            record.user_choice = record.shared(user_choice)
+            self._append(record)
+            self.store.upsert(record)
+
+    def log_answer(self, question_hash: bytes, learner: str, correct: bool, choice: str = None):
+        """Append one answer to the store's answer log (input of the IRT calibration and cohort analytics)"""
+        self.store.log_answer(question_hash.hex(), learner, correct, choice)
+
+    # ------------------------------------------------------
+    # Item calibration
+    # ------------------------------------------------------
+    @property
+    def calibration(self) -> "Calibration":
+        if self._calibration is None:
+            from irt import get_calibration
+            self._calibration = get_calibration()
+        return self._calibration
+
+    def item_params(self, question_hash: bytes, level: str) -> Tuple[float, float]:
+        """(discrimination, difficulty) of a question, its level's defaults until calibrated"""
+        return self.calibration.params(question_hash, level)
+
+    def item_index(self, topic: str, level: str) -> "ItemIndex":
+        """
+        Calibrated items of a bucket sorted by difficulty, rebuilt only when
+        the bank is cleared or a new calibration is loaded (questions added
+        in between are not calibrated yet, so they are not in it).
+        """
+        key = (self.generation, self.calibration.version)
+        cached = self._item_indexes.get((topic, level))
+        if cached is None or cached[0] != key:
+            from irt import ItemIndex
+            cached = self._item_indexes[(topic, level)] = (key, ItemIndex(self.bucket(topic, level), self.calibration))
+        return cached[1]
+
+    def count(self, topic: str, level: str) -> int:
+        """Number of cached questions for topic/level"""
+        return len(self.bucket(topic, level))
+
+    def get_bank_stats(self) -> dict:
         return {
             "total_cached": len(self.cache["questions"]),
-            "asked_this_session": len(self.session_hashes),
-            "unique_topics": len(set(q.get("topic") for q in self.cache["questions"]))
+            "unique_topics": len(set(topic for topic, _ in self._buckets))
         }
     
     def clear_cache(self):
         """Clear all cached questions (use with caution)"""
-        self.cache = {"questions": [], "session_asked": []}
-        self.session_hashes = set()
-        self.save()
+        with self._lock:
+            self.cache = {"questions": [], "session_asked": []}
+            self._build_indexes(self.cache["questions"])
+            self.generation += 1
+            self.store.clear()
+            bank_snapshot.remove(self.snapshot_path)
+            self._dirty = False
+        self._default_session.start_session()
         print("Question cache cleared!")
 
+    # ------------------------------------------------------
+    # Default session (single-quiz scripts)
+    # ------------------------------------------------------
+    @property
+    def session_hashes(self):
+        return self._default_session.session_hashes
+
+    @property
+    def session_order(self):
+        return self._default_session.session_order
+
+    @property
+    def usage(self):
+        return self._default_session.usage
+
+    def start_session(self, learner_id: str = None):
+        self._default_session.start_session(learner_id)
+
+    def get_cached_question(self, topic: str, level: str) -> Optional[Question]:
+        return self._default_session.get_cached_question(topic, level)
+
+    def was_asked_in_session(self, question: Question) -> bool:
+        return self._default_session.was_asked_in_session(question)
+
+    def mark_as_asked(self, question: Question):
+        self._default_session.mark_as_asked(question)
+
+    def get_session_records(self, offset: int = 0, limit: int = 10) -> List[dict]:
+        return self._default_session.get_session_records(offset, limit)
+
+    def iter_session_export(self, fmt: str = "jsonl", chunk_size: int = 50) -> Iterator[str]:
+        return self._default_session.iter_session_export(fmt, chunk_size)
+
+    def get_stats(self) -> dict:
+        """Get cache statistics"""
+        return self._default_session.get_stats()
+
 
 if __name__ == "__main__":
     # Test the cache
@@ -0,0 +1,431 @@
+"""
+Question Bank Storage
+Persistence backends used by QuestionCache (JSON file or SQLite in WAL mode)
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from file_utils import atomic_write_json
+from metrics import timed
+from models import Question
+
+
+RECORD_FIELDS = ["hash", "id", "topic", "level", "question", "options", "correct_answer", "type", "user_choice"]
+
+
+def question_digest(text: str) -> bytes:
+    """16-byte MD5 digest of the normalized question text (stored as hex in the "hash" field)"""
+    return hashlib.md5(text.strip().lower().encode()).digest()
+
+
+def learner_key(learner_id: str = None) -> str:
+    """Pseudonymous key of a learner in the answer log (a fresh one per anonymous session)"""
+    if not learner_id or not learner_id.strip():
+        return f"anon_{uuid.uuid4().hex[:12]}"
+    return hashlib.sha1(learner_id.strip().lower().encode()).hexdigest()[:16]
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class QuestionRecord:
+    """
+    One question of the bank, kept compact in memory: slots instead of a dict,
+    interned topic/level/type, options in a tuple that also provides the
+    correct answer and user choice strings, and the binary digest instead of
+    its hex form. A pydantic Question is only built for the question served.
+    """
+
+    __slots__ = ("digest", "id", "topic", "level", "question", "options", "correct_answer", "type", "user_choice")
+
+    def __init__(self, digest: bytes, id: str, topic: str, level: str, question: str, options,
+                 correct_answer: str, type: str = "MCQ", user_choice: Optional[str] = None):
+        self.digest = digest
+        self.id = id
+        self.topic = _intern(topic)
+        self.level = _intern(level)
+        self.question = question
+        self.options = tuple(options or ())
+        self.correct_answer = self.shared(correct_answer)
+        self.type = _intern(type)
+        self.user_choice = self.shared(user_choice)
+
+    def shared(self, value: Optional[str]) -> Optional[str]:
+        """The option string equal to `value` (one copy in memory), else `value`"""
+        for option in self.options:
+            if option == value:
+                return option
+        return value
+
+    @property
+    def hash(self) -> str:
+        return self.digest.hex()
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "QuestionRecord":
+        """Record from its stored form; legacy entries without a hash get one"""
+        try:
+            digest = bytes.fromhex(data["hash"])
+        except (KeyError, TypeError, ValueError):
+            digest = question_digest(data.get("question", ""))
+        return cls(digest, data.get("id"), data.get("topic"), data.get("level"), data.get("question", ""),
+                   data.get("options"), data.get("correct_answer"), data.get("type", "MCQ"), data.get("user_choice"))
+
+    @classmethod
+    def from_question(cls, question: Question, digest: bytes = None) -> "QuestionRecord":
+        return cls(digest or question_digest(question.question), question.id, question.topic, question.level,
+                   question.question, question.options, question.correct_answer, question.type)
+
+    def as_dict(self) -> Dict:
+        """Stored form (hex hash, options list); user_choice only once answered"""
+        data = {
+            "hash": self.hash,
+            "id": self.id,
+            "topic": self.topic,
+            "level": self.level,
+            "question": self.question,
+            "options": list(self.options),
+            "correct_answer": self.correct_answer,
+            "type": self.type
+        }
+        if self.user_choice is not None:
+            data["user_choice"] = self.user_choice
+        return data
+
+    def to_question(self) -> Question:
+        return Question(id=self.id, topic=self.topic, level=self.level, question=self.question,
+                        options=list(self.options), correct_answer=self.correct_answer, type=self.type)
+
+
+class JsonQuestionStore:
+    """
+    Legacy single-file store. Writes are appended to a journal (one JSON
+    line per upserted record) so their cost does not grow with the bank;
+    the journal is folded back into the JSON file once it holds as many
+    lines as the bank has records (at least COMPACT_MIN), which keeps the
+    amortized cost per write constant.
+    """
+
+    FILE = "questions_cache.json"
+    COMPACT_MIN = 1000
+
+    def __init__(self, path: str = None):
+        self.path = path or self.FILE
+        base = os.path.splitext(self.path)[0]
+        # Records upserted since the JSON file was last rewritten
+        self.journal_path = base + "_journal.jsonl"
+        # Every answer given, one JSON line each (user_choice only keeps the last one)
+        self.answers_path = base + "_answers.jsonl"
+        self._records: Dict[bytes, QuestionRecord] = {}
+        self._journal_lines = 0
+        self._lock = threading.Lock()
+
+    def load(self) -> List[QuestionRecord]:
+        """Load all records from the JSON file, then replay the journal"""
+        self._records = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                questions = json.load(f).get("questions", [])
+            for position in range(len(questions)):
+                record = QuestionRecord.from_dict(questions[position])
+                questions[position] = None  # Free the parsed dict as soon as it is converted
+                self._records.setdefault(record.digest, record)
+        self._journal_lines = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = QuestionRecord.from_dict(json.loads(line))
+                    except ValueError:
+                        continue  # Line cut short by a crash
+                    self._records[record.digest] = record
+                    self._journal_lines += 1
+        return list(self._records.values())
+
+    def load_new(self) -> List[QuestionRecord]:
+        """The JSON file is not shared safely between processes: nothing to pull"""
+        return []
+
+    def fingerprint(self) -> Optional[Dict]:
+        """Identity of the file and journal content, recorded in bank snapshots (None without either)"""
+        fingerprint = {"store": "json", "path": os.path.abspath(self.path)}
+        for key, path in (("file", self.path), ("journal", self.journal_path)):
+            try:
+                info = os.stat(path)
+            except OSError:
+                continue
+            fingerprint[key] = [info.st_size, info.st_mtime_ns]
+        return fingerprint if len(fingerprint) > 2 else None
+
+    def resume(self, fingerprint: Dict, records: List[QuestionRecord]) -> bool:
+        """Adopt records restored from a snapshot, if the file has not changed since it was taken"""
+        if fingerprint != self.fingerprint():
+            return False
+        self._records = {record.digest: record for record in records}
+        self._journal_lines = self._count_journal_lines()
+        return True
+
+    def _count_journal_lines(self) -> int:
+        try:
+            with open(self.journal_path, "rb") as f:
+                return sum(1 for _ in f)
+        except OSError:
+            return 0
+
+    @timed("store_upsert")
+    def upsert(self, record: QuestionRecord):
+        """Insert or replace one record: one journal line, or a rewrite of the file when the journal is full"""
+        line = json.dumps(record.as_dict(), ensure_ascii=False)
+        with self._lock:
+            self._records[record.digest] = record
+            if self._journal_lines + 1 > max(self.COMPACT_MIN, len(self._records)):
+                self._dump()
+                return
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+            self._journal_lines += 1
+
+    def log_answer(self, question_hash: str, learner: str, correct: bool, choice: str = None,
+                   answered_at: float = None):
+        """Append one answer to the log (used to calibrate items and for cohort analytics)"""
+        line = json.dumps({"hash": question_hash, "learner": learner, "correct": bool(correct), "choice": choice,
+                           "at": round(answered_at or time.time(), 3)}, ensure_ascii=False)
+        with self._lock:
+            with open(self.answers_path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def load_answers(self) -> Iterator[Tuple[str, str, bool, Optional[str]]]:
+        """(question hash, learner, correct, option chosen) for every logged answer"""
+        if not os.path.exists(self.answers_path):
+            return
+        with open(self.answers_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    answer = json.loads(line)
+                except ValueError:
+                    continue  # Line cut short by a crash
+                yield answer["hash"], answer["learner"], answer["correct"], answer.get("choice")
+
+    def answers_version(self) -> Optional[Dict]:
+        """Changes whenever an answer is logged (None while the log is empty)"""
+        try:
+            info = os.stat(self.answers_path)
+        except OSError:
+            return None
+        return {"size": info.st_size, "mtime_ns": info.st_mtime_ns}
+
+    def clear(self):
+        """Remove every record and the answer log"""
+        with self._lock:
+            self._records = {}
+            self._dump()
+            if os.path.exists(self.answers_path):
+                os.remove(self.answers_path)
+
+    def _dump(self):
+        """Rewrite the JSON file with every record and empty the journal"""
+        data = {"questions": [record.as_dict() for record in self._records.values()], "session_asked": []}
+        atomic_write_json(self.path, data, indent=2, ensure_ascii=False)
+        # Replaying a journal left by a crash right here would only rewrite the same records
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self._journal_lines = 0
+
+
+class SqliteQuestionStore:
+    """SQLite store in WAL mode, safe to share between several server processes.
+
+    Each write is a single-row upsert, so its cost does not grow with the bank.
+    Connections are kept per thread because sqlite3 connections cannot be
+    shared between threads.
+    """
+
+    FILE = "questions_cache.db"
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS questions (
+        rowid INTEGER PRIMARY KEY AUTOINCREMENT,
+        hash TEXT NOT NULL UNIQUE,
+        id TEXT,
+        topic TEXT,
+        level TEXT,
+        question TEXT NOT NULL,
+        options TEXT NOT NULL,
+        correct_answer TEXT,
+        type TEXT,
+        user_choice TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_questions_topic_level ON questions (topic, level);
+    CREATE TABLE IF NOT EXISTS answers (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        hash TEXT NOT NULL,
+        learner TEXT NOT NULL,
+        correct INTEGER NOT NULL,
+        choice TEXT,
+        answered_at REAL
+    );
+    CREATE INDEX IF NOT EXISTS idx_answers_hash ON answers (hash);
+    """
+
+    def __init__(self, path: str = None, timeout: float = 30.0):
+        self.path = path or self.FILE
+        self.timeout = timeout
+        self._local = threading.local()
+        self._last_rowid = 0
+        self.created = not os.path.exists(self.path)  # New database file: nothing imported yet
+        with self._connect() as conn:
+            conn.executescript(self.SCHEMA)
+            # Answer logs created before the chosen option was recorded
+            if "choice" not in {row["name"] for row in conn.execute("PRAGMA table_info(answers)")}:
+                conn.execute("ALTER TABLE answers ADD COLUMN choice TEXT")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _to_record(row: sqlite3.Row) -> QuestionRecord:
+        return QuestionRecord(bytes.fromhex(row["hash"]), row["id"], row["topic"], row["level"], row["question"],
+                              json.loads(row["options"]), row["correct_answer"], row["type"], row["user_choice"])
+
+    def _select_after(self, rowid: int) -> List[QuestionRecord]:
+        rows = self._connect().execute(
+            f"SELECT rowid, {', '.join(RECORD_FIELDS)} FROM questions WHERE rowid > ? ORDER BY rowid",
+            (rowid,)
+        ).fetchall()
+        if rows:
+            self._last_rowid = max(self._last_rowid, rows[-1]["rowid"])
+        return [self._to_record(row) for row in rows]
+
+    def load(self) -> List[QuestionRecord]:
+        """Load all records"""
+        self._last_rowid = 0
+        return self._select_after(0)
+
+    def load_new(self) -> List[QuestionRecord]:
+        """Load records inserted (by any process) since the last load"""
+        return self._select_after(self._last_rowid)
+
+    def fingerprint(self) -> Optional[Dict]:
+        """Rows loaded so far (rowid high-water mark and row count), recorded in bank snapshots"""
+        count = self._connect().execute(
+            "SELECT COUNT(*) FROM questions WHERE rowid <= ?", (self._last_rowid,)
+        ).fetchone()[0]
+        return {"store": "sqlite", "path": os.path.abspath(self.path), "rowid": self._last_rowid, "count": count}
+
+    def resume(self, fingerprint: Dict, records: List[QuestionRecord]) -> bool:
+        """
+        Continue from a snapshot if none of its rows were removed since; rows
+        inserted after it are then pulled by load_new(). Answers saved by other
+        processes after the snapshot are not reloaded (the bank only writes them).
+        """
+        if fingerprint.get("store") != "sqlite" or fingerprint.get("path") != os.path.abspath(self.path):
+            return False
+        count = self._connect().execute(
+            "SELECT COUNT(*) FROM questions WHERE rowid <= ?", (fingerprint["rowid"],)
+        ).fetchone()[0]
+        if count != fingerprint["count"]:
+            return False
+        self._last_rowid = fingerprint["rowid"]
+        return True
+
+    @timed("store_upsert")
+    def upsert(self, record: QuestionRecord):
+        """Insert one record, or update its answer if the hash already exists"""
+        values = record.as_dict()
+        values["options"] = json.dumps(values["options"], ensure_ascii=False)
+        values.setdefault("user_choice", None)
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT INTO questions ({', '.join(RECORD_FIELDS)}) "
+                f"VALUES ({', '.join(':' + field for field in RECORD_FIELDS)}) "
+                "ON CONFLICT(hash) DO UPDATE SET "
+                "user_choice = COALESCE(excluded.user_choice, questions.user_choice)",
+                {field: values.get(field) for field in RECORD_FIELDS}
+            )
+
+    def log_answer(self, question_hash: str, learner: str, correct: bool, choice: str = None,
+                   answered_at: float = None):
+        """Insert one answer in the log (used to calibrate items and for cohort analytics)"""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO answers (hash, learner, correct, choice, answered_at) VALUES (?, ?, ?, ?, ?)",
+                (question_hash, learner, int(bool(correct)), choice, answered_at or time.time())
+            )
+
+    def load_answers(self) -> Iterator[Tuple[str, str, bool, Optional[str]]]:
+        """(question hash, learner, correct, option chosen) for every logged answer"""
+        cursor = self._connect().execute("SELECT hash, learner, correct, choice FROM answers ORDER BY id")
+        for question_hash, learner, correct, choice in cursor:
+            yield question_hash, learner, bool(correct), choice
+
+    def answers_version(self) -> Optional[Dict]:
+        """Changes whenever an answer is logged (None while the log is empty)"""
+        last, count = self._connect().execute("SELECT MAX(id), COUNT(*) FROM answers").fetchone()
+        return {"last": last, "count": count} if count else None
+
+    def clear(self):
+        """Remove every record and the answer log"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM questions")
+            conn.execute("DELETE FROM answers")
+        self._last_rowid = 0
+
+    def is_empty(self) -> bool:
+        return self._connect().execute("SELECT 1 FROM questions LIMIT 1").fetchone() is None
+
+    def import_json(self, json_path: str = JsonQuestionStore.FILE) -> int:
+        """One-shot import of a legacy questions_cache.json (and its journal), returns the number of new rows"""
+        records = JsonQuestionStore(json_path).load()
+        if not records:
+            return 0
+        rows = []
+        for record in records:
+            stored = record.as_dict()
+            values = {field: stored.get(field) for field in RECORD_FIELDS}
+            values["options"] = json.dumps(values["options"], ensure_ascii=False)
+            rows.append(values)
+        with self._connect() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                f"INSERT OR IGNORE INTO questions ({', '.join(RECORD_FIELDS)}) "
+                f"VALUES ({', '.join(':' + field for field in RECORD_FIELDS)})",
+                rows
+            )
+            return conn.total_changes - before
+
+
+def get_default_store():
+    """Pick the storage backend from the QUESTION_STORE environment variable ("sqlite" by default, or "json")"""
+    backend = os.getenv("QUESTION_STORE", "sqlite").lower()
+    if backend == "json":
+        return JsonQuestionStore(os.getenv("QUESTION_STORE_PATH") or None)
+    store = SqliteQuestionStore(os.getenv("QUESTION_STORE_PATH") or None)
+    if store.created:
+        # One-time migration: a bank cleared later must not get the legacy file back
+        imported = store.import_json()
+        if imported:
+            print(f"📦 {imported} questions importées de {JsonQuestionStore.FILE} dans {store.path}")
+    return store
+
+
+if __name__ == "__main__":
+    # Import the legacy JSON cache into the SQLite bank
+    store = SqliteQuestionStore()
+    imported = store.import_json()
+    print(f"Imported {imported} questions into {store.path}")
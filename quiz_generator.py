@@ -1,40 +1,108 @@
+import asyncio
+import atexit
 import json
 import os
 import re
-from groq import Groq
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+import generation_stats as reasons
+from generation_stats import estimate_tokens, get_telemetry
+from learner_model import LEVELS
+from llm_backend import Completion, CompletionRequest, StreamUsage, get_backend
+from metrics import stage, timed
+from model_router import DEFAULT_MODELS, DEFAULT_QUALITY_TARGET, get_model_router
 from models import Question
 from question_cache import QuestionCache
+from question_store import QuestionRecord
+from resilience import ProviderUnavailable, is_provider_failure
 
 # ==========================================================
 # ✅ API Key Check
 # ==========================================================
 
 # --- Paramètres dynamiques (admin) ---
-import streamlit as st
+def _streamlit():
+    """The streamlit module when running inside the app; scripts and workers never import it"""
+    return sys.modules.get("streamlit")
+
+
+# Questions requested per API call when the cache has nothing left to serve
+DEFAULT_BATCH_SIZE = 5
+# Upper bound for the completion size of one batch request
+BATCH_MAX_TOKENS = 8000
+# Candidate completions raced per question (1 = one at a time)
+DEFAULT_CANDIDATES = 1
+
+
+class GenerationExhausted(Exception):
+    """Every attempt of the retry budget was rejected (not a provider or configuration error)"""
+
+
 def get_admin_params():
+    st = _streamlit()
     if hasattr(st, "session_state") and st.session_state.get("admin_mode", False):
         return {
             "api_key": st.session_state.get("admin_groq_key", os.getenv("GROQ_API_KEY")),
             "model": st.session_state.get("admin_model", "llama-3.1-8b-instant"),
             "temperature": st.session_state.get("admin_temperature", 0.5),
-            "max_tokens": st.session_state.get("admin_max_tokens", 600)
+            "max_tokens": st.session_state.get("admin_max_tokens", 600),
+            "batch_size": st.session_state.get("admin_batch_size", DEFAULT_BATCH_SIZE),
+            "streaming": st.session_state.get("admin_streaming", True),
+            "adaptive_max_tokens": st.session_state.get("admin_adaptive_max_tokens", True),
+            "candidates": st.session_state.get("admin_candidates", DEFAULT_CANDIDATES),
+            "hedge": st.session_state.get("admin_hedge", True),
+            "routing": st.session_state.get("admin_routing", False),
+            "models": st.session_state.get("admin_models", DEFAULT_MODELS),
+            "quality_target": st.session_state.get("admin_quality_target", DEFAULT_QUALITY_TARGET),
+            "irt": st.session_state.get("admin_irt", False)
         }
     else:
         return {
             "api_key": os.getenv("GROQ_API_KEY"),
             "model": "llama-3.1-8b-instant",
             "temperature": 0.5,
-            "max_tokens": 600
+            "max_tokens": 600,
+            "batch_size": DEFAULT_BATCH_SIZE,
+            "streaming": True,
+            "adaptive_max_tokens": True,
+            "candidates": DEFAULT_CANDIDATES,
+            "hedge": True,
+            "routing": os.getenv("QUIZ_MODEL_ROUTING", "0") == "1",
+            "models": [m.strip() for m in os.getenv("QUIZ_ROUTER_MODELS", ",".join(DEFAULT_MODELS)).split(",") if m.strip()],
+            "quality_target": DEFAULT_QUALITY_TARGET,
+            "irt": os.getenv("QUIZ_IRT", "0") == "1"
         }
 
 
-question_cache = QuestionCache()
+_question_cache = None
+_question_cache_lock = threading.Lock()
 
 
+def get_question_cache() -> QuestionCache:
+    """Process-wide question bank, loaded on first use; its snapshot is refreshed at exit"""
+    global _question_cache
+    if _question_cache is None:
+        with _question_cache_lock:
+            if _question_cache is None:
+                _question_cache = QuestionCache()
+                atexit.register(_question_cache.save_snapshot)
+    return _question_cache
+
+
+def __getattr__(name):
+    # `from quiz_generator import question_cache` still works, without loading the bank at import time
+    if name == "question_cache":
+        return get_question_cache()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # ==========================================================
 # ✅ JSON Extraction (Safe)
 # ==========================================================
+@timed("parse_json")
 def extract_json_from_text(text: str) -> dict:
     """
     Extract JSON safely even if model adds extra text.
@@ -53,12 +121,34 @@ def extract_json_from_text(text: str) -> dict:
         raise ValueError(f"❌ JSON invalide: {e}")
 
 
+@timed("parse_json")
+def extract_json_array_from_text(text: str) -> list:
+    """
+    Extract a JSON array safely even if model adds extra text.
+    """
+    start = text.find("[")
+    end = text.rfind("]")
+
+    if start == -1 or end == -1:
+        raise ValueError("❌ Aucune liste JSON détectée dans la réponse du modèle.")
+
+    try:
+        items = json.loads(text[start:end + 1])
+    except json.JSONDecodeError as e:
+        raise ValueError(f"❌ JSON invalide: {e}")
+
+    if not isinstance(items, list):
+        raise ValueError("❌ La réponse du modèle n'est pas une liste JSON.")
+    return items
+
+
 # ==========================================================
 # ✅ Quality Filter
 # ==========================================================
-def is_low_quality(data: dict) -> bool:
+def low_quality_reason(data: dict) -> str:
     """
-    Reject weak or trivial AI-generated questions.
+    Name the quality rule a weak or trivial AI-generated question breaks,
+    or return an empty string if it passes them all.
     """
 
     question = data.get("question", "").lower()
@@ -66,59 +156,297 @@ def is_low_quality(data: dict) -> bool:
 
     # Too short → usually trivial
     if len(question) < 25:
-        return True
+        return reasons.TOO_SHORT
 
     # Generic beginner patterns
     bad_starts = ["what is", "define", "explain"]
     if any(question.startswith(b) for b in bad_starts):
-        return True
+        return reasons.GENERIC_START
 
     # Placeholder options like "Option A"
     if any(opt.lower().startswith("option") for opt in options):
-        return True
+        return reasons.PLACEHOLDER_OPTIONS
+
+    return ""
 
-    return False
+
+def is_low_quality(data: dict) -> bool:
+    """
+    Reject weak or trivial AI-generated questions.
+    """
+    return bool(low_quality_reason(data))
+
+
+# ==========================================================
+# ✅ Streaming Validation (early abort)
+# ==========================================================
+_JSON_STRING = r'"(?:[^"\\]|\\.)*"'
+_QUESTION_FIELD = re.compile(r'"question"\s*:\s*(' + _JSON_STRING + ')')
+_OPTIONS_FIELD = re.compile(r'"options"\s*:\s*(\[(?:[^\]"]|' + _JSON_STRING + r')*\])')
+_ANSWER_FIELD = re.compile(r'"correct_answer"\s*:\s*(' + _JSON_STRING + ')')
+
+
+class StreamingQuestionCheck:
+    """
+    Incremental quality check over a streamed single-question reply.
+    Each field is parsed as soon as its closing quote or bracket arrives,
+    and the quality rules run without waiting for the rest of the reply.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.question = None
+        self.options = None
+        self.reason = ""
+
+    def feed(self, chunk: str) -> str:
+        """Add streamed text; returns a rejection reason, or "" while the reply still looks valid"""
+        self.text += chunk
+        try:
+            self.reason = self._check()
+        except ValueError:
+            # A field that matched but does not decode (bad escape, garbled text)
+            self.reason = reasons.INVALID_JSON
+        return self.reason
+
+    def _check(self) -> str:
+        if self.question is None:
+            match = _QUESTION_FIELD.search(self.text)
+            if match is None:
+                return ""
+            self.question = json.loads(match.group(1))
+            # Length and generic-start rules only need the question text
+            reason = low_quality_reason({"question": self.question, "options": []})
+            if reason:
+                return reason
+
+        if self.options is None:
+            match = _OPTIONS_FIELD.search(self.text)
+            if match is None:
+                return ""
+            self.options = json.loads(match.group(1))
+            if not all(isinstance(opt, str) for opt in self.options):
+                return reasons.INVALID_OPTIONS
+            reason = low_quality_reason({"question": self.question, "options": self.options})
+            if reason:
+                return reason
+
+        match = _ANSWER_FIELD.search(self.text)
+        if match is not None and json.loads(match.group(1)) not in self.options:
+            return reasons.ANSWER_NOT_IN_OPTIONS
+        return ""
+
+
+# Reason of candidates stopped because another one was accepted (not a quality rejection)
+CANCELLED = "cancelled"
+
+
+def _stream_completion(backend, request: CompletionRequest, cancel: threading.Event = None):
+    """
+    Stream one candidate. Returns (completion, reason): the Completion
+    received so far, and the rejection reason when the quality check
+    failed midway and the stream was cancelled ("" otherwise).
+    Setting `cancel` stops the stream at the next chunk.
+    Streams read to the end carry the provider's token usage; cancelled
+    ones have none and are estimated when accounted.
+    """
+    check = StreamingQuestionCheck()
+    usage = StreamUsage(0, 0)
+    stream = backend.stream(request)
+    try:
+        for chunk in stream:
+            if isinstance(chunk, StreamUsage):
+                usage = chunk
+                continue
+            if cancel is not None and cancel.is_set():
+                return Completion(check.text), CANCELLED
+            reason = check.feed(chunk)
+            if reason:
+                print(f"⚠️ Génération interrompue ({reason}) → retry...")
+                return Completion(check.text), reason
+    finally:
+        stream.close()
+    return Completion(check.text, *usage), ""
 
 
 # ==========================================================
 # ✅ Main Question Generator
 # ==========================================================
-def generate_question(topic: str, level: str, index: int) -> Question:
+@timed("generate_question")
+def generate_question(topic: str, level: str, index: int, params: dict = None, session=None) -> Question:
     """
     Priority:
     1. Return unused cached question
     2. Generate new high-quality question via API
     3. Cache only validated good questions
+    With model routing, the model is chosen per (topic, level) and a failed
+    generation is tried once more on the next model of the cascade.
+    If the provider is failing or rate-limited, fall back to an unasked
+    cached question of the same topic (same level, then adjacent levels).
+
+    `params` defaults to get_admin_params(); pass it explicitly when calling
+    from a background thread, where st.session_state is not available.
+    `session` is the learner's QuestionSession (get_question_cache().session());
+    without it the cache's default session is used.
     """
+    session = session or get_question_cache()
 
     # Step 1: Try cache first
-    cached_question = question_cache.get_cached_question(topic, level)
-    if cached_question and not question_cache.was_asked_in_session(cached_question):
+    cached_question = session.get_cached_question(topic, level)
+    if cached_question and not session.was_asked_in_session(cached_question):
         return cached_question
 
-    # Step 2: Generate new question
-    question = _generate_question_from_api(topic, level, index)
+    # Step 2: Generate new question(s)
+    params = _route(params or get_admin_params(), topic, level)
+    try:
+        return _generate_new_question(topic, level, index, params, session)
+    except Exception as e:
+        error = e
+
+    next_params = _cascade(params, error)
+    if next_params is not None:
+        try:
+            return _generate_new_question(topic, level, index, next_params, session)
+        except Exception as e:
+            error = e
+    return _fallback_question(topic, level, session, error)
+
+
+def _generate_new_question(topic: str, level: str, index: int, params: dict, session) -> Question:
+    if params.get("batch_size", 1) > 1:
+        # One call fills the bucket; the extra questions are served from cache later
+        try:
+            batch = generate_questions_batch(topic, level, params["batch_size"], index, params, session=session)
+        except GenerationExhausted:
+            batch = []
+        for question in batch:
+            if not session.was_asked_in_session(question):
+                return _routed(params, question)
+        # Nothing usable in the batch: one question at a time (streamed, raced and hedged)
+        print("⚠️ Aucune question utilisable dans le lot → génération unitaire...")
+    question = _generate_question_from_api(topic, level, index, params, session)
 
     # Step 3: Cache only good questions
-    question_cache.add_question(question)
+    get_question_cache().add_question(question)
 
-    return question
+    return _routed(params, question)
+
+
+async def agenerate_question(topic: str, level: str, index: int, params: dict = None, session=None) -> Question:
+    """
+    Async variant of generate_question built on the async Groq client,
+    so many generations can overlap on one event loop.
+    """
+    session = session or get_question_cache()
+
+    cached_question = session.get_cached_question(topic, level)
+    if cached_question and not session.was_asked_in_session(cached_question):
+        return cached_question
+
+    params = _route(params or get_admin_params(), topic, level)
+    try:
+        return await _agenerate_new_question(topic, level, index, params, session)
+    except Exception as e:
+        error = e
+
+    next_params = _cascade(params, error)
+    if next_params is not None:
+        try:
+            return await _agenerate_new_question(topic, level, index, next_params, session)
+        except Exception as e:
+            error = e
+    return _fallback_question(topic, level, session, error)
+
+
+async def _agenerate_new_question(topic: str, level: str, index: int, params: dict, session) -> Question:
+    if params.get("batch_size", 1) > 1:
+        try:
+            batch = await agenerate_questions_batch(topic, level, params["batch_size"], index, params,
+                                                    session=session)
+        except GenerationExhausted:
+            batch = []
+        for question in batch:
+            if not session.was_asked_in_session(question):
+                return _routed(params, question)
+        print("⚠️ Aucune question utilisable dans le lot → génération unitaire...")
+    question = await _agenerate_question_from_api(topic, level, index, params, session)
+
+    # The bank write (and its paraphrase check) stays off the event loop
+    await asyncio.to_thread(get_question_cache().add_question, question)
+
+    return _routed(params, question)
 
 
 # ==========================================================
-# ✅ API Generation with Retry + Filtering
+# ✅ Model Routing
 # ==========================================================
-def _generate_question_from_api(topic: str, level: str, index: int) -> Question:
+def _route(params: dict, topic: str, level: str) -> dict:
+    """Copy of `params` with the model the router picks for (topic, level)"""
+    if not params.get("routing"):
+        return params
+    model = get_model_router().choose(topic, level, params.get("models"),
+                                      params.get("quality_target", DEFAULT_QUALITY_TARGET))
+    return dict(params, model=model)
+
+
+def _routed(params: dict, question: Question) -> Question:
+    if params.get("routing"):
+        get_model_router().report_success(params["model"])
+    return question
+
+
+def _cascade(params: dict, error: Exception):
     """
-    Generates exam-quality MCQ from Groq API.
-    Retries if weak question is generated.
+    Params for one more attempt on the next model after a routed generation
+    failed, or None (routing off, configuration error, provider-wide outage
+    or rate limit, no other model).
     """
-    # --- PROMPT ADMIN OU PAR DÉFAUT ---
-    params = get_admin_params()
-    if not params["api_key"]:
+    if not params.get("routing") or isinstance(error, (ValueError, ProviderUnavailable)):
+        return None
+    router = get_model_router()
+    if is_provider_failure(error) or getattr(error, "status_code", None) == 404:
+        router.report_failure(params["model"])
+    next_model = router.cascade(params["model"], params.get("models"))
+    if next_model is None or next_model == params["model"]:
+        return None
+    print(f"⚠️ {params['model']} : {error} → essai avec {next_model}")
+    return dict(params, model=next_model)
+
+
+def _fallback_levels(level: str) -> list:
+    """`level` first, then its neighbours in LEVELS (lower one first)"""
+    if level not in LEVELS:
+        return [level]
+    position = LEVELS.index(level)
+    return [level] + [LEVELS[i] for i in (position - 1, position + 1) if 0 <= i < len(LEVELS)]
+
+
+def _fallback_question(topic: str, level: str, session, error: Exception) -> Question:
+    """
+    Degraded mode while the provider is failing: serve an unasked cached
+    question of the same topic, same level first, then an adjacent level.
+    Re-raises `error` when it is not a provider failure or nothing is cached.
+    """
+    if not is_provider_failure(error):
+        raise error
+    for candidate_level in _fallback_levels(level):
+        question = session.get_cached_question(topic, candidate_level)
+        if question and not session.was_asked_in_session(question):
+            print(f"⚠️ Fournisseur indisponible ({error}) → question du cache ({candidate_level})")
+            return question
+    raise error
+
+
+# ==========================================================
+# ✅ API Generation with Retry + Filtering
+# ==========================================================
+def _check_api_key(params: dict):
+    if get_backend().requires_api_key and not params["api_key"]:
         raise ValueError("❌ GROQ_API_KEY n'est pas définie. Merci de la saisir dans les paramètres admin avant de lancer le quiz.")
-    client = Groq(api_key=params["api_key"])
-    prompt = f"""
+
+
+def _question_prompt(topic: str, level: str, index: int) -> str:
+    return f"""
 Tu es un professeur universitaire expert chargé de rédiger des QCM de niveau examen.
 
 Génère UNE seule question QCM de haute qualité.
@@ -146,46 +474,507 @@ Format JSON exact :
     "type": "MCQ"
 }}
 """
-    # ✅ Retry up to 5 times if low-quality output appears
-    import streamlit as st
-    for attempt in range(5):
-        try:
-            response = client.chat.completions.create(
-                model=params["model"],
-                messages=[{"role": "user", "content": prompt}],
-                temperature=params["temperature"],
-                max_tokens=params["max_tokens"]
-            )
-        except Exception as e:
-            st.error(f"❌ Erreur API GROQ : {e}. Vérifiez la clé et le modèle.")
-            raise
 
-        if not response.choices or not response.choices[0].message.content:
-            continue
 
-        content = response.choices[0].message.content.strip()
+def _max_tokens(params: dict) -> int:
+    """Completion budget of one question: observed p99 plus a margin, capped by the admin value"""
+    if not params.get("adaptive_max_tokens", True):
+        return params["max_tokens"]
+    return get_telemetry().max_tokens(params["model"], params["max_tokens"])
+
+
+def _question_request(params: dict, topic: str, level: str, index: int) -> CompletionRequest:
+    # Buckets with a low acceptance rate get a lower temperature
+    temperature = get_telemetry().temperature(topic, level, params["model"], params["temperature"])
+    return CompletionRequest(
+        kind="question",
+        topic=topic,
+        level=level,
+        prompt=_question_prompt(topic, level, index),
+        model=params["model"],
+        temperature=temperature,
+        max_tokens=_max_tokens(params),
+        api_key=params["api_key"]
+    )
+
+
+@timed("validate")
+def _parse_question(completion, session=None):
+    """
+    Validate one completion. Returns (question, reason): the Question and "",
+    or None and the rejection reason code to retry with.
+    """
+    content = completion.content.strip()
+    if not content:
+        return None, reasons.EMPTY
 
-        # Extract JSON
+    # Extract JSON
+    try:
         data = extract_json_from_text(content)
+    except ValueError as e:
+        print(f"⚠️ {e} → retry...")
+        return None, reasons.INVALID_JSON
 
-        # Required fields validation
-        required_fields = ["id", "topic", "level", "question", "options", "correct_answer", "type"]
-        for field in required_fields:
-            if field not in data:
-                raise ValueError(f"❌ Champ manquant: {field}")
+    # Required fields validation
+    required_fields = ["id", "topic", "level", "question", "options", "correct_answer", "type"]
+    for field in required_fields:
+        if field not in data:
+            print(f"⚠️ Champ manquant: {field} → retry...")
+            return None, reasons.MISSING_FIELD
 
-        # Reject weak questions
-        if is_low_quality(data):
-            print("⚠️ Question trop faible générée → retry...")
-            continue
+    if not isinstance(data["options"], list) or not all(isinstance(o, str) for o in data["options"]):
+        print("⚠️ Options invalides → retry...")
+        return None, reasons.INVALID_OPTIONS
+
+    # Reject weak questions
+    reason = low_quality_reason(data)
+    if reason:
+        print(f"⚠️ Question trop faible générée ({reason}) → retry...")
+        return None, reason
+
+    # Check correct answer consistency
+    if data["correct_answer"] not in data["options"]:
+        print("⚠️ La bonne réponse n'est pas dans les options → retry...")
+        return None, reasons.ANSWER_NOT_IN_OPTIONS
+
+    # Reject repeats and paraphrases of questions already asked this session
+    question = Question(**data)
+    if (session or get_question_cache()).was_asked_in_session(question):
+        print("⚠️ Question déjà posée (ou paraphrase) → retry...")
+        return None, reasons.DUPLICATE
+
+    # ✅ Validated question
+    return question, ""
+
+
+def _completion_tokens(completion) -> int:
+    return completion.completion_tokens or estimate_tokens(completion.content)
+
+
+def _record_usage(request: CompletionRequest, completion, session=None):
+    """
+    Account the tokens of one API call per bucket and for the learner session.
+    Calls without provider usage (streams cancelled midway) are estimated
+    from the text and counted as estimated.
+    """
+    prompt_tokens = completion.prompt_tokens or estimate_tokens(request.prompt)
+    get_telemetry().record_call(request.topic, request.level, request.model,
+                                prompt_tokens, _completion_tokens(completion),
+                                estimated=not completion.completion_tokens)
+    if session is not None:
+        session.usage.add(prompt_tokens, _completion_tokens(completion))
+
+
+@timed("llm_call")
+def _call_candidate(backend, request: CompletionRequest, streaming: bool, cancel: threading.Event = None):
+    """One candidate completion. Returns (completion, reason, seconds)."""
+    started = time.perf_counter()
+    if streaming and hasattr(backend, "stream"):
+        completion, reason = _stream_completion(backend, request, cancel)
+    else:
+        completion, reason = backend.complete(request), ""
+    return completion, reason, time.perf_counter() - started
+
+
+# Worker threads have no Streamlit script context: st.error calls made there
+# are lost, so their errors are reported by the script thread collecting them
+_thread_state = threading.local()
+
+
+@contextmanager
+def deferred_error_reports():
+    """Within this block (in a worker thread), API errors are only raised, never reported"""
+    _thread_state.deferred = True
+    try:
+        yield
+    finally:
+        _thread_state.deferred = False
+
+
+def _report_api_error(e: Exception):
+    # Provider incidents are handled by the cache fallback, not reported as configuration errors
+    if is_provider_failure(e) or getattr(_thread_state, "deferred", False):
+        return
+    message = f"❌ Erreur API GROQ : {e}. Vérifiez la clé et le modèle."
+    st = _streamlit()
+    if st is not None:
+        st.error(message)
+    else:
+        print(message)
+
+
+def _review_candidate(request: CompletionRequest, result, session=None):
+    """
+    Account and validate one finished candidate. Returns the Question, or None.
+    """
+    completion, reason, seconds = result
+    telemetry = get_telemetry()
+    _record_usage(request, completion, session)
+    if reason == CANCELLED:
+        return None
+    if not reason:
+        # Only complete replies are latency samples; aborted streams are short by design
+        telemetry.record_latency(request.model, seconds)
+    question = None
+    if not reason:
+        question, reason = _parse_question(completion, session)
+    telemetry.record(request.topic, request.level, request.model, reason, _completion_tokens(completion))
+    if question is not None:
+        telemetry.record_length(request.model, _completion_tokens(completion))
+    return question
 
-        # Check correct answer consistency
-        if data["correct_answer"] not in data["options"]:
-            print("⚠️ La bonne réponse n'est pas dans les options → retry...")
-            continue
 
-        # ✅ Return validated question
-        return Question(**data)
+def _generate_question_from_api(topic: str, level: str, index: int, params: dict = None, session=None) -> Question:
+    """
+    Generates exam-quality MCQ from Groq API.
+    Retries if weak question is generated.
+    """
+    # --- PROMPT ADMIN OU PAR DÉFAUT ---
+    params = params or get_admin_params()
+    _check_api_key(params)
+    backend = get_backend()
+    request = _question_request(params, topic, level, index)
+    telemetry = get_telemetry()
+    budget = telemetry.retry_budget(topic, level, request.model)
+
+    # Hedging only applies once the model has a p95 latency; until then one
+    # candidate is called in this thread, without going through the executor
+    hedging = params.get("hedge") and telemetry.hedge_delay(request.model) is not None
+    if params.get("candidates", 1) > 1 or hedging:
+        question = _race_candidates(backend, request, params, session, budget)
+        if question is not None:
+            return question
+    else:
+        # ✅ Retry while low-quality output appears (budget adapted to the bucket's acceptance rate)
+        for attempt in range(budget):
+            try:
+                result = _call_candidate(backend, request, params.get("streaming"))
+            except Exception as e:
+                _report_api_error(e)
+                raise
+
+            question = _review_candidate(request, result, session)
+            if question is not None:
+                return question
 
     # If all retries fail
-    raise Exception("❌ Impossible de générer une question de bonne qualité après plusieurs essais.")
+    telemetry.record_exhausted(topic, level, request.model)
+    raise GenerationExhausted("❌ Impossible de générer une question de bonne qualité après plusieurs essais.")
+
+
+# ==========================================================
+# ✅ Speculative Candidates + Hedged Requests
+# ==========================================================
+_candidate_executor = None
+_candidate_executor_lock = threading.Lock()
+
+
+def _get_candidate_executor() -> ThreadPoolExecutor:
+    """Shared by every session (created on first race); each question uses at most `candidates` + 1 threads"""
+    global _candidate_executor
+    if _candidate_executor is None:
+        with _candidate_executor_lock:
+            if _candidate_executor is None:
+                _candidate_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="candidate")
+    return _candidate_executor
+
+
+def _race_candidates(backend, request: CompletionRequest, params: dict, session, budget: int):
+    """
+    Launch `candidates` completions at once and return the first one that
+    passes validation; a rejected candidate is replaced until `budget`
+    candidates have been launched. If the latest candidate has not come
+    back after the model's p95 latency, one extra hedge request is sent,
+    on top of the budget (at most `budget` + 1 requests in total).
+    The other candidates are cancelled (streams stop at their next chunk;
+    plain calls finish in the background and are only accounted).
+    Returns None when every candidate was rejected; a provider error is
+    raised only once no other candidate is left running.
+    """
+    streaming = params.get("streaming")
+    telemetry = get_telemetry()
+    cancel = threading.Event()
+    pending = set()
+    launched_at = {}
+    error = None
+    delay = telemetry.hedge_delay(request.model) if params.get("hedge") else None
+    hedge_at = None
+    hedges = 0
+
+    def launch():
+        nonlocal hedge_at
+        future = _get_candidate_executor().submit(_call_candidate, backend, request, streaming, cancel)
+        launched_at[future] = time.monotonic()
+        pending.add(future)
+        if delay is not None:
+            # The hedge timer follows the latest candidate until the hedge is used
+            hedge_at = launched_at[future] + delay
+
+    for _ in range(min(max(1, params.get("candidates", 1)), budget)):
+        launch()
+
+    try:
+        while pending:
+            timeout = None if hedge_at is None else max(0.0, hedge_at - time.monotonic())
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # Slower than p95: one hedge request, on top of the retry budget
+                print(f"⏳ Réponse lente (> p95 {delay:.1f}s) → requête de couverture")
+                launch()
+                hedges += 1
+                delay = hedge_at = None
+                continue
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    if not is_provider_failure(e):
+                        _report_api_error(e)
+                        raise
+                    error = e
+                    continue
+                question = _review_candidate(request, result, session)
+                if question is not None:
+                    return question
+                if len(launched_at) - hedges < budget and error is None:
+                    launch()
+        if error is not None:
+            raise error
+        return None
+    finally:
+        cancel.set()
+        slow_after = telemetry.hedge_delay(request.model)
+        for future in pending:
+            # Lost candidates that were already slow still count as (lower-bound)
+            # latency samples, otherwise hedging would hide the tail it reacts to
+            elapsed = time.monotonic() - launched_at[future]
+            if slow_after is not None and elapsed >= slow_after:
+                telemetry.record_latency(request.model, elapsed)
+            future.cancel()
+            future.add_done_callback(lambda f: _account_abandoned(request, f, session))
+
+
+def _account_abandoned(request: CompletionRequest, future, session=None):
+    """Tokens of a candidate that finished after the race was decided"""
+    if future.cancelled() or future.exception() is not None:
+        return
+    completion, reason, seconds = future.result()
+    _record_usage(request, completion, session)
+
+
+async def _agenerate_question_from_api(topic: str, level: str, index: int, params: dict = None, session=None) -> Question:
+    """
+    Async variant of _generate_question_from_api.
+    """
+    params = params or get_admin_params()
+    _check_api_key(params)
+    backend = get_backend()
+    request = _question_request(params, topic, level, index)
+    telemetry = get_telemetry()
+
+    for attempt in range(telemetry.retry_budget(topic, level, request.model)):
+        completion = await backend.acomplete(request)
+        _record_usage(request, completion, session)
+
+        question, reason = _parse_question(completion, session)
+        telemetry.record(topic, level, request.model, reason, _completion_tokens(completion))
+        if question is not None:
+            telemetry.record_length(request.model, _completion_tokens(completion))
+            return question
+
+    telemetry.record_exhausted(topic, level, request.model)
+    raise GenerationExhausted("❌ Impossible de générer une question de bonne qualité après plusieurs essais.")
+
+
+# ==========================================================
+# ✅ Batch Generation (N questions per API call)
+# ==========================================================
+def _batch_rejection_reason(data) -> str:
+    """
+    Return why a batch item is unusable, or an empty string if it is valid.
+    """
+    if not isinstance(data, dict):
+        return reasons.INVALID_JSON
+    for field in ["question", "options", "correct_answer"]:
+        if field not in data:
+            return reasons.MISSING_FIELD
+    if not isinstance(data["options"], list) or not all(isinstance(o, str) for o in data["options"]):
+        return reasons.INVALID_OPTIONS
+    reason = low_quality_reason(data)
+    if reason:
+        return reason
+    if data["correct_answer"] not in data["options"]:
+        return reasons.ANSWER_NOT_IN_OPTIONS
+    return ""
+
+
+def _batch_prompt(topic: str, level: str, count: int) -> str:
+    return f"""
+Tu es un professeur universitaire expert chargé de rédiger des QCM de niveau examen.
+
+Génère {count} questions QCM de haute qualité, toutes différentes.
+
+Sujet : {topic}
+Niveau : {level}
+
+RÈGLES STRICTES :
+- Chaque question doit tester la compréhension et le raisonnement, PAS une simple définition.
+- Ne génère jamais des questions triviales comme : "Qu'est-ce que Python ?"
+- Les mauvaises réponses doivent être plausibles (erreurs fréquentes des étudiants).
+- Ne jamais utiliser des options génériques comme "Option A", "Option B".
+- La bonne réponse ne doit pas être évidente immédiatement.
+- Retourne UNIQUEMENT une liste JSON valide de {count} objets, sans aucun texte supplémentaire.
+
+Format JSON exact :
+
+[
+    {{
+        "question": "Texte de la question en français",
+        "options": ["Choix 1", "Choix 2", "Choix 3", "Choix 4"],
+        "correct_answer": "Choix 1"
+    }}
+]
+"""
+
+
+def _batch_request(params: dict, topic: str, level: str, missing: int) -> CompletionRequest:
+    # Same adaptive temperature as single questions: batch items are recorded in the same bucket
+    temperature = get_telemetry().temperature(topic, level, params["model"], params["temperature"])
+    return CompletionRequest(
+        kind="batch",
+        topic=topic,
+        level=level,
+        prompt=_batch_prompt(topic, level, missing),
+        model=params["model"],
+        temperature=temperature,
+        max_tokens=min(_max_tokens(params) * missing, BATCH_MAX_TOKENS),
+        api_key=params["api_key"]
+    )
+
+
+@timed("validate_batch")
+def _collect_batch(completion, topic: str, level: str, missing: int, start_index: int,
+                   questions: list, seen_hashes: set, model: str = None):
+    """
+    Validate each item of a batch completion and cache the valid ones.
+    Each item is recorded in the telemetry with its share of the tokens;
+    accepted items are also length samples for the adaptive max_tokens.
+    """
+    telemetry = get_telemetry()
+    bank = get_question_cache()
+    tokens = _completion_tokens(completion)
+    if not completion.content.strip():
+        telemetry.record(topic, level, model, reasons.EMPTY, tokens)
+        return
+
+    try:
+        items = extract_json_array_from_text(completion.content.strip())
+    except ValueError as e:
+        print(f"⚠️ Lot illisible ({e}) → retry...")
+        telemetry.record(topic, level, model, reasons.INVALID_JSON, tokens)
+        return
+
+    items = items[:missing]
+    item_tokens = tokens // max(len(items), 1)
+    for data in items:
+        reason = _batch_rejection_reason(data)
+        if reason:
+            print(f"⚠️ Question du lot rejetée ({reason})")
+            telemetry.record(topic, level, model, reason, item_tokens)
+            continue
+        question = Question(
+            id=f"q_{start_index + len(questions)}",
+            topic=topic,
+            level=level,
+            question=data["question"],
+            options=data["options"],
+            correct_answer=data["correct_answer"],
+            type="MCQ"
+        )
+        question_hash = bank.get_question_hash(question)
+        # add_question also rejects paraphrases of cached questions (and of earlier batch items)
+        if question_hash in seen_hashes or not bank.add_question(question):
+            telemetry.record(topic, level, model, reasons.DUPLICATE, item_tokens)
+            continue
+        telemetry.record(topic, level, model, "", item_tokens)
+        telemetry.record_length(model, _single_question_tokens(item_tokens, data, question))
+        seen_hashes.add(question_hash)
+        questions.append(question)
+
+
+def _single_question_tokens(item_tokens: int, data: dict, question: Question) -> int:
+    """Length a single-question reply for this batch item would have (it also carries id, topic, level and type)"""
+    item = json.dumps(data, ensure_ascii=False)
+    full = json.dumps(QuestionRecord.from_question(question).as_dict(), ensure_ascii=False)
+    return round(item_tokens * len(full) / max(len(item), 1))
+
+
+def generate_questions_batch(topic: str, level: str, count: int, start_index: int = 1,
+                             params: dict = None, max_rounds: int = None, session=None) -> list:
+    """
+    Generates up to `count` MCQs with one API call per round.
+    Each item is validated on its own; only the rejected slots are requested
+    again in the next round. Valid questions are added to the cache.
+    Rounds default to the bucket's retry budget. The tokens are accounted
+    to `session` when given.
+    """
+    params = params or get_admin_params()
+    _check_api_key(params)
+    backend = get_backend()
+    telemetry = get_telemetry()
+    if max_rounds is None:
+        max_rounds = telemetry.retry_budget(topic, level, params["model"])
+
+    questions = []
+    seen_hashes = set()
+    for _ in range(max_rounds):
+        missing = count - len(questions)
+        if missing <= 0:
+            break
+        request = _batch_request(params, topic, level, missing)
+        try:
+            started = time.perf_counter()
+            with stage("llm_call_batch"):
+                completion = backend.complete(request)
+        except Exception as e:
+            _report_api_error(e)
+            raise
+        telemetry.record_latency(params["model"], time.perf_counter() - started, batch=True)
+        _record_usage(request, completion, session)
+        _collect_batch(completion, topic, level, missing, start_index, questions, seen_hashes, params["model"])
+
+    if not questions:
+        raise GenerationExhausted("❌ Impossible de générer une question de bonne qualité après plusieurs essais.")
+    return questions
+
+
+async def agenerate_questions_batch(topic: str, level: str, count: int, start_index: int = 1,
+                                    params: dict = None, max_rounds: int = None, session=None) -> list:
+    """
+    Async variant of generate_questions_batch.
+    """
+    params = params or get_admin_params()
+    _check_api_key(params)
+    backend = get_backend()
+    telemetry = get_telemetry()
+    if max_rounds is None:
+        max_rounds = telemetry.retry_budget(topic, level, params["model"])
+
+    questions = []
+    seen_hashes = set()
+    for _ in range(max_rounds):
+        missing = count - len(questions)
+        if missing <= 0:
+            break
+        request = _batch_request(params, topic, level, missing)
+        started = time.perf_counter()
+        completion = await backend.acomplete(request)
+        telemetry.record_latency(params["model"], time.perf_counter() - started, batch=True)
+        _record_usage(request, completion, session)
+        # Validation and bank writes run in a worker thread, so other chunks keep streaming meanwhile
+        await asyncio.to_thread(_collect_batch, completion, topic, level, missing, start_index, questions,
+                                seen_hashes, params["model"])
+
+    if not questions:
+        raise GenerationExhausted("❌ Impossible de générer une question de bonne qualité après plusieurs essais.")
+    return questions
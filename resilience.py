@@ -0,0 +1,177 @@
+"""
+Resilience helpers for calls to the LLM provider
+"""
+
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter shared by threads and asyncio tasks.
+    `rate` tokens are added per second up to `capacity`; each request takes one.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, requests: float, burst: float = None):
+        return cls(requests / 60.0, burst)
+
+    def _reserve(self) -> float:
+        """Take a token if available, else return the seconds to wait before retrying"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def try_acquire(self) -> bool:
+        """Take a token without waiting"""
+        return self._reserve() == 0.0
+
+    def acquire(self, timeout: float = None) -> bool:
+        """Block until a token is available; False if that would take longer than `timeout`"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        wait = self._reserve()
+        while wait:
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+            wait = self._reserve()
+        return True
+
+    async def acquire_async(self, timeout: float = None) -> bool:
+        """Wait (without blocking the event loop) until a token is available; see acquire()"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        wait = self._reserve()
+        while wait:
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            await asyncio.sleep(wait)
+            wait = self._reserve()
+        return True
+
+    def wait_time(self) -> float:
+        """Seconds until the next token, without taking it"""
+        with self._lock:
+            tokens = min(self.capacity, self._tokens + (time.monotonic() - self._updated) * self.rate)
+            return 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+
+
+# ==========================================================
+# ✅ Circuit Breaker
+# ==========================================================
+class ProviderUnavailable(Exception):
+    """The call was not sent: the provider is failing or the rate limit is reached"""
+
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(ProviderUnavailable):
+    pass
+
+
+class RateLimitedError(ProviderUnavailable):
+    pass
+
+
+def is_provider_failure(error: Exception) -> bool:
+    """
+    Errors that say the provider is unhealthy (429, 5xx, timeouts, dropped
+    connections), as opposed to a bad request or a wrong API key.
+    """
+    if isinstance(error, ProviderUnavailable):
+        return True
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    # groq.APITimeoutError / APIConnectionError, without importing the SDK here
+    name = type(error).__name__
+    return "Timeout" in name or "Connection" in name
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing provider.
+    After `failure_threshold` consecutive provider failures the circuit opens
+    and calls are refused for `reset_timeout` seconds. Then one trial call is
+    let through (half-open): its success closes the circuit, its failure
+    opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def retry_after(self) -> float:
+        """Seconds before the next trial call is allowed (0 when closed)"""
+        with self._lock:
+            if self._state != self.OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def allow(self) -> bool:
+        """Whether a call may be sent now; in half-open state only one trial at a time"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = self.HALF_OPEN
+                self._trial_running = False
+            if self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    print(f"⚠️ Circuit ouvert : fournisseur indisponible, pause de {self.reset_timeout:.0f}s")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def release(self):
+        """End a call that neither succeeded nor failed on the provider's side"""
+        with self._lock:
+            self._trial_running = False
@@ -0,0 +1,116 @@
+import json
+import os
+import random
+import threading
+import time
+
+import pytest
+
+import generation_stats
+import llm_backend
+import quiz_generator
+from generation_stats import GenerationTelemetry
+from llm_backend import Completion
+from question_cache import QuestionCache
+from question_store import JsonQuestionStore
+
+
+WORDS = ["liste", "tuple", "dictionnaire", "générateur", "décorateur", "classe", "module", "exception",
+         "itérateur", "fermeture", "variable", "portée", "héritage", "méthode", "attribut", "fichier",
+         "boucle", "compréhension", "argument", "annotation", "contexte", "verrou", "thread", "coroutine"]
+
+
+def question_reply(number, topic="python", level="Beginner"):
+    """Valid single-question reply, a different question (no paraphrase) for each `number`"""
+    words = random.Random(number).sample(WORDS, 8)
+    return json.dumps({
+        "id": f"q{number}",
+        "topic": topic,
+        "level": level,
+        "question": f"Question {number} : quel lien entre " + ", ".join(words) + " ?",
+        "options": [f"Elle ajoute {number}", f"Elle retire {number}", f"Elle copie {number}", f"Elle trie {number}"],
+        "correct_answer": f"Elle ajoute {number}",
+        "type": "mcq"
+    }, ensure_ascii=False)
+
+
+class ScriptedBackend:
+    """
+    Backend replying with the given texts in order (the last one repeats);
+    batch requests take theirs from `batch_replies`. Requests are kept.
+    Streams end with `usage` (a StreamUsage) when given.
+    """
+
+    name = "scripted"
+    requires_api_key = False
+
+    def __init__(self, replies, batch_replies=None, latency=0.0, chunk_size=16, usage=None):
+        self.replies = {"question": list(replies), "batch": list(batch_replies or replies)}
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.usage = usage
+        self.requests = []
+        self._lock = threading.Lock()
+
+    @property
+    def calls(self):
+        return len(self.requests)
+
+    def _next(self, request):
+        with self._lock:
+            replies = self.replies[request.kind]
+            turn = sum(1 for r in self.requests if r.kind == request.kind)
+            self.requests.append(request)
+        if self.latency:
+            time.sleep(self.latency)
+        return replies[min(turn, len(replies) - 1)]
+
+    def complete(self, request):
+        return Completion(self._next(request))
+
+    async def acomplete(self, request):
+        return self.complete(request)
+
+    def stream(self, request):
+        reply = self._next(request)
+        for start in range(0, len(reply), self.chunk_size):
+            yield reply[start:start + self.chunk_size]
+        if self.usage is not None:
+            yield self.usage
+
+
+@pytest.fixture
+def isolated(tmp_path, monkeypatch):
+    """Telemetry and question bank in a temp dir, so tests never touch the app's files"""
+    telemetry = GenerationTelemetry(os.path.join(tmp_path, "generation_stats.json"))
+    monkeypatch.setattr(generation_stats, "_telemetry", telemetry)
+    cache = QuestionCache(JsonQuestionStore(os.path.join(tmp_path, "questions_cache.json")), snapshot=False)
+    monkeypatch.setattr(quiz_generator, "_question_cache", cache)
+    return telemetry, cache
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    """Install a ScriptedBackend: backend(replies, **options)"""
+    def install(replies, **options):
+        scripted = ScriptedBackend(replies, **options)
+        monkeypatch.setattr(llm_backend, "_backend", scripted)
+        return scripted
+    return install
+
+
+@pytest.fixture
+def params():
+    """Generation parameters without Streamlit or environment lookups"""
+    return {
+        "api_key": "test",
+        "model": "test-model",
+        "temperature": 0.5,
+        "max_tokens": 600,
+        "batch_size": 1,
+        "streaming": True,
+        "adaptive_max_tokens": True,
+        "candidates": 1,
+        "hedge": False,
+        "routing": False,
+    }
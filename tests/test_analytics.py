@@ -0,0 +1,84 @@
+import os
+
+import numpy as np
+
+import analytics
+from analytics import DashboardCache, data_version, item_statistics, load_cohort
+from conftest import question_reply
+from learner_model import LearnerModel, LearnerStore
+from models import Question
+
+
+def small_cohort(tmp_path, cache):
+    """Two learners and two questions: the first one answered 10 times, the second twice"""
+    learners = LearnerStore(directory=os.path.join(tmp_path, "profiles"), flush_interval=3600)
+    for name, outcomes in [("Alice", [True, True, True]), ("Bob", [True, False, False, False])]:
+        model = LearnerModel(name, learners)
+        for correct in outcomes:
+            model.update("python", correct)
+        model.save()
+
+    records = []
+    for number in (1, 2):
+        question = Question.model_validate_json(question_reply(number))
+        assert cache.add_question(question)
+        records.append(cache.get_record(cache.get_question_hash(question)))
+    first, second = records
+    right, often, rarely = first.correct_answer, *[o for o in first.options if o != first.correct_answer][:2]
+    for choice in [right] * 6 + [often] * 3 + [rarely]:
+        cache.log_answer(first.digest, "Alice", choice == right, choice)
+    cache.log_answer(second.digest, "Bob", True, second.correct_answer)
+    cache.log_answer(second.digest, "Bob", False, None)  # Choice not logged
+    return learners, first, second, often
+
+
+def test_item_statistics_of_a_small_cohort(isolated, tmp_path):
+    telemetry, cache = isolated
+    learners, first, second, often = small_cohort(tmp_path, cache)
+
+    cohort = load_cohort(cache, learners)
+    stats = item_statistics(cohort)
+
+    assert cohort.digests == [first.digest, second.digest]
+    assert cohort.learners_answering == 2
+    assert cohort.topics == ["python"] and sorted(cohort.total[:, 0]) == [3, 4]
+    assert stats["answers"].tolist() == [10, 2]
+    # p-value: share of right answers
+    assert np.allclose(1 - stats["error_rate"], [0.6, 0.5])
+    assert first.options[stats["distractor"][0]] == often
+    assert np.isclose(stats["distractor_share"][0], 0.75)
+    assert stats["wrong_known"].tolist() == [4, 0]
+
+
+def test_dashboard_is_reused_until_the_data_version_changes(isolated, tmp_path, monkeypatch):
+    telemetry, cache = isolated
+    learners, first, second, often = small_cohort(tmp_path, cache)
+    dashboards = DashboardCache(os.path.join(tmp_path, "analytics"))
+
+    dashboard = dashboards.get(cache, learners)
+    assert dashboard.summary["answers"] == 12 and dashboard.summary["learners"] == 2
+    # Only the first question has MIN_ANSWERS answers
+    assert [row["Réponses"] for row in dashboard.items] == [10]
+    assert dashboard.items[0]["Distracteur principal"] == often
+    assert all(os.path.exists(path) for path in dashboard.charts.values())
+
+    builds = []
+    build = DashboardCache.build
+    monkeypatch.setattr(DashboardCache, "build", lambda self, *args: builds.append(args) or build(self, *args))
+    assert dashboards.get(cache, learners) == dashboard
+    assert builds == []
+
+    cache.log_answer(first.digest, "Bob", False, often)
+    version = data_version(cache, learners)
+    assert version != dashboard.version
+    rebuilt = dashboards.get(cache, learners)
+    assert len(builds) == 1 and rebuilt.version == version
+    assert rebuilt.summary["answers"] == 13
+    # Files of the previous version are pruned
+    assert all(name.endswith(f"_{version}.json") or name.endswith(f"_{version}.png")
+               for name in os.listdir(dashboards.directory))
+
+    # Bumping the analytics version alone also invalidates the cached dashboard
+    monkeypatch.setattr(analytics, "ANALYTICS_VERSION", analytics.ANALYTICS_VERSION + 1)
+    assert dashboards.get(cache, learners).version != version
+    assert len(builds) == 2
@@ -0,0 +1,39 @@
+import io
+import zipfile
+
+import pytest
+
+import attestation
+
+
+def test_cohort_csv_to_zip(tmp_path):
+    path = tmp_path / "cohorte.csv"
+    path.write_text("nom_apprenant,score,total,sujet,date\nAlice Martin,18,20,Python,12/03/2026\nBob,11,20,SQL,\n",
+                    encoding="utf-8")
+
+    records = attestation.read_records(str(path))
+    archive = zipfile.ZipFile(io.BytesIO(attestation.write_attestations_zip(records, max_workers=1)))
+
+    assert records[0]["date"].year == 2026 and "date" not in records[1]
+    assert archive.namelist() == ["0001_Alice_Martin.pdf", "0002_Bob.pdf"]
+    assert all(archive.read(name).startswith(b"%PDF") for name in archive.namelist())
+
+
+def test_invalid_row_names_the_line(tmp_path):
+    path = tmp_path / "cohorte.csv"
+    path.write_text("nom_apprenant,score,total,sujet\nAlice,dix-huit,20,Python\n", encoding="utf-8")
+
+    with pytest.raises(ValueError, match="Ligne 2"):
+        attestation.read_records(str(path))
+
+
+def test_images_are_decoded_once_and_drawn_from_the_cache(tmp_path, monkeypatch):
+    logo = tmp_path / "logo.png"
+    logo.write_bytes(open(attestation.LOGO_PATH, "rb").read())
+    monkeypatch.setattr(attestation, "LOGO_PATH", str(logo))
+    images = attestation.render_attestation("Alice", 18, 20, "Python").count(b"/Subtype /Image")
+
+    logo.unlink()  # Later renders never reopen the file
+    assert attestation.render_attestation("Bob", 12, 20, "SQL").count(b"/Subtype /Image") == images
+    attestation._image_reader.cache_clear()
+    assert attestation.render_attestation("Bob", 12, 20, "SQL").count(b"/Subtype /Image") < images
@@ -0,0 +1,71 @@
+import asyncio
+import json
+import threading
+
+import generation_stats as reasons
+import quiz_generator
+from conftest import question_reply
+
+
+def batch_reply(*numbers):
+    return json.dumps([{key: value for key, value in json.loads(question_reply(n)).items()
+                        if key in ("question", "options", "correct_answer")} for n in numbers],
+                      ensure_ascii=False)
+
+
+def test_unusable_batches_fall_back_to_a_single_question(isolated, backend, params):
+    telemetry, cache = isolated
+    scripted = backend([question_reply(7)], batch_replies=["pas de JSON ici"])
+    params.update(batch_size=5)
+
+    question = quiz_generator.generate_question("python", "Beginner", 1, params, cache.session())
+
+    assert question.correct_answer == "Elle ajoute 7"
+    kinds = [request.kind for request in scripted.requests]
+    assert kinds == ["batch"] * telemetry.DEFAULT_RETRIES + ["question"]
+
+
+def test_batch_requests_use_the_adaptive_temperature(isolated, backend, params):
+    telemetry, cache = isolated
+    for _ in range(20):
+        telemetry.record("python", "Beginner", "test-model", reasons.TOO_SHORT)
+    expected = telemetry.temperature("python", "Beginner", "test-model", 0.5)
+    scripted = backend([question_reply(1)], batch_replies=[batch_reply(1, 2, 3)])
+    params.update(batch_size=3)
+
+    quiz_generator.generate_question("python", "Beginner", 1, params, cache.session())
+
+    batch = scripted.requests[0]
+    assert batch.kind == "batch"
+    assert batch.temperature == expected < 0.5
+
+
+def test_batches_record_latency_and_lengths(isolated, backend, params):
+    telemetry, cache = isolated
+    backend([question_reply(1)], batch_replies=[batch_reply(1, 2, 3)])
+
+    questions = quiz_generator.generate_questions_batch("python", "Beginner", 3, 1, params, session=cache.session())
+
+    assert len(questions) == 3
+    assert len(telemetry.batch_latencies["test-model"]) == 1
+    assert "test-model" not in telemetry.latencies  # Batch calls never set the hedge delay
+    lengths = telemetry.lengths["test-model"]
+    assert len(lengths) == 3
+    # Scaled to a single-question reply, which carries id, topic, level and type on top of the batch item
+    assert all(length > reasons.estimate_tokens(batch_reply(1)) // 3 for length in lengths)
+
+
+def test_async_batches_write_the_bank_off_the_event_loop(isolated, backend, params, monkeypatch):
+    telemetry, cache = isolated
+    backend([question_reply(1)], batch_replies=[batch_reply(1, 2, 3)])
+    writers = []
+    add_question = cache.add_question
+    monkeypatch.setattr(cache, "add_question", lambda question: writers.append(threading.current_thread())
+                        or add_question(question))
+
+    questions = asyncio.run(quiz_generator.agenerate_questions_batch("python", "Beginner", 3, 1, params,
+                                                                     max_rounds=1))
+
+    assert len(questions) == 3
+    assert cache.count("python", "Beginner") == 3
+    assert writers and threading.main_thread() not in writers
@@ -0,0 +1,67 @@
+import os
+from types import SimpleNamespace
+
+import numpy as np
+
+from irt import AbilityEstimate, Calibration, ItemIndex, fit_2pl, probability
+
+
+def test_fit_2pl_recovers_synthetic_parameters():
+    rng = np.random.default_rng(7)
+    n_learners, n_items = 600, 20
+    ability = rng.normal(0.0, 1.0, n_learners)
+    discrimination = rng.uniform(0.7, 2.0, n_items)
+    difficulty = np.linspace(-1.5, 1.5, n_items)
+    learners, items = np.meshgrid(np.arange(n_learners), np.arange(n_items), indexing="ij")
+    learners, items = learners.ravel(), items.ravel()
+    correct = rng.random(len(learners)) < probability(ability[learners], discrimination[items], difficulty[items])
+
+    fit = fit_2pl(learners, items, correct, n_learners, n_items)
+
+    assert fit.iterations < 200
+    assert np.sqrt(np.mean((fit.difficulty - difficulty) ** 2)) < 0.25
+    assert np.sqrt(np.mean((fit.discrimination - discrimination) ** 2)) < 0.3
+    assert np.corrcoef(fit.discrimination, discrimination)[0, 1] > 0.8
+    assert np.corrcoef(fit.ability, ability)[0, 1] > 0.9
+
+
+def _calibrated(tmp_path, params):
+    """Calibration holding `params` (digest -> (a, b, answers)) without a file"""
+    calibration = Calibration(os.path.join(tmp_path, "irt_params.json"))
+    calibration.items = dict(params)
+    records = [SimpleNamespace(digest=digest) for digest in params]
+    return calibration, records
+
+
+def test_item_index_picks_the_most_informative_unasked_item(tmp_path):
+    calibration, records = _calibrated(tmp_path, {
+        b"easy": (1.0, -1.5, 10),
+        b"middle": (1.0, 0.0, 10),
+        b"hard": (1.0, 1.5, 10),
+        b"fresh": (1.0, 1.4, 2),  # Not enough answers: left out of the index
+    })
+    index = ItemIndex(records, calibration)
+    never = lambda digest: False
+
+    assert len(index) == 3
+    assert index.pick(1.5, never).digest == b"hard"
+    assert index.pick(-1.2, never).digest == b"easy"
+    assert index.pick(1.5, lambda digest: digest == b"hard").digest == b"middle"
+    assert index.pick(1.5, lambda digest: True) is None
+    # Nothing reaches a floor above the best information (a² / 4)
+    assert index.pick(1.5, never, floor=0.3) is None
+
+
+def test_ability_level_follows_the_answers():
+    rising = AbilityEstimate("Intermediate")
+    assert rising.level() == "Intermediate"
+    for _ in range(8):
+        rising.update(1.5, 1.0, correct=True)
+    assert rising.level() == "Advanced"
+    assert rising.is_confident()
+
+    falling = AbilityEstimate("Intermediate")
+    for _ in range(8):
+        falling.update(1.5, -1.0, correct=False)
+    assert falling.level() == "Beginner"
+    assert falling.is_confident()
@@ -0,0 +1,32 @@
+import json
+import os
+
+from learner_model import LearnerModel, LearnerStore
+
+
+def test_live_models_survive_a_clear(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # clear() rewrites the anonymous profile in the working directory
+    store = LearnerStore(directory=os.path.join(tmp_path, "profiles"), flush_interval=3600)
+    model = LearnerModel("Alice", store)
+    model.update("python", True)
+    model.save()
+
+    store.clear()
+    assert model.mastery("python") == 0
+
+    model.update("python", False)
+    model.save()
+    with open(store.path("Alice")) as f:
+        assert json.load(f)["scores"] == {"python": {"correct": 0, "total": 1}}
+
+
+def test_flush_skips_profiles_cleared_while_dirty(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store = LearnerStore(directory=os.path.join(tmp_path, "profiles"), flush_interval=3600)
+    LearnerModel("Bob", store).update("sql", True)
+
+    store.clear()
+    store._dirty.add("Bob")
+    store.flush()
+
+    assert not os.path.exists(store.path("Bob"))
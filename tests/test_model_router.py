@@ -0,0 +1,71 @@
+import pytest
+
+import model_router
+import quiz_generator
+from conftest import question_reply
+from model_router import DEFAULT_LEVEL_MODELS, DEFAULT_MODELS, LARGE_MODEL, SMALL_MODEL, ModelRouter
+
+REJECTED = '{"id": "q_1", "topic": "python", "level": "Beginner", "question": "Trop court ?", "options": ["a", "b"], "correct_answer": "a", "type": "MCQ"}'
+
+
+def measure(telemetry, model, accepted, seconds, level="Beginner"):
+    """Enough samples for `model` to be ranked: `accepted` share of candidates, constant latency"""
+    total = 2 * telemetry.MIN_SAMPLES
+    for turn in range(total):
+        telemetry.record("python", level, model, "" if turn < accepted * total else "too_short")
+    for _ in range(telemetry.MIN_LATENCY_SAMPLES):
+        telemetry.record_latency(model, seconds)
+
+
+@pytest.mark.parametrize("level", ["Beginner", "Intermediate", "Advanced"])
+def test_without_exploration_unmeasured_levels_start_on_their_default(isolated, level):
+    telemetry, cache = isolated
+    router = ModelRouter(telemetry, explore_rate=0, seed=1)
+
+    assert {router.choose("python", level) for _ in range(20)} == {DEFAULT_LEVEL_MODELS[level]}
+
+
+def test_the_fastest_model_meeting_the_quality_target_wins(isolated):
+    telemetry, cache = isolated
+    router = ModelRouter(telemetry, explore_rate=0)
+    measure(telemetry, SMALL_MODEL, accepted=0.9, seconds=2.0)
+    measure(telemetry, LARGE_MODEL, accepted=0.9, seconds=0.5)
+    assert router.choose("python", "Beginner") == LARGE_MODEL
+
+    # Once its replies get rejected the faster model no longer qualifies
+    measure(telemetry, LARGE_MODEL, accepted=0.0, seconds=0.5)
+    assert router.choose("python", "Beginner") == SMALL_MODEL
+
+
+def test_a_failing_model_cools_down_then_comes_back(isolated, monkeypatch):
+    telemetry, cache = isolated
+    now = [1000.0]
+    monkeypatch.setattr(model_router.time, "monotonic", lambda: now[0])
+    router = ModelRouter(telemetry, explore_rate=0)
+
+    router.report_failure(SMALL_MODEL)
+    assert router.choose("python", "Beginner") == SMALL_MODEL  # One failure is not enough
+    router.report_failure(SMALL_MODEL)
+    assert router.available(DEFAULT_MODELS) == [LARGE_MODEL]
+    assert router.choose("python", "Beginner") == LARGE_MODEL
+    assert router.cascade(LARGE_MODEL) is None
+
+    now[0] += router.COOLDOWN + 1
+    assert router.available(DEFAULT_MODELS) == DEFAULT_MODELS
+    assert router.choose("python", "Beginner") == SMALL_MODEL
+
+
+def test_low_quality_replies_cascade_from_the_small_to_the_large_model(isolated, backend, params, monkeypatch):
+    telemetry, cache = isolated
+    router = ModelRouter(telemetry, explore_rate=0)
+    monkeypatch.setattr(quiz_generator, "get_model_router", lambda: router)
+    budget = telemetry.retry_budget("python", "Beginner", SMALL_MODEL)
+    scripted = backend([REJECTED] * budget + [question_reply(1)])
+    params.update(routing=True, models=DEFAULT_MODELS, streaming=False)
+
+    question = quiz_generator.generate_question("python", "Beginner", 1, params, cache.session())
+
+    assert question.question.startswith("Question 1 :")
+    assert [r.model for r in scripted.requests] == [SMALL_MODEL] * budget + [LARGE_MODEL]
+    # Rejected candidates are not a provider failure: the small model stays available
+    assert router.available(DEFAULT_MODELS) == DEFAULT_MODELS
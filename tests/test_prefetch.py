@@ -0,0 +1,56 @@
+import threading
+
+import pytest
+
+import llm_backend
+import quiz_generator
+from conftest import ScriptedBackend, question_reply
+from models import Question
+from prefetch import QuestionPrefetcher
+
+
+def cached(cache, number, level):
+    question = Question.model_validate_json(question_reply(number, level=level))
+    assert cache.add_question(question)
+    return question
+
+
+def test_take_returns_the_question_of_the_level_reached(isolated, backend, params):
+    telemetry, cache = isolated
+    scripted = backend([question_reply(99)])
+    beginner, intermediate = cached(cache, 1, "Beginner"), cached(cache, 2, "Intermediate")
+    prefetcher = QuestionPrefetcher(cache.session())
+
+    prefetcher.prefetch("python", ["Beginner", "Intermediate"], 2, params)
+    question = prefetcher.take("python", "Intermediate", 2)
+
+    assert question == intermediate
+    assert prefetcher.pending == {}
+    assert prefetcher.take("python", "Beginner", 2) is None  # Discarded once a level is taken
+    assert scripted.calls == 0
+
+
+class FailingBackend(ScriptedBackend):
+    def complete(self, request):
+        raise RuntimeError("modèle inconnu")
+
+
+def test_worker_errors_are_raised_by_take_not_reported_in_the_worker(isolated, params, monkeypatch):
+    telemetry, cache = isolated
+    monkeypatch.setattr(llm_backend, "_backend", FailingBackend([]))
+    reports = []
+
+    class Streamlit:
+        @staticmethod
+        def error(message):
+            reports.append(threading.current_thread())
+
+    monkeypatch.setattr(quiz_generator, "_streamlit", lambda: Streamlit)
+    params.update(streaming=False)
+    prefetcher = QuestionPrefetcher(cache.session())
+
+    prefetcher.prefetch("python", ["Beginner"], 1, params)
+    with pytest.raises(RuntimeError, match="modèle inconnu"):
+        prefetcher.take("python", "Beginner", 1)
+
+    assert reports == []
@@ -0,0 +1,69 @@
+import os
+import statistics
+import time
+
+import pytest
+
+from benchmarks.micro import build_store, synthetic_records
+from models import Question
+from question_cache import QuestionCache
+from question_store import JsonQuestionStore
+
+TEXT = "Quelle différence entre une liste et un tuple lorsque le tuple contient une liste modifiable ?"
+PARAPHRASE = TEXT.replace("Quelle différence", "Quelle est la différence")
+
+
+def question(text, number):
+    options = [f"Réponse {number} {letter}" for letter in "ABCD"]
+    return Question(id=f"q_{number}", topic="python", level="Beginner", question=text,
+                    options=options, correct_answer=options[0], type="MCQ")
+
+
+def test_paraphrase_cached_after_the_asked_question_is_blocked(tmp_path):
+    cache = QuestionCache(JsonQuestionStore(os.path.join(tmp_path, "bank.json")), snapshot=False)
+    asked, paraphrase = question(TEXT, 1), question(PARAPHRASE, 2)
+    cache.add_question(asked)
+    session = cache.session()
+    session.mark_as_asked(asked)
+
+    # Cached afterwards, bypassing the paraphrase check of add_question (another process, an import...)
+    cache.save_user_choice(paraphrase, paraphrase.options[1])
+
+    assert session.was_asked_in_session(paraphrase)
+    assert session.get_cached_question("python", "Beginner") is None
+
+
+def test_paraphrase_index_is_built_on_first_use(tmp_path):
+    store = JsonQuestionStore(os.path.join(tmp_path, "bank.json"))
+    snapshot = os.path.join(tmp_path, "bank.snapshot")
+    QuestionCache(store, snapshot=False).add_question(question(TEXT, 1))
+
+    cache = QuestionCache(store, snapshot=snapshot)
+    assert cache._near is None and not os.path.exists(snapshot)
+
+    assert cache.find_near_duplicates(question(PARAPHRASE, 2))
+    assert os.path.exists(snapshot)
+    assert QuestionCache(store, snapshot=snapshot)._near is not None
+
+
+def median_insert_seconds(kind, directory, size, inserts=40):
+    """Median time of add_question on a bank already holding `size` questions"""
+    records = synthetic_records(size + inserts, seed=size)
+    os.makedirs(directory)
+    cache = QuestionCache(build_store(kind, directory, records[:size]), snapshot=False)
+    cache.find_near_duplicates(records[0].to_question())  # Build the paraphrase index beforehand
+    timings = []
+    for record in records[size:]:
+        started = time.perf_counter()
+        assert cache.add_question(record.to_question())
+        timings.append(time.perf_counter() - started)
+    assert len(cache.store.load()) == size + inserts
+    return statistics.median(timings)
+
+
+@pytest.mark.parametrize("kind", ["json", "sqlite"])
+def test_insert_cost_does_not_grow_with_the_bank(tmp_path, kind):
+    small = median_insert_seconds(kind, os.path.join(tmp_path, "small"), 200)
+    large = median_insert_seconds(kind, os.path.join(tmp_path, "large"), 5_000)
+    # Rewriting the whole bank made a 5 000-question insert ~25x slower than a 200-question one
+    assert large < 3 * small + 0.002
@@ -0,0 +1,81 @@
+import os
+
+import question_store
+from question_store import JsonQuestionStore, QuestionRecord, SqliteQuestionStore, question_digest
+
+
+def record(number, user_choice=None):
+    text = f"Question {number} : que renvoie sorted() sur un dictionnaire ?"
+    options = [f"Réponse {number} {letter}" for letter in "ABCD"]
+    return QuestionRecord(question_digest(text), f"q{number}", "python", "Beginner", text, options,
+                          options[0], "MCQ", user_choice)
+
+
+def test_json_upserts_are_journaled_then_compacted(tmp_path):
+    store = JsonQuestionStore(os.path.join(tmp_path, "bank.json"))
+    store.COMPACT_MIN = 4
+    for number in range(3):
+        store.upsert(record(number))
+    store.upsert(record(0, user_choice="Réponse 0 D"))
+    assert not os.path.exists(store.path)  # Nothing rewritten yet, only journal lines
+
+    reloaded = JsonQuestionStore(store.path)
+    assert {r.id: r.user_choice for r in reloaded.load()} == {"q0": "Réponse 0 D", "q1": None, "q2": None}
+
+    store.upsert(record(3))  # Fifth line: folded into the JSON file
+    assert os.path.exists(store.path) and not os.path.exists(store.journal_path)
+    assert [r.id for r in JsonQuestionStore(store.path).load()] == ["q0", "q1", "q2", "q3"]
+
+
+def test_sqlite_upsert_inserts_once_and_keeps_the_last_answer(tmp_path):
+    store = SqliteQuestionStore(os.path.join(tmp_path, "bank.db"))
+    store.upsert(record(1))
+    store.upsert(record(2))
+    store.upsert(record(1, user_choice="Réponse 1 B"))
+    # A later copy without an answer does not erase the stored one
+    store.upsert(record(1))
+
+    records = {r.id: r for r in store.load()}
+    assert sorted(records) == ["q1", "q2"]
+    assert records["q1"].user_choice == "Réponse 1 B"
+    assert records["q1"].options == record(1).options
+    assert records["q2"].user_choice is None
+
+
+def test_sqlite_import_json_is_idempotent(tmp_path):
+    legacy = JsonQuestionStore(os.path.join(tmp_path, "questions_cache.json"))
+    for number in range(3):
+        legacy.upsert(record(number))
+    store = SqliteQuestionStore(os.path.join(tmp_path, "bank.db"))
+
+    assert store.import_json(legacy.path) == 3
+    assert store.import_json(legacy.path) == 0
+    assert store.import_json(os.path.join(tmp_path, "missing.json")) == 0
+    assert [r.id for r in store.load()] == ["q0", "q1", "q2"]
+
+
+def test_sqlite_load_new_pulls_rows_written_by_another_process(tmp_path):
+    path = os.path.join(tmp_path, "bank.db")
+    reader, writer = SqliteQuestionStore(path), SqliteQuestionStore(path)
+    writer.upsert(record(1))
+    assert [r.id for r in reader.load()] == ["q1"]
+    assert reader.load_new() == []
+
+    writer.upsert(record(2))
+    writer.upsert(record(1, user_choice="Réponse 1 C"))  # An update is not a new row
+    assert [r.id for r in reader.load_new()] == ["q2"]
+    assert reader.load_new() == []
+
+
+def test_default_store_imports_the_legacy_json_once(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("QUESTION_STORE", raising=False)
+    monkeypatch.delenv("QUESTION_STORE_PATH", raising=False)
+    JsonQuestionStore().upsert(record(1))
+
+    store = question_store.get_default_store()
+    assert isinstance(store, SqliteQuestionStore)
+    assert [r.id for r in store.load()] == ["q1"]
+
+    store.clear()
+    assert question_store.get_default_store().load() == []
@@ -0,0 +1,55 @@
+import pytest
+
+import quiz_generator
+from conftest import question_reply
+
+REJECTED = '{"id": "q_1", "topic": "python", "level": "Beginner", "question": "Trop court ?", "options": ["a", "b"], "correct_answer": "a", "type": "MCQ"}'
+
+
+def race(backend, params, cache, budget):
+    request = quiz_generator._question_request(params, "python", "Beginner", 1)
+    return quiz_generator._race_candidates(backend, request, params, cache.session(), budget)
+
+
+@pytest.mark.parametrize("budget", [1, 3, 5])
+def test_budget_caps_the_launched_requests(isolated, backend, params, budget):
+    telemetry, cache = isolated
+    scripted = backend([REJECTED])
+    params.update(streaming=False, candidates=2)
+
+    assert race(scripted, params, cache, budget) is None
+    assert scripted.calls == budget
+
+
+@pytest.mark.parametrize("budget", [1, 3])
+def test_the_hedge_is_on_top_of_the_budget(isolated, backend, params, budget):
+    telemetry, cache = isolated
+    for _ in range(telemetry.MIN_LATENCY_SAMPLES):
+        telemetry.record_latency("test-model", 0.01)
+    # Every call is slower than the p95, so the first one is hedged
+    scripted = backend([REJECTED], latency=0.1)
+    params.update(streaming=False, hedge=True)
+
+    assert race(scripted, params, cache, budget) is None
+    assert scripted.calls == budget + 1
+
+
+def test_accepted_candidate_stops_the_race(isolated, backend, params):
+    telemetry, cache = isolated
+    scripted = backend([REJECTED, question_reply(1)])
+    params.update(streaming=False)
+
+    assert race(scripted, params, cache, 5) is not None
+    assert scripted.calls == 2
+
+
+def test_single_candidate_without_p95_stays_in_the_calling_thread(isolated, backend, params, monkeypatch):
+    telemetry, cache = isolated
+    scripted = backend([question_reply(1)])
+    params.update(streaming=False, hedge=True)
+    monkeypatch.setattr(quiz_generator, "_race_candidates", lambda *args: pytest.fail("raced without a p95"))
+
+    question = quiz_generator._generate_question_from_api("python", "Beginner", 1, params, cache.session())
+
+    assert question.id == "q1"
+    assert scripted.calls == 1
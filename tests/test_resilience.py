@@ -0,0 +1,97 @@
+import time
+
+import pytest
+
+import llm_backend
+import quiz_generator
+from conftest import ScriptedBackend, question_reply
+from llm_backend import CompletionRequest, GuardedBackend
+from models import Question
+from resilience import CircuitBreaker, CircuitOpenError, RateLimitedError, TokenBucket
+
+REQUEST = CompletionRequest("question", "python", "Beginner", "Une question ?", "test-model", 0.5, 600)
+
+
+class FlakyBackend(ScriptedBackend):
+    """Times out on the first `failures` calls, then replies as scripted"""
+
+    def __init__(self, replies, failures):
+        super().__init__(replies)
+        self.failures = failures
+        self.attempts = 0
+
+    def complete(self, request):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise TimeoutError("délai dépassé")
+        return super().complete(request)
+
+
+def test_breaker_opens_then_closes_after_a_successful_trial():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    inner = FlakyBackend([question_reply(1)], failures=3)
+    guarded = GuardedBackend(inner, breaker)
+
+    for _ in range(2):
+        with pytest.raises(TimeoutError):
+            guarded.complete(REQUEST)
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError) as refused:
+        guarded.complete(REQUEST)
+    assert inner.attempts == 2  # Refused without calling the provider
+    assert 0 < refused.value.retry_after <= 0.05
+
+    time.sleep(0.06)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(TimeoutError):
+        guarded.complete(REQUEST)  # Failed trial: open again
+    assert breaker.state == CircuitBreaker.OPEN
+
+    time.sleep(0.06)
+    assert guarded.complete(REQUEST).content == question_reply(1)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_lets_one_trial_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    breaker.record_failure()
+
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+
+def test_rate_limited_after_waiting_for_a_slot():
+    inner = ScriptedBackend([question_reply(1)])
+    breaker = CircuitBreaker()
+    guarded = GuardedBackend(inner, breaker, TokenBucket(rate=20.0, capacity=1), max_wait=0.2)
+
+    guarded.complete(REQUEST)
+    started = time.monotonic()
+    guarded.complete(REQUEST)  # Next slot within max_wait: waits for it
+    assert time.monotonic() - started >= 0.03
+
+    guarded.limiter = TokenBucket(rate=0.5, capacity=1)
+    guarded.complete(REQUEST)
+    with pytest.raises(RateLimitedError) as limited:
+        guarded.complete(REQUEST)  # Next slot in 2 s, beyond max_wait
+    assert inner.calls == 3
+    assert limited.value.retry_after > 1.0
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+
+def test_provider_outage_serves_a_cached_question(isolated, params, monkeypatch):
+    telemetry, cache = isolated
+    monkeypatch.setattr(llm_backend, "_backend", FlakyBackend([question_reply(2)], failures=100))
+    params.update(streaming=False)
+    beginner = Question.model_validate_json(question_reply(1, level="Beginner"))
+    cache.add_question(beginner)
+    session = cache.session()
+
+    # Nothing cached at this level: the adjacent one is used while the provider is down
+    assert quiz_generator.generate_question("python", "Intermediate", 1, params, session) == beginner
+
+    session.mark_as_asked(beginner)
+    with pytest.raises(TimeoutError):
+        quiz_generator.generate_question("python", "Intermediate", 2, params, session)
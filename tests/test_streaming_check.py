@@ -0,0 +1,72 @@
+import generation_stats as reasons
+import quiz_generator
+from conftest import question_reply
+from llm_backend import StreamUsage
+from quiz_generator import StreamingQuestionCheck
+
+GARBLED = '{"id": 1, "topic": "python", "level": "Beginner", "question": "Quel est le r\\ôle de \\q dans une expression r\\égulière ?", "options": ["a"'
+TRUNCATED = '{"id": 1, "topic": "python", "level": "Beginner", "question": "Quel est le rôle du mot-clé yield dans une'
+
+
+def feed_all(text, size=7):
+    check = StreamingQuestionCheck()
+    for start in range(0, len(text), size):
+        reason = check.feed(text[start:start + size])
+        if reason:
+            return check, reason
+    return check, ""
+
+
+def test_garbled_field_is_invalid_json():
+    check, reason = feed_all(GARBLED)
+    assert reason == reasons.INVALID_JSON
+    assert check.reason == reasons.INVALID_JSON
+
+
+def test_garbled_options_and_answer_are_invalid_json():
+    start = question_reply(1)[:question_reply(1).index('"options"')]
+    assert feed_all(start + '"options": ["\\x41", "b"], ')[1] == reasons.INVALID_JSON
+    options = question_reply(1)[:question_reply(1).index('"correct_answer"')]
+    assert feed_all(options + '"correct_answer": "\\u12"}')[1] == reasons.INVALID_JSON
+
+
+def test_valid_reply_passes():
+    check, reason = feed_all(question_reply(1))
+    assert reason == "" and check.reason == ""
+    assert check.options is not None
+
+
+def test_garbled_and_truncated_streams_are_retried(isolated, backend, params):
+    telemetry, cache = isolated
+    scripted = backend([GARBLED, TRUNCATED, question_reply(3)])
+
+    question = quiz_generator._generate_question_from_api("python", "Beginner", 1, params, cache.session())
+
+    assert question.correct_answer == "Elle ajoute 3"
+    assert scripted.calls == 3
+    bucket = telemetry.buckets[telemetry.key("python", "Beginner", "test-model")]
+    assert bucket["rejections"][reasons.INVALID_JSON] == 2
+
+
+def test_streams_read_to_the_end_record_the_provider_usage(isolated, backend, params):
+    telemetry, cache = isolated
+    backend([question_reply(1)], usage=StreamUsage(321, 87))
+    session = cache.session()
+
+    quiz_generator._generate_question_from_api("python", "Beginner", 1, params, session)
+
+    bucket = telemetry.buckets[telemetry.key("python", "Beginner", "test-model")]
+    assert (bucket["prompt_tokens"], bucket["completion_tokens"], bucket["estimated_calls"]) == (321, 87, 0)
+    assert telemetry.lengths["test-model"] == [87]
+    assert (session.usage.prompt_tokens, session.usage.completion_tokens) == (321, 87)
+
+
+def test_cancelled_streams_are_estimated(isolated, backend, params):
+    telemetry, cache = isolated
+    backend([GARBLED, question_reply(2)], usage=StreamUsage(321, 87))
+
+    quiz_generator._generate_question_from_api("python", "Beginner", 1, params, cache.session())
+
+    bucket = telemetry.buckets[telemetry.key("python", "Beginner", "test-model")]
+    assert bucket["calls"] == 2
+    assert bucket["estimated_calls"] == 1